@@ -9,12 +9,13 @@
  This file stores all the functions for dynamically generating the data for the
  campaign lookup page
 """
+import functools
 import re
-from datetime import datetime as dt
 
 import dash_bootstrap_components as dbc
 
 # Utilities
+import numpy as np
 import pandas as pd
 from dash import dash_table, html
 from dash.dependencies import Input, Output, State
@@ -22,8 +23,14 @@ from dash.exceptions import PreventUpdate
 
 # Data & Components & Helpers
 from components.components import *
+from data.brief_status import *
 from data.campaign_lookup import *
 from data.functions import *
+from emails.expected_performance import (
+    EXPECTED_COLS,
+    expected_bounds,
+    expected_performance,
+)
 from graphs.graphs import *
 
 # Dash componenets
@@ -31,38 +38,66 @@ from main import app
 
 """ helper function """
 
+# Brief statuses of the creators selected for the campaign
+SELECTED_BRIEF_STATUSES = [
+    "approved",
+    "fulfilled",
+    "completed",
+    "media_uploaded",
+    "media_accepted",
+    "processing_payment",
+]
 
-def map_brief_status(brief_row):
-    """
-    Map the database brief statuses to correct text label
-            brief_row : Dataframe row
-                    A single row of the brief dataframe
 
-            return : str
-                    Returns the correct status lable
+def expected_squad_performance(briefs, deliverable_type="post"):
     """
-    if brief_row["brief_status_id"] == 2 and brief_row["brief_inserted_at"].replace(
-        tzinfo=None
-    ) > dt(2019, 2, 12).replace(tzinfo=None):
-        return (
-            "Invited - Viewed"
-            if brief_row["brief_is_viewed"]
-            else "Invited - Not Viewed"
+    Bounds of the expected performance of the selected squad & of every
+    candidate sent a brief, modelled in one vectorized call
+            briefs : Dataframe
+                    The briefs & social accounts of the campaign
+            deliverable_type : str
+                    The deliverable modelled for every candidate
+
+            return : Dataframe
+                    Returns the talent count, lower & upper bound of each
+                    statistic for the squad & the candidates
+    """
+    candidates = briefs.drop_duplicates(["brief_id", "platform"])
+    expected = expected_performance(
+        candidates["followers_count"].fillna(0),
+        candidates["engagement_rate"],
+        np.full(len(candidates), deliverable_type),
+    )
+    selected = candidates["brief_status_code"].isin(SELECTED_BRIEF_STATUSES)
+    groups = {
+        "Selected squad": selected.to_numpy(),
+        "All candidates": np.full(len(candidates), True),
+    }
+
+    performance = []
+    for group, mask in groups.items():
+        bounds = expected_bounds(expected.loc[mask]).fillna(0).clip(lower=0)
+        performance.append(
+            {
+                "group": group,
+                "talent": candidates.loc[mask, "influencer_id"].nunique(),
+                **{
+                    stat: f"{int(row['lowerBound']):,} - {int(row['upperBound']):,}"
+                    for stat, row in bounds.iterrows()
+                },
+            }
         )
 
-    elif brief_row["brief_status_id"] == 3:
-        return "Applied"
+    return pd.DataFrame(performance, columns=["group", "talent"] + EXPECTED_COLS)
 
-    elif brief_row["brief_status_id"] == 4 and brief_row["brief_inserted_at"].replace(
-        tzinfo=None
-    ) > dt(2019, 2, 12).replace(tzinfo=None):
-        return (
-            "Viewed - Did not apply"
-            if brief_row["brief_is_viewed"]
-            else "Invited - Not Viewed"
-        )
 
-    return brief_row["brief_status"]
+@functools.lru_cache(maxsize=8)
+def load_campaigns(campaigns):
+    """
+    Parses the stored campaigns once, for every panel reading them. Callers
+    must copy before mutating
+    """
+    return pd.read_json(campaigns, orient="split")
 
 
 def get_influencer_briefs(campaigns):
@@ -71,23 +106,24 @@ def get_influencer_briefs(campaigns):
         raise PreventUpdate
 
     print("geting suggestions")
-    campaigns = pd.read_json(campaigns, orient="split")
+    campaigns = load_campaigns(campaigns)
 
     if len(campaigns) != 1:
         raise PreventUpdate
 
-    briefs = fetch_briefs_influencers(campaigns.loc[0, "id"])
+    briefs = fetch_campaign_briefs(
+        int(campaigns.loc[0, "id"]), str(campaigns.loc[0, "updated_at"])
+    )
 
-    return briefs
+    return briefs.copy()
 
 
 @app.callback(Output("cl-campaigns", "data"), [Input("cl_campaign_search", "value")])
 def get_campaign(search=None):
     """
-    Dynamically retrieve a list of campaigns matching the search criteria, if
-    there is only 1 match, also grab the influencer briefs
-            start_date : Date The begining of the applicable search period
-            end_date : Date The end of the applicable search period
+    Dynamically retrieve a list of campaigns matching the search criteria from
+    the in memory campaign index, if there is only 1 match, also grab the
+    campaign details
             search : str The search query (campaign ID or name)
 
             return : JSON
@@ -97,18 +133,21 @@ def get_campaign(search=None):
 
     search = None if search == "" else search
 
-    # Extract campaign ID from search
+    # Extract campaign ID from search, a suggestion was picked
     if search is not None:
         num = re.findall(r"\[\d{6}\]", search)
 
         if len(num) > 0:
-            search = num[0]
-            search = re.sub(r"(^\[0*|\]|)", "", search)
+            campaign = fetch_campaign(int(num[0].strip("[]")))
+            return campaign.to_json(orient="split", date_format="iso")
 
     print(search)
-    campaigns = fetch_campaigns(search)
+    campaigns = search_campaigns(search)
     print("Campaigns collected")
 
+    if len(campaigns) == 1:
+        campaigns = fetch_campaign(int(campaigns.loc[0, "id"]))
+
     return campaigns.to_json(orient="split", date_format="iso")
 
 
@@ -129,7 +168,7 @@ def get_campaign_suggestions(campaigns):
         raise PreventUpdate
 
     print("geting suggestions")
-    campaigns = pd.read_json(campaigns, orient="split")
+    campaigns = load_campaigns(campaigns)
 
     return [
         html.Option(value=word, label=word)
@@ -154,10 +193,49 @@ def get_brief_stats(campaigns):
         # replace with empty chart
         raise PreventUpdate
 
-    brief_ids = briefs["brief_id"].to_list()
-    notifications = fetch_notifications(brief_ids)
+    campaign_id = int(load_campaigns(campaigns).loc[0, "id"])
+    notified = fetch_notified_briefs(campaign_id)
+
+    return cl_briefs_barchart(briefs, notified)
+
+
+@app.callback(
+    Output("cl_expected_performance", "children"),
+    [Input("cl-campaigns", "data"), Input("cl_expected_deliverable", "value")],
+)
+def get_expected_performance(campaigns, deliverable_type):
+    """
+    If only 1 campaign matches the search query display the expected
+    performance of its squad & every candidate influencer
+            campaigns : JSON
+                    The list of campaigns matching the search query stored in State
+            deliverable_type : str
+                    The deliverable modelled, post or story
+
+            return : Bootstrap Table
+                    Returns the expected performance bounds as a table
+    """
+    briefs = get_influencer_briefs(campaigns)
+
+    if len(briefs) == 0:
+        raise PreventUpdate
+
+    performance = expected_squad_performance(briefs, deliverable_type)
+
+    header = html.Thead(
+        html.Tr(
+            [html.Th(""), html.Th("Talent")]
+            + [html.Th(stat.capitalize()) for stat in EXPECTED_COLS]
+        )
+    )
+    rows = [
+        html.Tr([html.Td(row[col]) for col in performance.columns])
+        for row in performance.to_dict("records")
+    ]
 
-    return cl_briefs_barchart(briefs, notifications)
+    return dbc.Table(
+        [header, html.Tbody(rows)], striped=True, bordered=True, hover=True
+    )
 
 
 @app.callback(
@@ -177,7 +255,7 @@ def get_campaign_details(campaigns):
         raise PreventUpdate
 
     print("geting details")
-    campaign = pd.read_json(campaigns, orient="split")
+    campaign = load_campaigns(campaigns)
 
     if len(campaign) != 1:
         # replace with empty table
@@ -307,12 +385,10 @@ def get_influencers(campaigns):
         2
     )
     # last_active_sent = pd.to_datetime(briefs['brief_last_active_brief_sent']).apply(lambda x: x.replace(tzinfo=None))
-    display_influencers["brief_inserted_at"] = pd.to_datetime(
+    display_influencers["brief_inserted_at"] = naive_timestamps(
         display_influencers["brief_inserted_at"]
-    ).apply(lambda x: x.replace(tzinfo=None))
-    display_influencers["brief_status"] = influencers.apply(
-        lambda row: map_brief_status(row), axis=1
     )
+    display_influencers["brief_status"] = campaign_brief_statuses(influencers)
 
     cols = [
         {"id": "handle", "name": "Handle"},
@@ -362,7 +438,7 @@ def generate_csv(n_clicks, campaign, current_email):
     if n_clicks == 0 or n_clicks is None or len(influencers) == 0:
         raise PreventUpdate
 
-    campaign = pd.read_json(campaign, orient="split")
+    campaign = load_campaigns(campaign)
 
     download_influencers = influencers.loc[
         :,
@@ -385,9 +461,7 @@ def generate_csv(n_clicks, campaign, current_email):
     # download_influencers['brief_inserted_at'] = pd.to_datetime(download_influencers['brief_inserted_at']).apply(lambda x: x.replace(tzinfo=None))
     campaign_name = campaign.loc[0, "name"]
     campaign_name = campaign_name.lower().replace(" ", "_")
-    download_influencers["brief_status"] = influencers.apply(
-        lambda row: map_brief_status(row), axis=1
-    )
+    download_influencers["brief_status"] = campaign_brief_statuses(influencers)
 
     # Format data and filename ready for download
     filename = f"campaign_lookup_{campaign_name}.csv"
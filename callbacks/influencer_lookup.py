@@ -18,7 +18,6 @@ import dash_bootstrap_components as dbc
 
 # Utilities
 import pandas as pd
-import requests
 from dash import dash_table, html
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
@@ -26,6 +25,7 @@ from dateutil.relativedelta import relativedelta
 
 # Data & Components & Helpers
 from components.components import *
+from data.brief_status import *
 from data.functions import *
 from data.influencer_lookup import *
 from graphs.graphs import *
@@ -33,9 +33,6 @@ from graphs.graphs import *
 # Dash componenets
 from main import app
 
-FB_API_BASE = "https://graph.facebook.com/v5.0/"
-IG_BD_PARAMS = "{username,followers_count,media_count,follows_count,media{id,media_url,comments_count,like_count}}"
-
 """
 --------------------------------------------------------------------------------
 Helper functions
@@ -62,33 +59,6 @@ def icon_text(title, emoji, value):
     )
 
 
-def il_map_brief_status(row):
-    """helper to map brief statuses"""
-    if row["status"] in (
-        "Approved",
-        "Fulfilled",
-        "Completed",
-        "Processing Payment",
-    ):
-        return "Successful"
-    elif row["status"] == "Rejected":
-        return "Unsucessful"
-    elif row["status"] in ("Invitation Accepted", "Shortlisted"):
-        return "Applied"
-    elif row["is_viewed"] and row["status"] in (
-        "Invited",
-        "Invitation Rejected",
-    ):
-        return "Viewed"
-    elif not row["is_viewed"] and row["status"] in (
-        "Invited",
-        "Invitation Rejected",
-    ):
-        return "Did not view"
-
-    return "Unknown"
-
-
 def get_percentile(current, dist, key):
     """Calculate the percentile the current record sits within"""
     current_pos = current[key].iloc[0]  # noqa
@@ -144,6 +114,19 @@ Callback functions
 """
 
 
+@app.callback(
+    Output("il_influencer_drop_down", "options"),
+    [Input("il_influencer_drop_down", "search_value")],
+    [State("il_influencer_drop_down", "value")],
+)
+def get_il_social_accounts(search, social_id):
+    """Suggest the social accounts matching the handle as it is typed"""
+    if not search:
+        raise PreventUpdate  # Keep the current options
+
+    return search_social_accounts(search, selected=social_id)
+
+
 @app.callback(
     Output("il-brief-dataset", "data"),
     [
@@ -158,6 +141,7 @@ def get_il_briefs(social_id, start_date, end_date):
         raise PreventUpdate  # Stop update
 
     il_briefs = fetch_il_briefs(social_id, start_date, end_date)
+    il_briefs["new_status"] = influencer_brief_outcomes(il_briefs)
 
     return il_briefs.to_json(date_format="iso", orient="split")
 
@@ -243,26 +227,12 @@ def build_demographics(social_id):
     if not il_demog["token_valid"] and (
         il_demog["last_active"] <= date.today() + relativedelta(months=-2)
     ):
-        query_as = fetch_ig_token("strattidaniel")
-        api_url = f"{FB_API_BASE}{query_as['social_id']}?fields=business_discovery.username({il_demog['handle']}){IG_BD_PARAMS}"
-        headers = {"Authorization": f"Bearer {query_as['social_token']}"}
-
-        try:
-            # Query API
-            response = requests.get(api_url, headers=headers)
-            json_body = response.json()
-
-        except Exception as e:
-            raise Exception(api_url, str(e))
+        # Cached & timeout bounded, None when the API is unavailable
+        api_res = fetch_business_discovery(il_demog["handle"])
 
-        if (
-            "business_discovery" in json_body.keys()
-            and "media" in json_body["business_discovery"].keys()
-            and "data" in json_body["business_discovery"]["media"].keys()
-        ):
+        if api_res is not None and api_res.get("media", {}).get("data"):
 
             # update il_demog with API details
-            api_res = json_body["business_discovery"]
             il_demog["followers_count"] = api_res.get(
                 "followers_count", il_demog["followers_count"]
             )
@@ -338,7 +308,6 @@ def build_brief_table(il_serialise):
     if len(il_briefs) == 0:
         raise PreventUpdate
 
-    il_briefs["new_status"] = il_briefs.apply(lambda x: il_map_brief_status(x), axis=1)
     # Set table columns, ids map to column names from data/influencer_usage.py
     cols = [
         {"id": "name", "name": "Campaign"},
@@ -382,7 +351,6 @@ def build_il_brief_chart(il_serialise):
         raise PreventUpdate
 
     # Generate line graph
-    il_briefs["new_status"] = il_briefs.apply(lambda x: il_map_brief_status(x), axis=1)
     barchart = il_brief_barchart(il_briefs)
 
     return barchart
@@ -119,11 +119,11 @@ def get_iu_stats(
     customer_type = None if customer_type == "all" else customer_type
     service_level = None if service_level == "all" else service_level
 
-    # Extract data with filters from postgres
-    iu_briefs = fetch_iu_briefs(
+    # Extract the usage of each influencer with filters from postgres
+    iu_table = fetch_iu_table(
         start_date, end_date, team_val, region, customer_type, service_level
     )
-    if len(iu_briefs) == 0:
+    if len(iu_table) == 0:
         # see: https://dash.plotly.com/sharing-data-between-callbacks
         iu_serialise = {
             "iu_table": pd.DataFrame().to_json(orient="split", date_format="iso"),
@@ -131,67 +131,6 @@ def get_iu_stats(
         }
         return json.dumps(iu_serialise)
 
-    # Collect additional data
-    iu_stats = fetch_iu_stats(
-        start_date, end_date, iu_briefs["influencer_id"].tolist(), region
-    )
-    iu_local_aud = fetch_iu_local_audience(iu_briefs["influencer_id"].to_list(), region)
-
-    # use bool val to determine if brief was won or lost
-    iu_briefs["was_won"] = iu_briefs["participation"]
-
-    # Calculate Table stats
-    iu_briefs_table = (
-        iu_briefs.groupby(["influencer_id"])
-        .agg(
-            {
-                "participation": "sum",
-                "brief_id": "count",
-                "similarity_score": "mean",
-                "engagement_rate": "mean",
-            }
-        )
-        .reset_index()
-    )
-
-    # Merge data for table
-    iu_table = iu_stats.merge(
-        iu_briefs_table,
-        how="left",
-        left_on="id",
-        right_on="influencer_id",
-        suffixes=("", "_"),
-    )
-
-    # extract won and lost local audience
-    if region is not None:
-        iu_local_table = (
-            iu_local_aud.groupby(["influencer_id", "region"], as_index=False)
-            .agg({"local_audience": "mean"})
-            .reset_index()
-        )
-        merge_sum = ["influencer_id", "region"]
-        merge_table = ["id", "region"]
-    else:
-        iu_local_table = (
-            iu_local_aud.groupby(["influencer_id", "country"], as_index=False)
-            .agg({"local_audience": "mean"})
-            .reset_index()
-        )
-        merge_sum = ["influencer_id", "country"]
-        merge_table = ["id", "country"]
-
-    # Merge Audience
-    iu_table = iu_table.merge(
-        iu_local_table,
-        how="left",
-        left_on=merge_table,
-        right_on=merge_sum,
-        suffixes=("", "_audience"),
-    )
-
-    iu_table = iu_table.rename(columns={"brief_id": "applications"})
-
     # Calculate acceptance rate
     try:
         iu_table["accept_rate"] = (
@@ -388,16 +327,16 @@ def build_iu_summary(start_date, end_date, team_val, region, service_level):
         / won_local_engage["followers_count"].sum()
     ) * 100
     avg_local_won = (
-        float(won_local_engage["local_audience_value"].sum())
-        / float(won_local_engage["followers_count"].sum())
+        won_local_engage["local_audience_value"].sum()
+        / won_local_engage["followers_count"].sum()
     ) * 100
     avg_engage_lost = (
         lost_local_engage["engagements"].sum()
         / lost_local_engage["followers_count"].sum()
     ) * 100
     avg_local_lost = (
-        float(lost_local_engage["local_audience_value"].sum())
-        / float(lost_local_engage["followers_count"].sum())
+        lost_local_engage["local_audience_value"].sum()
+        / lost_local_engage["followers_count"].sum()
     ) * 100
 
     # Calc averages for won vs lost
@@ -421,28 +360,22 @@ def build_iu_summary(start_date, end_date, team_val, region, service_level):
     vb_percent = value_box(
         "🧑‍💻 ",
         "Influencers completed over 50%",
-        f"{float(percent_above_50):.2f}%",
-    )
-    vb_success_rate = value_box(
-        "😁 ", "Success Rate", f"{float(total_succes_rate):.2f}%"
-    )
-    vb_avg_sim_won = value_box(
-        "📝 ", "Avg Similarity (Won)", f"{float(avg_sim_won):.2f}%"
-    )
-    vb_avg_sim_lost = value_box(
-        "📝 ", "Avg Similarity (Lost)", f"{float(avg_sim_lost):.2f}%"
+        f"{percent_above_50:.2f}%",
     )
+    vb_success_rate = value_box("😁 ", "Success Rate", f"{total_succes_rate:.2f}%")
+    vb_avg_sim_won = value_box("📝 ", "Avg Similarity (Won)", f"{avg_sim_won:.2f}%")
+    vb_avg_sim_lost = value_box("📝 ", "Avg Similarity (Lost)", f"{avg_sim_lost:.2f}%")
     vb_avg_engage_won = value_box(
-        "🙌 ", "Avg Engagement (Won)", f"{float(avg_engage_won):.2f}%"
+        "🙌 ", "Avg Engagement (Won)", f"{avg_engage_won:.2f}%"
     )
     vb_avg_engage_lost = value_box(
-        "🙌 ", "Avg Engagement (Lost)", f"{float(avg_engage_lost):.2f}%"
+        "🙌 ", "Avg Engagement (Lost)", f"{avg_engage_lost:.2f}%"
     )
     vb_avg_local_won = value_box(
-        "🌍 ", "Avg Local Audience (Won)", f"{float(avg_local_won):.2f}%"
+        "🌍 ", "Avg Local Audience (Won)", f"{avg_local_won:.2f}%"
     )
     vb_avg_local_lost = value_box(
-        "🌍 ", "Avg Local Audience (Lost)", f"{float(avg_local_lost):.2f}%"
+        "🌍 ", "Avg Local Audience (Lost)", f"{avg_local_lost:.2f}%"
     )
 
     # return all 8 summary stats
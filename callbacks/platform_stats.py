@@ -8,8 +8,10 @@
  @desc:
 Callbacks for platform stats."""
 import datetime
+import functools
 
 # Utilities
+import numpy as np
 import pandas as pd
 
 # Dash components
@@ -56,55 +58,248 @@ regions = [
 ]
 
 
-def find_region(x, countries, regions=regions):
+def country_regions(countries, regions=regions):
     """
-    Converts the sub_region and region into Vamps regional classifications
+    Precomputes a lookup of country code to Vamps regional classification
 
     """
-    # Avoids error grabbing data pre 2020
-    if x is None:
-        result = "multi-region"  # used this as it was the catch all already
+    vamp = {i["sub_region"]: i["Vamp"] for i in regions}
 
-    elif len(x.split(",")) == 1:
-        region = countries.loc[countries["code"] == x].reset_index(drop=True)
-        classify = [
-            i["Vamp"] for i in regions if i["sub_region"] == region["sub_region"][0]
-        ][0]
-        result = classify
+    return countries.drop_duplicates("code").set_index("code")["sub_region"].map(vamp)
 
-    elif len(x.split(",")) > 1:
-        region = countries.loc[countries["code"].isin(x.split(","))].reset_index(
-            drop=True
+
+def classify_regions(locations, region_lookup):
+    """
+    Converts comma separated country codes into Vamps regional classifications
+    in one pass, locations spanning more than one region are "multi-region"
+
+    """
+    codes = locations.reset_index(drop=True).str.split(",").explode()
+    classify = codes.map(region_lookup).groupby(level=0).agg(["nunique", "first"])
+
+    # Also avoids error grabbing data pre 2020, as None was the catch all already
+    result = classify["first"].where(classify["nunique"] == 1, "multi-region")
+
+    return pd.Series(result.values, index=locations.index)
+
+
+# Column labelling each reporting period
+PERIODS = {
+    "monthly": "year-month",
+    "quarterly": "year-quarter",
+    "yearly": "financial_year",
+}
+
+
+def campaign_periods(campaigns):
+    """
+    Adds the reporting periods of each campaign i.e year-month, financial_year
+    (q1 starts 01/07) & year-quarter
+
+    """
+    start_year = campaigns["start_year"].astype(int)
+    start_month = pd.to_datetime(campaigns["start_month"].astype(int), format="%m")
+    first_half = campaigns["start_quarter"].isin(["quarter-1", "quarter-2"])
+
+    campaigns["start_month"] = start_month.dt.month_name()
+    campaigns["year-month"] = start_year.astype(str) + "-" + campaigns["start_month"]
+    campaigns["financial_year"] = (start_year + first_half).astype(str)
+    campaigns["year-quarter"] = (
+        campaigns["financial_year"] + "-" + campaigns["start_quarter"]
+    )
+    campaigns["start_year"] = start_year.astype(str)
+
+    return campaigns
+
+
+# Breakdown kept for every period, at team level so unique customers can still
+# be counted from a slice of the cube
+CUBE_DIMENSIONS = [
+    "region",
+    "has_managed_service",
+    "service",
+    "first_customer_flag",
+    "team_name",
+]
+MONTH_COLUMNS = ["start_year", "start_month", "start_quarter"]
+
+
+def month_cube(campaigns):
+    """
+    Aggregates campaign counts & budgets per start month by region, service
+    level & new vs returning customer. Budgets are kept per currency, see
+    `price_month_cube`
+
+    """
+    campaigns = campaigns.copy()
+    campaigns["service"] = np.where(
+        campaigns["has_managed_service"], "High Touch", "Low Touch"
+    )
+
+    return (
+        campaigns.groupby(
+            MONTH_COLUMNS + CUBE_DIMENSIONS + ["currency"], sort=False, dropna=False
+        )
+        .agg(campaigns=("campaign_id", "size"), budget=("budget", "sum"))
+        .reset_index()
+    )
+
+
+def cube_months(cube):
+    """The calendar month of each row of a month cube"""
+    return pd.PeriodIndex(
+        pd.to_datetime(
+            {"year": cube["start_year"], "month": cube["start_month"], "day": 1}
+        ),
+        freq="M",
+    )
+
+
+def live_month_cube(start_date, end_date, customer_type):
+    """Month cube of the live campaign data within a date range"""
+    campaigns = retrieve_campaigns(start_date, end_date, customer_type)
+    campaigns["region"] = classify_regions(campaigns["desired_location"], region_lookup)
+
+    return month_cube(campaigns)
+
+
+def fetch_month_cube(start_date, end_date, customer_type):
+    """
+    Month cube for a date range, priced at the current exchange rates. Months
+    which have closed are computed once & persisted, and only recomputed when
+    their campaigns change. The open month (and any partial month at either
+    end of the range) is recomputed from live data
+
+    """
+    customer_type = (
+        customer_type if customer_type in ["selfserve", "enterprise"] else "all"
+    )
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    # the range includes the whole of the end date
+    end_of_range = end + pd.Timedelta(days=1)
+    open_month = pd.Timestamp.today().to_period("M")
+    closed = [
+        month
+        for month in pd.period_range(start, end, freq="M")
+        if month < open_month
+        and month.start_time >= start
+        and month.end_time < end_of_range
+    ]
+    if not closed:
+        return price_month_cube(live_month_cube(start_date, end_date, customer_type))
+
+    try:
+        stored = fetch_closed_months(customer_type)
+    except Exception as e:
+        # Never rewrite the store after a failed read, it would drop months
+        print(e)
+        return price_month_cube(live_month_cube(start_date, end_date, customer_type))
+
+    # Recompute & persist any closed month not stored yet, or whose campaigns
+    # changed since it was stored. A zero count row marks months without
+    # campaigns as computed
+    fingerprints = fetch_month_fingerprints(
+        str(closed[0].start_time.date()), str((closed[-1] + 1).start_time.date())
+    )
+    current = dict(zip(cube_months(fingerprints), fingerprints["fingerprint"]))
+    current = {month: str(current.get(month, "none")) for month in closed}
+
+    stored_months = cube_months(stored) if len(stored) else pd.PeriodIndex([], freq="M")
+    stored_fingerprints = (
+        dict(zip(stored_months, stored["fingerprint"])) if len(stored) else {}
+    )
+    stale = [
+        month for month in closed if stored_fingerprints.get(month) != current[month]
+    ]
+    if stale:
+        fresh = live_month_cube(
+            str(stale[0].start_time.date()),
+            str((stale[-1] + 1).start_time.date()),
+            customer_type,
+        )
+        fresh = fresh.loc[cube_months(fresh).isin(stale)].copy()
+        fresh["fingerprint"] = cube_months(fresh).map(current)
+        computed = pd.DataFrame(
+            {
+                "start_year": [month.year for month in stale],
+                "start_month": [month.month for month in stale],
+                "campaigns": 0,
+                "fingerprint": [current[month] for month in stale],
+            }
+        )
+        stored = pd.concat(
+            [stored.loc[~stored_months.isin(stale)], fresh, computed],
+            ignore_index=True,
+        )
+        post_closed_months(customer_type, stored)
+        stored_months = cube_months(stored)
+
+    # Live data either side of the closed months, dropping the closed months
+    # the boundary dates overlap
+    live = []
+    if (closed[-1] + 1).start_time <= end:
+        live.append(
+            live_month_cube(
+                str((closed[-1] + 1).start_time.date()), end_date, customer_type
+            )
         )
-        classify = [
-            i["Vamp"]
-            for i in regions
-            if i["sub_region"] in region["sub_region"].tolist()
-        ]
-        if len(set(classify)) > 1:
-            result = "multi-region"
-        else:
-            result = classify[0]
+    if start < closed[0].start_time:
+        live.append(
+            live_month_cube(start_date, str(closed[0].start_time.date()), customer_type)
+        )
+    months = [stored.loc[stored_months.isin(closed) & (stored["campaigns"] > 0)]]
+    for cube in live:
+        months.append(cube.loc[~cube_months(cube).isin(closed)])
+
+    return price_month_cube(pd.concat(months, ignore_index=True))
+
+
+def period_cube(months):
+    """
+    Rolls the month cube up into campaign counts & revenue for every reporting
+    period, see `CUBE_DIMENSIONS` for the breakdown
 
-    else:
-        result = "multi-region"
+    """
+    months = campaign_periods(months.copy())
+
+    cube = []
+    for period, column in PERIODS.items():
+        data = (
+            months.groupby([column] + CUBE_DIMENSIONS, sort=False, dropna=False)
+            .agg({"campaigns": "sum", "adjusted_budget": "sum"})
+            .reset_index()
+            .rename(columns={column: "label"})
+        )
+        data.insert(0, "period", period)
+        cube.append(data)
 
-    return result
+    return pd.concat(cube, ignore_index=True)
 
 
-def align_financial_year(row):
-    """Map year dates to financial years i.e q1 starts 01/07"""
-    if row["start_quarter"] in ["quarter-1", "quarter-2"]:
-        return int(row["start_year"]) + 1
+@functools.lru_cache(maxsize=8)
+def load_cube(cube):
+    """
+    Parses the stored cube once per dataset into a slice for each period, so
+    switching periods only selects a slice
+
+    """
+    cube = pd.read_json(cube, orient="split", dtype=False)
 
-    return int(row["start_year"])
+    return {
+        period: cube.loc[cube["period"] == period]
+        .drop(columns="period")
+        .rename(columns={"label": column})
+        .reset_index(drop=True)
+        for period, column in PERIODS.items()
+    }
 
 
 countries = fetch_countries()
+region_lookup = country_regions(countries)
 
 
 @app.callback(
-    Output("ps-campaigns", "data"),
+    Output("ps-cube", "data"),
     [
         Input("platform_stats_date_inputs", "start_date"),
         Input("platform_stats_date_inputs", "end_date"),
@@ -113,15 +308,13 @@ countries = fetch_countries()
 )
 def get_campaign(start_date, end_date, customer_type):
     """
-    Saves campaign data to state
+    Saves the period cube of the campaign data to state
 
     """
-    campaigns = retrieve_campaigns(start_date, end_date, customer_type)
-    campaigns["region"] = campaigns["desired_location"].apply(
-        find_region, countries=countries
-    )
+    months = fetch_month_cube(start_date, end_date, customer_type)
+    cube = period_cube(months)
 
-    return campaigns.to_json(orient="split", date_format="iso")
+    return cube.to_json(orient="split")
 
 
 @app.callback(
@@ -136,37 +329,19 @@ def get_campaign(start_date, end_date, customer_type):
         Output("longitudinal_new_vs_returning_customers", "children"),
     ],
     [
-        Input("ps-campaigns", "data"),
+        Input("ps-cube", "data"),
         Input("platform_stats_period_filter", "value"),
     ],
 )
-def platform_stats_charts_charts(campaigns, period_filter):
+def platform_stats_charts_charts(cube, period_filter):
     """
-    Generates charts for platform stats page
+    Generates charts for platform stats page from the slice of the period cube
     """
-
-    campaigns = pd.read_json(campaigns, orient="split")
-    if campaigns is None:
+    if cube is None:
         raise PreventUpdate
 
-    campaigns["start_month"] = pd.to_datetime(
-        campaigns["start_month"].astype(int), format="%m"
-    )
-    campaigns["year-month"] = (
-        campaigns["start_year"].astype(int).astype(str)
-        + "-"
-        + campaigns["start_month"].dt.month_name().astype(str)
-    )
-
-    campaigns["financial_year"] = campaigns.apply(align_financial_year, axis=1).astype(
-        str
-    )
-    campaigns["year-quarter"] = (
-        campaigns["financial_year"].astype(int).astype(str)
-        + "-"
-        + campaigns["start_quarter"]
-    )
-    campaigns["start_year"] = campaigns["start_year"].astype(int).astype(str)
+    period = period_filter if period_filter in PERIODS else "monthly"
+    campaigns = load_cube(cube)[period]
 
     cum_chart = cumulative_campaigns_bar_chart(campaigns, period_filter)
     hi_lo_chart = high_touch_low_touch_bar_chart(campaigns)
@@ -194,9 +369,14 @@ def platform_stats_charts_charts(campaigns, period_filter):
 @app.callback(
     Output("ps_download", "data"),
     [Input("ps_download_btn", "n_clicks")],
-    [State("ps-campaigns", "data"), State("current_loggedin_email", "data")],
+    [
+        State("platform_stats_date_inputs", "start_date"),
+        State("platform_stats_date_inputs", "end_date"),
+        State("platform_stats_customer_type_dropdown", "value"),
+        State("current_loggedin_email", "data"),
+    ],
 )
-def generate_csv(n_clicks, campaigns, current_email):
+def generate_csv(n_clicks, start_date, end_date, customer_type, current_email):
     """ """
     restrict_resource(current_email)
 
@@ -204,29 +384,10 @@ def generate_csv(n_clicks, campaigns, current_email):
     if n_clicks == 0 or n_clicks is None:
         raise PreventUpdate
 
-    campaigns = pd.read_json(campaigns, orient="split")
-    if campaigns is None:
-        raise PreventUpdate
-
-    campaigns["start_month"] = pd.to_datetime(
-        campaigns["start_month"].astype(int), format="%m"
-    )
-    campaigns["year-month"] = (
-        campaigns["start_year"].astype(int).astype(str)
-        + "-"
-        + campaigns["start_month"].dt.month_name().astype(str)
-    )
-
-    campaigns["financial_year"] = campaigns.apply(align_financial_year, axis=1).astype(
-        str
-    )
-    campaigns["year-quarter"] = (
-        campaigns["financial_year"].astype(int).astype(str)
-        + "-"
-        + campaigns["start_quarter"]
-    )
-    campaigns["start_year"] = campaigns["start_year"].astype(int).astype(str)
-    campaigns["start_month"] = campaigns["start_month"].dt.month_name().astype(str)
+    # The charts only keep the cube, so the campaigns are fetched on demand
+    campaigns = retrieve_campaigns(start_date, end_date, customer_type)
+    campaigns["region"] = classify_regions(campaigns["desired_location"], region_lookup)
+    campaigns = campaign_periods(campaigns)
 
     # Format data and filename ready for download
     today = datetime.datetime.today()
@@ -112,8 +112,8 @@ def build_influencer_table(
     )
 
     # format data for display
-    data["engagement_rate"] = (data["engagement_rate"].astype(float) * 100).round(2)
-    data["local_audience"] = (data["local_audience"].astype(float) * 100).round(2)
+    data["engagement_rate"] = (data["engagement_rate"] * 100).round(2)
+    data["local_audience"] = (data["local_audience"] * 100).round(2)
 
     cols = [
         {"id": "handle", "name": "Handle"},
@@ -192,7 +192,7 @@ def build_segment_charts(
         activity,
         platforms,
     )
-    data["engagement_rate"] = (data["engagement_rate"].astype(float) * 100).round(2)
+    data["engagement_rate"] = (data["engagement_rate"] * 100).round(2)
 
     return [
         gender_segementation_chart(data),
@@ -376,8 +376,8 @@ def generate_csv(
     data = data.loc[:,]
 
     # format data for display
-    data["engagement_rate"] = (data["engagement_rate"].astype(float) * 100).round(2)
-    data["local_audience"] = (data["local_audience"].astype(float) * 100).round(2)
+    data["engagement_rate"] = (data["engagement_rate"] * 100).round(2)
+    data["local_audience"] = (data["local_audience"] * 100).round(2)
 
     # Format data and filename ready for download
     today = datetime.datetime.today()
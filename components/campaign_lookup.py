@@ -71,6 +71,41 @@ CAMPAIGN_LOOKUP = dbc.Tab(
                 ),
             ]
         ),
+        # Expected performance of the squad & every candidate
+        dbc.Row(
+            [
+                dbc.Col(
+                    [
+                        dbc.Card(
+                            [
+                                dbc.CardHeader([html.H5("Expected Performance")]),
+                                dbc.CardBody(
+                                    [
+                                        dbc.RadioItems(
+                                            id="cl_expected_deliverable",
+                                            options=[
+                                                {"label": "Posts", "value": "post"},
+                                                {"label": "Stories", "value": "story"},
+                                            ],
+                                            value="post",
+                                            inline=True,
+                                        ),
+                                        dcc.Loading(
+                                            type="default",
+                                            children=[
+                                                html.Div(id="cl_expected_performance")
+                                            ],
+                                        ),
+                                    ]
+                                ),
+                            ]
+                        )
+                    ],
+                    md=12,
+                )
+            ],
+            style={"marginTop": 30},
+        ),
         # Influencer Table
         dbc.Row(
             [
@@ -16,23 +16,12 @@ from datetime import datetime as dt
 import dash_bootstrap_components as dbc
 from dash import dcc, html
 
-from data.influencer_lookup import fetch_social_accounts
-
 # Determin current fiscal date
 if date.today().month < 7:
     current_fiscal = dt(date.today().year - 1, 7, 1)
 else:
     current_fiscal = dt(date.today().year, 7, 1)
 
-social_accounts = fetch_social_accounts()
-
-try:
-    social_accounts.columns = ["value", "label"]
-except ValueError:
-    social_accounts.assign(value="", label="")
-except Exception as e:
-    print(e)
-
 # Influencer Usage Page
 INFLUENCER_LOOKUP = dbc.Tab(
     label="Influencer Lookup",
@@ -55,9 +44,11 @@ INFLUENCER_LOOKUP = dbc.Tab(
                                     "Select a social account",
                                     style={"paddingTop": "1em"},
                                 ),
+                                # Options are searched as the handle is typed
                                 dcc.Dropdown(
                                     id="il_influencer_drop_down",
-                                    options=social_accounts.to_dict("records"),
+                                    options=[],
+                                    placeholder="Search by handle",
                                 ),
                             ],
                             style={
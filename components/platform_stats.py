@@ -89,7 +89,7 @@ PLATFORM_STATS = dbc.Tab(
     label="Platform Statistics",
     children=[
         # DATA
-        dcc.Store(id="ps-campaigns"),
+        dcc.Store(id="ps-cube"),  # Campaign counts & revenue per period
         FILTERS,
         # Row 1
         dbc.Row(
@@ -0,0 +1,108 @@
+"""
+ data/brief_status.py
+
+ @desc:
+ Vectorized labelling of brief statuses for the campaign & influencer lookup
+ pages. Each label is picked with `np.select` over whole columns (status,
+ viewed flag & when the brief was sent) rather than row by row.
+"""
+import numpy as np
+import pandas as pd
+
+""" Briefs sent before this didn't record whether they were viewed """
+BRIEF_VIEWED_SINCE = pd.Timestamp(2019, 2, 12)
+
+INVITED_STATUS_ID = 2
+APPLIED_STATUS_ID = 3
+INVITATION_REJECTED_STATUS_ID = 4
+
+SUCCESSFUL_STATUSES = ["Approved", "Fulfilled", "Completed", "Processing Payment"]
+APPLIED_STATUSES = ["Invitation Accepted", "Shortlisted"]
+INVITED_STATUSES = ["Invited", "Invitation Rejected"]
+
+
+def naive_timestamps(values):
+    """
+    Parse timestamps & drop their timezone, keeping the wall time
+            values : Series
+                    The timestamps, as datetimes or ISO strings
+
+            return : Series
+                    Returns the timezone naive timestamps
+    """
+    values = pd.to_datetime(values)
+
+    if values.dt.tz is not None:
+        values = values.dt.tz_localize(None)
+
+    return values
+
+
+def viewed_flags(values):
+    """The viewed flags of briefs as booleans, unknown counts as not viewed"""
+    return values.fillna(False).astype(bool).to_numpy()
+
+
+def campaign_brief_statuses(briefs):
+    """
+    Label the status of each brief sent for a campaign, splitting invitations
+    by whether they were viewed
+            briefs : Dataframe
+                    The briefs, with brief_status_id, brief_status,
+                    brief_is_viewed & brief_inserted_at columns
+
+            return : ndarray
+                    Returns the status label of each brief
+    """
+    status_id = briefs["brief_status_id"].to_numpy()
+    viewed = viewed_flags(briefs["brief_is_viewed"])
+    tracked = (
+        naive_timestamps(briefs["brief_inserted_at"]) > BRIEF_VIEWED_SINCE
+    ).to_numpy()
+
+    invited = (status_id == INVITED_STATUS_ID) & tracked
+    rejected = (status_id == INVITATION_REJECTED_STATUS_ID) & tracked
+
+    return np.select(
+        [
+            invited & viewed,
+            invited,
+            status_id == APPLIED_STATUS_ID,
+            rejected & viewed,
+            rejected,
+        ],
+        [
+            "Invited - Viewed",
+            "Invited - Not Viewed",
+            "Applied",
+            "Viewed - Did not apply",
+            "Invited - Not Viewed",
+        ],
+        default=briefs["brief_status"].to_numpy(dtype=object),
+    )
+
+
+def influencer_brief_outcomes(briefs):
+    """
+    Label the outcome of each brief sent to an influencer
+            briefs : Dataframe
+                    The briefs, with status & is_viewed columns
+
+            return : ndarray
+                    Returns the outcome of each brief
+    """
+    status = briefs["status"]
+    viewed = viewed_flags(briefs["is_viewed"])
+    invited = status.isin(INVITED_STATUSES).to_numpy()
+
+    return np.select(
+        [
+            status.isin(SUCCESSFUL_STATUSES).to_numpy(),
+            (status == "Rejected").to_numpy(),
+            status.isin(APPLIED_STATUSES).to_numpy(),
+            invited & viewed,
+            invited,
+        ],
+        ["Successful", "Unsucessful", "Applied", "Viewed", "Did not view"],
+        default="Unknown",
+    )
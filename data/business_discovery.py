@@ -0,0 +1,225 @@
+"""
+ data/business_discovery.py
+
+ @desc:
+ Client of the Instagram business discovery API (Facebook Graph), used by the
+ influencer lookup page when an influencers own token is stale. Responses are
+ cached per handle, requests are bounded by strict timeouts & a circuit
+ breaker stops calling the API while it is failing, so a slow Graph API only
+ means the page falls back to the stats in postgres.
+"""
+import threading
+import time
+
+import requests
+
+FB_API_BASE = "https://graph.facebook.com/v5.0/"
+IG_BD_PARAMS = "{username,followers_count,media_count,follows_count,media{id,media_url,comments_count,like_count}}"
+
+""" The account whose token queries the API on behalf of the dashboard """
+IG_BD_ACCOUNT = "strattidaniel"
+
+IG_BD_TTL = 6 * 60 * 60  # seconds a handles response is reused
+IG_BD_CACHE_SIZE = 1024  # handles whose response is kept
+IG_BD_TOKEN_TTL = 15 * 60  # seconds the querying token is reused
+IG_BD_TIMEOUT = (2, 4)  # seconds to connect & to read
+IG_BD_FAILURES = 3  # consecutive failures that open the circuit
+IG_BD_COOLDOWN = 5 * 60  # seconds the circuit stays open
+
+""" Graph error codes of an expired or revoked token """
+IG_BD_AUTH_ERRORS = {102, 190}
+
+
+class GraphError(Exception):
+    """An error body returned by the Graph API, e.g an OAuthException"""
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing service, after `failures` consecutive failures
+    calls are refused for `cooldown` seconds, then a single trial call is let
+    through which closes the circuit again if it succeeds
+    """
+
+    def __init__(self, failures=IG_BD_FAILURES, cooldown=IG_BD_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.failed = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may be made now"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+
+            # Let one trial call through, re-opening until it reports back
+            self.opened_at = time.monotonic()
+            return True
+
+    def success(self):
+        with self.lock:
+            self.failed = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self.lock:
+            self.failed += 1
+            if self.failed >= self.failures:
+                self.opened_at = time.monotonic()
+
+
+class BusinessDiscovery:
+    """A cached, timeout bounded client of the business discovery API"""
+
+    def __init__(
+        self,
+        fetch_token,
+        ttl=IG_BD_TTL,
+        cache_size=IG_BD_CACHE_SIZE,
+        token_ttl=IG_BD_TOKEN_TTL,
+        timeout=IG_BD_TIMEOUT,
+        breaker=None,
+    ):
+        """
+        :param fetch_token: returns the social_id & social_token to query as.
+        :type fetch_token: callable
+        :param ttl: seconds a handles response is reused.
+        :type ttl: int
+        :param cache_size: handles whose response is kept, the oldest are
+            evicted first.
+        :type cache_size: int
+        :param token_ttl: seconds the querying token is reused.
+        :type token_ttl: int
+        :param timeout: seconds to connect & to read a response.
+        :type timeout: tuple
+        :param breaker: stops calling the API while it is failing.
+        :type breaker: CircuitBreaker
+        """
+        self.fetch_token = fetch_token
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.token_ttl = token_ttl
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        self.cache = {}
+        self.token = (None, 0.0)
+        self.lock = threading.Lock()
+
+    def _token(self):
+        with self.lock:
+            token, fetched_at = self.token
+
+        if token is None or time.monotonic() - fetched_at > self.token_ttl:
+            token = self.fetch_token()
+            with self.lock:
+                self.token = (token, time.monotonic())
+
+        return token
+
+    def _request(self, handle):
+        token = self._token()
+        url = (
+            f"{FB_API_BASE}{token['social_id']}"
+            f"?fields=business_discovery.username({handle}){IG_BD_PARAMS}"
+        )
+        headers = {"Authorization": f"Bearer {token['social_token']}"}
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        # Server errors & rate limits mean the API is failing, not the handle
+        if response.status_code >= 500 or response.status_code == 429:
+            response.raise_for_status()
+
+        body = response.json()
+        error = body.get("error")
+        if error is not None:
+            # The token expired or was revoked, a new one is fetched next time
+            if response.status_code == 401 or error.get("code") in IG_BD_AUTH_ERRORS:
+                with self.lock:
+                    self.token = (None, 0.0)
+
+            raise GraphError(
+                f"{response.status_code} {error.get('type')} {error.get('code')}:"
+                f" {error.get('message')}"
+            )
+
+        return body.get("business_discovery")
+
+    def _store(self, handle, result):
+        """Cache a response, evicting expired & then the oldest responses"""
+        now = time.monotonic()
+
+        with self.lock:
+            self.cache.pop(handle, None)
+            if len(self.cache) >= self.cache_size:
+                self.cache = {
+                    cached: entry
+                    for cached, entry in self.cache.items()
+                    if now - entry[1] < self.ttl
+                }
+
+            # responses are kept in the order they were fetched
+            while len(self.cache) >= self.cache_size:
+                self.cache.pop(next(iter(self.cache)))
+
+            self.cache[handle] = (result, now)
+
+    def discover(self, handle):
+        """
+        Get the public profile & recent media of an Instagram business account.
+        :param handle: the Instagram handle.
+        :type handle: str
+        :return: the business_discovery object, None if the account isn't
+            found, the API returns an error or can't be reached in time.
+            Errors aren't cached.
+        :rtype: dict
+        """
+        with self.lock:
+            cached = self.cache.get(handle)
+
+        if cached is not None and time.monotonic() - cached[1] < self.ttl:
+            return cached[0]
+
+        if not self.breaker.allow():
+            print(f"Business discovery circuit open, skipping {handle}")
+            return None
+
+        try:
+            result = self._request(handle)
+        except (requests.exceptions.RequestException, GraphError, ValueError) as ex:
+            self.breaker.failure()
+            print(f"Business discovery failed for {handle}: {ex}")
+            return None
+        except Exception:
+            self.breaker.failure()
+            raise
+
+        self.breaker.success()
+        self._store(handle, result)
+
+        return result
+
+
+class LocalBusinessDiscovery:
+    """
+    A local stand-in of `BusinessDiscovery` for tests & development, answering
+    from canned responses without calling the API
+    """
+
+    def __init__(self, responses=None):
+        """
+        :param responses: the business_discovery object of each handle.
+        :type responses: dict
+        """
+        self.responses = responses or {}
+        self.requests = []
+
+    def discover(self, handle):
+        self.requests.append(handle)
+        return self.responses.get(handle)
@@ -10,19 +10,106 @@
  campaign_lookup page. The two main data components are the data table showing
  campaign details & the briefs sent out for the campaign
 """
+import functools
+import threading
+import time
+
 import pandas as pd
 from psycopg2 import sql
 
 from data.functions import fetch_from_postgres
+from data.search_index import SearchIndex
 
 """
-Fetch the list of applicable campaigns
+In memory search index of the campaigns, serving the campaign search without
+querying postgres. It is refreshed in the background from the campaigns
+updated since the last refresh
 """
 
+CAMPAIGN_INDEX_TTL = 60  # seconds between refreshes
 
-def fetch_campaigns(search_term=None):
-    query = """
-    SELECT DISTINCT CONCAT('[', LPAD(CAST(campaigns.id AS VARCHAR), 6, '0'), '] ', campaigns.name) AS text_value
+campaign_index = SearchIndex()
+_campaign_index_state = {"updated_at": None, "refreshed_at": 0.0, "refreshing": False}
+_campaign_index_lock = threading.Lock()
+
+
+def fetch_campaign_index_rows(updated_since=None):
+    query = sql.SQL(
+        """
+    SELECT campaigns.id
+      , CONCAT('[', LPAD(CAST(campaigns.id AS VARCHAR), 6, '0'), '] ', campaigns.name) AS text_value
+      , CONCAT(campaigns.id, ' ', campaigns.name) AS search_text
+      , campaigns.campaign_status_id
+      , campaigns.updated_at
+    FROM campaigns
+    WHERE {since} IS NULL OR campaigns.updated_at > {since};
+  """
+    ).format(since=sql.Literal(updated_since))
+
+    return fetch_from_postgres(query)
+
+
+def refresh_campaign_index():
+    """
+    Apply the campaigns updated since the last refresh to the index, rejected
+    campaigns are removed
+    """
+    rows = fetch_campaign_index_rows(_campaign_index_state["updated_at"])
+
+    # ignore rejected campaigns
+    rejected = rows["campaign_status_id"] == 8
+    campaign_index.remove(rows.loc[rejected, "id"].tolist())
+    campaign_index.upsert(
+        rows.loc[~rejected, "id"].tolist(),
+        rows.loc[~rejected, "search_text"].tolist(),
+        rows.loc[~rejected, "text_value"].tolist(),
+    )
+
+    if len(rows) > 0:
+        _campaign_index_state["updated_at"] = rows["updated_at"].max()
+
+
+def _refresh_campaign_index_in_background():
+    try:
+        refresh_campaign_index()
+    finally:
+        _campaign_index_state["refreshing"] = False
+
+
+def search_campaigns(search_term=None, limit=100):
+    """
+    Search the campaigns by ID or name, case insensitive. The index is built
+    on first use, then refreshed in the background once older than
+    `CAMPAIGN_INDEX_TTL` while the current index keeps serving searches
+
+    return : DataFrame
+        The id & text_value of the best matches
+    """
+    with _campaign_index_lock:
+        stale = time.monotonic() - _campaign_index_state["refreshed_at"]
+
+        if _campaign_index_state["updated_at"] is None:
+            refresh_campaign_index()
+            _campaign_index_state["refreshed_at"] = time.monotonic()
+        elif stale > CAMPAIGN_INDEX_TTL and not _campaign_index_state["refreshing"]:
+            _campaign_index_state["refreshing"] = True
+            _campaign_index_state["refreshed_at"] = time.monotonic()
+            threading.Thread(
+                target=_refresh_campaign_index_in_background, daemon=True
+            ).start()
+
+    ids = campaign_index.search(search_term, limit)
+
+    return pd.DataFrame(
+        {"id": ids, "text_value": [campaign_index.labels.get(i) for i in ids]}
+    )
+
+
+def fetch_campaign(campaign_id):
+    """Fetch the details of a single campaign"""
+    query = sql.SQL(
+        """
+    SELECT CONCAT('[', LPAD(CAST(campaigns.id AS VARCHAR), 6, '0'), '] ', campaigns.name) AS text_value
       , c_status.name as status
       , currencies.symbol AS currency_symbol
       , currencies.code AS currency_code
@@ -30,19 +117,11 @@ def fetch_campaigns(search_term=None):
     FROM campaigns
     JOIN campaign_statuses c_status ON c_status.id = campaigns.campaign_status_id
     JOIN currencies ON currencies.id = campaigns.currency_id
-    WHERE campaigns.campaign_status_id NOT IN (8)
+    WHERE campaigns.id = {campaign_id};
   """
-    # ignore rejected campaigns
-
-    if search_term is not None:
-        query = (
-            f"{query} AND( CAST(campaigns.id AS VARCHAR) LIKE '%{search_term}%' OR"
-            f" campaigns.name LIKE '%{search_term}%')"
-        )
+    ).format(campaign_id=sql.Literal(campaign_id))
 
-    query = f"{query} ORDER BY text_value LIMIT 100;"
-
-    return fetch_from_postgres(sql.SQL(query))
+    return fetch_from_postgres(query)
 
 
 """
@@ -63,6 +142,7 @@ def fetch_briefs_influencers(campaign_id):
       , briefs.reward_value
       , b_status.name as brief_status
       , b_status.id as brief_status_id
+      , b_status.code as brief_status_code
       , CAST(
             audience_val.percentage AS DOUBLE PRECISION
           ) * 100 AS local_audience
@@ -88,20 +168,70 @@ def fetch_briefs_influencers(campaign_id):
 
 
 """
+Fetch the briefs of a campaign once per version of the campaign, for at most
+`CAMPAIGN_BRIEFS_TTL` seconds as brief & deliverable statuses change without
+updating the campaign. The locks are striped by campaign, so they stay bounded
+however many campaigns are looked up
 """
 
+CAMPAIGN_BRIEFS_TTL = 5 * 60  # seconds the briefs of a campaign are reused
+_campaign_brief_locks = [threading.Lock() for _ in range(32)]
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_briefs_influencers(campaign_id, updated_at, period):
+    return fetch_briefs_influencers(campaign_id)
+
+
+def fetch_campaign_briefs(campaign_id, updated_at):
+    """
+    The briefs & influencers of a campaign, cached by the campaign & when it
+    was last updated, and refreshed every `CAMPAIGN_BRIEFS_TTL` seconds.
+    Panels requesting the same campaign at once wait for the one query rather
+    than each running it. Callers must not mutate it
+    """
+    period = int(time.time() // CAMPAIGN_BRIEFS_TTL)
+    lock = _campaign_brief_locks[hash(campaign_id) % len(_campaign_brief_locks)]
+    with lock:
+        return _cached_briefs_influencers(campaign_id, updated_at, period)
 
-def fetch_notifications(brief_ids=[]):
 
-    if len(brief_ids) > 0:
-        query = """
-      SELECT *
-      FROM notifications note
-      WHERE note.notification_error_message IS NULL
-        AND note.brief_id IN ({})
-    """.format(
-            ", ".join(map(str, brief_ids))
-        )
-        return fetch_from_postgres(sql.SQL(query))
+"""
+"""
+
+
+def fetch_notified_briefs(campaign_id):
+    """
+    Count the briefs of a campaign with a successful notification, in the
+    database rather than fetching every notification. The briefs match those
+    of `fetch_briefs_influencers`
+
+    The join is served by partial index on the notifications of each brief:
+        CREATE INDEX CONCURRENTLY notifications_brief_id_sent_idx
+          ON notifications (brief_id) WHERE notification_error_message IS NULL;
+    along with the index on briefs (campaign_id)
+
+    return : int
+        The number of briefs notified
+    """
+    query = sql.SQL(
+        """
+    SELECT COUNT(DISTINCT briefs.id) AS notified_briefs
+    FROM briefs
+    JOIN influencers inf ON inf.id = briefs.influencer_id
+    JOIN notifications note ON note.brief_id = briefs.id
+      AND note.notification_error_message IS NULL
+    WHERE briefs.campaign_id = {campaign_id}
+      AND briefs.brief_status_id != 1
+      AND EXISTS (
+        SELECT 1 FROM social_accounts sa WHERE sa.influencer_id = inf.id
+      )
+      AND EXISTS (
+        SELECT 1 FROM influencer_countries ic WHERE ic.influencer_id = inf.id
+      );
+  """
+    ).format(campaign_id=sql.Literal(campaign_id))
+
+    notified = fetch_from_postgres(query)
 
-    return pd.DataFrame()  # return empty df
+    return int(notified["notified_briefs"].iloc[0]) if len(notified) > 0 else 0
@@ -144,7 +144,7 @@ def fetch_booked_campaign_revenue(
     try:
         data = fetch_from_postgres(query)
         x = conversion(currency_conversions, data["currency_code"], currency)
-        data["adjusted_budget"] = pd.to_numeric(data["budget"]) * x
+        data["adjusted_budget"] = data["budget"] * x
         if data.empty:
             data = pd.DataFrame(
                 {
@@ -277,7 +277,7 @@ def fetch_financials_campaigns(
     )
     try:
         data = fetch_from_postgres(query)
-        data["adjusted_budget"] = pd.to_numeric(data["budget"]) * conversion(
+        data["adjusted_budget"] = data["budget"] * conversion(
             currency_conversions, data["currency"], currency
         )
     except Exception as e:
@@ -1,14 +1,19 @@
 # Functions
+import datetime
+import functools
+import io
 import json
 import os
+import sys
+from collections import deque
 from datetime import datetime as date
 
 import boto3
 import pandas as pd
 from botocore.exceptions import ClientError  # used to find NoSuchKey error
 from dash.exceptions import PreventUpdate
-from google.cloud import bigquery
-from psycopg2 import connect, sql
+from google.cloud import bigquery, bigquery_storage
+from psycopg2 import connect, extensions, sql
 
 from data.fixer import Fixerio
 
@@ -25,19 +30,184 @@ bucket = os.getenv("DEFAULT_S3_BUCKET")
 
 WHITELIST_EMAILS = os.getenv("WHITELIST_EMAILS").split(",")
 
+# The most a BigQuery query may bill before it fails, rather than scanning on
+BIGQUERY_MAX_BYTES_BILLED = int(os.getenv("BIGQUERY_MAX_BYTES_BILLED", 20 * 1024**3))
 
-def fetch_from_bigquery(query_string):
+# Decode NUMERIC straight to float, rather than Decimal objects that force
+# object columns and later conversions
+DECIMAL_TO_FLOAT = extensions.new_type(
+    extensions.DECIMAL.values,
+    "DECIMAL_TO_FLOAT",
+    lambda value, cur: float(value) if value is not None else None,
+)
 
-    bqclient = bigquery.Client()
 
-    dataframe = (
-        bqclient.query(query_string)
-        .result()
-        .to_dataframe(
-            create_bqstorage_client=True,
-        )
+# BigQuery types of query parameter values, bool before int as it subclasses it
+BIGQUERY_TYPES = [
+    (bool, "BOOL"),
+    (int, "INT64"),
+    (float, "FLOAT64"),
+    (str, "STRING"),
+    (datetime.datetime, "TIMESTAMP"),
+    (datetime.date, "DATE"),
+]
+
+
+@functools.lru_cache(maxsize=None)
+def bigquery_client():
+    """The BigQuery client, created once & shared by every query"""
+    return bigquery.Client()
+
+
+@functools.lru_cache(maxsize=None)
+def bigquery_storage_client():
+    """The BigQuery Storage client results are downloaded with, as Arrow"""
+    return bigquery_storage.BigQueryReadClient()
+
+
+def bigquery_type(value):
+    for python_type, bigquery_type in BIGQUERY_TYPES:
+        if isinstance(value, python_type):
+            return bigquery_type
+
+    raise TypeError(f"No BigQuery type for {type(value).__name__} parameters")
+
+
+def bigquery_parameters(params):
+    """
+    Convert query parameters to BigQuery query parameters, lists & tuples
+    become arrays typed by their first value (INT64 when empty)
+            params : dict
+                    The value of each named parameter, e.g `@start_date`
+
+            return : list
+                    Returns the BigQuery query parameters
+    """
+    parameters = []
+    for name, value in (params or {}).items():
+        if isinstance(value, (list, tuple)):
+            array_type = bigquery_type(value[0]) if len(value) > 0 else "INT64"
+            parameters.append(
+                bigquery.ArrayQueryParameter(name, array_type, list(value))
+            )
+        else:
+            parameters.append(
+                bigquery.ScalarQueryParameter(name, bigquery_type(value), value)
+            )
+
+    return parameters
+
+
+# Statistics of the latest BigQuery jobs, see: `bigquery_job_statistics`
+BIGQUERY_JOB_STATS = deque(maxlen=500)
+
+
+def estimate_bigquery_bytes(query_string, params=None):
+    """
+    Dry run a query, the bytes it would process without running it (or
+    billing anything), e.g to find queries scanning unpartitioned tables
+            query_string : str
+                    The query, referencing parameters as `@name`
+            params : dict
+                    The value of each named parameter
+
+            return : int
+                    Returns the bytes the query would process
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=bigquery_parameters(params),
+        dry_run=True,
+        use_query_cache=False,
+    )
+    job = bigquery_client().query(query_string, job_config=job_config)
+
+    return job.total_bytes_processed
+
+
+def bigquery_job_statistics(job, caller):
+    """
+    Record & log the statistics of a finished job
+            job : QueryJob
+                    The finished job
+            caller : str
+                    The function the query was made for
+
+            return : dict
+                    Returns the bytes processed & billed, slot ms & cache hit
+    """
+    stats = {
+        "caller": caller,
+        "job_id": job.job_id,
+        "bytes_processed": job.total_bytes_processed or 0,
+        "bytes_billed": job.total_bytes_billed or 0,
+        "slot_ms": job.slot_millis or 0,
+        "cache_hit": bool(job.cache_hit),
+    }
+    BIGQUERY_JOB_STATS.append(stats)
+    print(
+        f"BigQuery {caller}: {stats['bytes_processed'] / 1024**2:,.1f} MB processed,"
+        f" {stats['bytes_billed'] / 1024**2:,.1f} MB billed, {stats['slot_ms']:,} slot"
+        f" ms, cache hit {stats['cache_hit']}"
+    )
+
+    return stats
+
+
+def query_bigquery(query_string, params=None, max_bytes_billed=None, caller=None):
+    """
+    Run a query, with its values passed as query parameters rather than
+    spliced into the SQL, so the same query text hits BigQuery's result cache.
+    The job fails rather than bill more than `max_bytes_billed`
+            query_string : str
+                    The query, referencing parameters as `@name`
+            params : dict
+                    The value of each named parameter
+            max_bytes_billed : int
+                    The most the query may bill, defaults to
+                    `BIGQUERY_MAX_BYTES_BILLED`
+            caller : str
+                    The function the query is made for, logged with the job
+                    statistics, defaults to the calling function
+
+            return : RowIterator
+                    Returns the results of the query
+    """
+    caller = caller or sys._getframe(1).f_code.co_name
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=bigquery_parameters(params),
+        maximum_bytes_billed=max_bytes_billed or BIGQUERY_MAX_BYTES_BILLED,
+    )
+    job = bigquery_client().query(query_string, job_config=job_config)
+
+    try:
+        results = job.result()
+    except Exception as e:
+        print(f"BigQuery {caller} failed: {e}")
+        raise
+
+    bigquery_job_statistics(job, caller)
+
+    return results
+
+
+def fetch_arrow_from_bigquery(
+    query_string, params=None, max_bytes_billed=None, caller=None
+):
+    """The results of a query as an Arrow table, see: `query_bigquery`"""
+    caller = caller or sys._getframe(1).f_code.co_name
+
+    return query_bigquery(query_string, params, max_bytes_billed, caller).to_arrow(
+        bqstorage_client=bigquery_storage_client()
+    )
+
+
+def fetch_from_bigquery(query_string, params=None, max_bytes_billed=None, caller=None):
+    """The results of a query as a dataframe, see: `query_bigquery`"""
+    caller = caller or sys._getframe(1).f_code.co_name
+
+    return query_bigquery(query_string, params, max_bytes_billed, caller).to_dataframe(
+        bqstorage_client=bigquery_storage_client()
     )
-    return dataframe
 
 
 def calculate_age(born):
@@ -45,8 +215,7 @@ def calculate_age(born):
     return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
 
 
-def fetch_from_postgres(
-    query,
+def connect_to_postgres(
     host=host,
     database=database,
     req_user=req_user,
@@ -60,22 +229,285 @@ def fetch_from_postgres(
         password=password,
         sslmode=sslmode,
     )
-    cur = conn.cursor()
-    cur.execute(query)
-    column_names = [desc[0] for desc in cur.description]
+    extensions.register_type(DECIMAL_TO_FLOAT, conn)
+    return conn
+
+
+def postgres_column_types(description):
+    """
+    Map the columns of a cursor description onto the pandas types used to
+    build typed frames from the raw postgres output
+
+    description : tuple
+        The `cursor.description` of an executed query
+
+    return : list
+        One of `bool`, `int`, `float`, `date`, `datetime`, `datetimetz`,
+        `text` or `cast` for each column, in column order. `cast` columns
+        (arrays, json, uuid, ...) are parsed by psycopg2's typecaster of the
+        column, as the cursor would
+    """
+    type_map = {
+        **{oid: "bool" for oid in extensions.BOOLEAN.values},
+        **{oid: "int" for oid in extensions.INTEGER.values},
+        **{oid: "int" for oid in extensions.LONGINTEGER.values},
+        **{oid: "float" for oid in extensions.FLOAT.values},
+        **{oid: "float" for oid in extensions.DECIMAL.values},
+        **{oid: "date" for oid in extensions.DATE.values},
+        **{oid: "datetime" for oid in extensions.PYDATETIME.values},
+        **{oid: "datetimetz" for oid in extensions.PYDATETIMETZ.values},
+        **{oid: "text" for oid in extensions.UNICODE.values},
+    }
+    return [
+        type_map.get(desc[1], "cast" if desc[1] in extensions.string_types else "text")
+        for desc in description
+    ]
+
+
+def fetch_from_postgres(
+    query,
+    host=host,
+    database=database,
+    req_user=req_user,
+    password=password,
+    sslmode=sslmode,
+    copy=False,
+    dtypes=None,
+):
+    """
+    Run a query against postgres and return the result as a data frame
+
+    query : str | sql.Composable
+        The query to run
+
+    copy : bool
+        Stream the result through `COPY (query) TO STDOUT` and parse it with
+        pandas directly, rather than building python tuples for every row.
+        Use this for large result sets, see `copy_from_postgres`. Columns are
+        typed as the cursor would, except timestamps which are always
+        datetime64 (UTC for timestamptz) and nulls in text columns are NaN
+
+    dtypes : dict
+        An optional dtype schema for the result, see `apply_postgres_dtypes`
+
+    return : DataFrame
+        The query result, an empty frame with the result columns if no rows
+        matched
+    """
+    conn = connect_to_postgres(host, database, req_user, password, sslmode)
+
     try:
-        # create a cursor
-        temp = cur.fetchall()
-        temp = pd.DataFrame(temp)
-        temp.columns = column_names
-    except:
-        temp = pd.DataFrame(columns=column_names)
+        if copy:
+            data = copy_from_postgres(conn, query)
+        else:
+            cur = conn.cursor()
+            cur.execute(query)
+            column_names = [desc[0] for desc in cur.description]
+            data = pd.DataFrame(cur.fetchall(), columns=column_names)
+    finally:
+        conn.close()
+
+    return apply_postgres_dtypes(data, dtypes)
+
+
+def fetch_from_postgres_chunks(
+    query,
+    itersize=2000,
+    dtypes=None,
+    host=host,
+    database=database,
+    req_user=req_user,
+    password=password,
+    sslmode=sslmode,
+):
+    """
+    Run a query against postgres using a server side cursor and yield the
+    result `itersize` rows at a time, so only one chunk is ever held in memory.
+    Use this for result sets reduced as they are read (filtered, deduplicated
+    or aggregated per chunk)
+
+    query : str | sql.Composable
+        The query to run
+
+    itersize : int
+        The number of rows fetched from the server per chunk
+
+    dtypes : dict
+        An optional dtype schema applied to every chunk, see
+        `apply_postgres_dtypes`
+
+    yields : DataFrame
+        Chunks of the result, typed from the cursor description as the COPY
+        path types them, see `type_postgres_frame`. A single empty frame is
+        yielded when no rows matched
+    """
+    conn = connect_to_postgres(host, database, req_user, password, sslmode)
+
+    try:
+        with conn.cursor(name="fetch_from_postgres_chunks") as cur:
+            cur.itersize = itersize
+            cur.execute(query)
+            rows = cur.fetchmany(itersize)
+            column_names = [desc[0] for desc in cur.description]
+            # the cursor already parsed the `cast` columns, they are kept as is
+            column_types = [
+                "text" if kind == "cast" else kind
+                for kind in postgres_column_types(cur.description)
+            ]
+            casters = [None] * len(column_names)
+
+            while True:
+                chunk = pd.DataFrame(rows, columns=column_names)
+                chunk = type_postgres_frame(chunk, column_types, casters, cur)
+                yield apply_postgres_dtypes(chunk, dtypes)
+
+                rows = cur.fetchmany(itersize)
+                if not rows:
+                    break
     finally:
         conn.close()
-    return temp
 
 
-def fetch_from_s3(key, aws_key=aws_key, aws_secret=aws_secret, bucket=bucket):
+def copy_from_postgres(conn, query):
+    """
+    Bulk export a query with `COPY (query) TO STDOUT` into an in memory CSV
+    buffer and parse it with pandas. The result is described first with a
+    `LIMIT 0` wrapper so the CSV text can be typed the same way the cursor would
+
+    conn : connection
+        An open psycopg2 connection
+
+    query : str | sql.Composable
+        The query to export, a trailing `;` is removed
+
+    return : DataFrame
+        The typed query result
+    """
+    if isinstance(query, sql.Composable):
+        query = query.as_string(conn)
+    query = query.strip().rstrip(";")
+
+    cur = conn.cursor()
+    cur.execute(f"SELECT * FROM ({query}) AS described LIMIT 0")
+    column_names = [desc[0] for desc in cur.description]
+    column_types = postgres_column_types(cur.description)
+    casters = [extensions.string_types.get(desc[1]) for desc in cur.description]
+
+    buffer = io.StringIO()
+    cur.copy_expert(
+        f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')",
+        buffer,
+    )
+    buffer.seek(0)
+
+    data = pd.read_csv(
+        buffer,
+        header=0,
+        names=list(range(len(column_names))),
+        dtype={
+            i: "float64" if kind == "float" else object
+            for i, kind in enumerate(column_types)
+            if kind != "int"
+        },
+        keep_default_na=False,
+        na_values=["\\N"],
+    )
+    # columns are named after reading so duplicate names are kept as postgres named them
+    data.columns = column_names
+
+    return type_postgres_frame(data, column_types, casters, cur)
+
+
+def type_postgres_frame(data, column_types, casters, cur):
+    """
+    Convert the CSV text columns of a postgres result into their pandas types
+
+    data : DataFrame
+        The raw result, as CSV text
+
+    column_types : list
+        The output of `postgres_column_types`
+
+    casters : list
+        The psycopg2 typecaster of each column, used for `cast` columns
+
+    cur : cursor
+        The cursor the typecasters parse values for
+
+    return : DataFrame
+        The typed data frame
+    """
+    columns = []
+
+    for position, kind in enumerate(column_types):
+        column = data.iloc[:, position]
+
+        if kind == "bool":
+            column = column.replace({"t": True, "f": False})
+            if column.notna().all():
+                column = column.astype(bool)
+        elif kind == "float":
+            column = column.astype("float64")
+        elif kind == "date":
+            # python dates, as psycopg2 returns them
+            column = pd.to_datetime(column).dt.date.astype(object)
+            column = column.where(column.notna(), None)
+        elif kind == "datetime":
+            column = pd.to_datetime(column)
+        elif kind == "datetimetz":
+            column = pd.to_datetime(column, utc=True)
+        elif kind == "cast":
+            caster = casters[position]
+            column = column.map(
+                lambda value: caster(value, cur) if isinstance(value, str) else None
+            )
+
+        columns.append(column)
+
+    typed = pd.concat(columns, axis=1)
+    typed.columns = data.columns
+    return typed
+
+
+def apply_postgres_dtypes(data, dtypes=None):
+    """
+    Apply a per query dtype schema to a fetched data frame, e.g. categoricals
+    for low cardinality text such as country, platform & status
+
+    data : DataFrame
+        The fetched query result
+
+    dtypes : dict
+        Column names mapped to any dtype accepted by `DataFrame.astype`
+        (`category`, `Int64`, ...) or `datetime` for tz-naive timestamps.
+        Columns missing from the result are ignored
+
+    return : DataFrame
+        The data frame with the schema applied
+    """
+    if not dtypes:
+        return data
+
+    for column, dtype in dtypes.items():
+        if column not in data.columns:
+            continue
+
+        if dtype == "datetime":
+            data[column] = pd.to_datetime(data[column], utc=True).dt.tz_localize(None)
+        else:
+            data[column] = data[column].astype(dtype)
+
+    return data
+
+
+def fetch_from_s3(
+    key, aws_key=aws_key, aws_secret=aws_secret, bucket=bucket, raise_errors=False
+):
+    """
+    Read a CSV from S3, an empty frame if it can't be read. With
+    `raise_errors` only a missing key gives an empty frame, any other failure
+    is raised so callers can tell it apart from the file not existing
+    """
     client = boto3.client(
         "s3", aws_access_key_id=aws_key, aws_secret_access_key=aws_secret
     )
@@ -83,7 +515,14 @@ def fetch_from_s3(key, aws_key=aws_key, aws_secret=aws_secret, bucket=bucket):
         csv_object = client.get_object(Bucket=bucket, Key=key)
         body = csv_object["Body"]
         df = pd.read_csv(body)
+    except ClientError as e:
+        if raise_errors and e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+            raise
+        print(e)
+        df = pd.DataFrame()
     except Exception as e:
+        if raise_errors:
+            raise
         print(e)
         df = pd.DataFrame()
     return df
@@ -95,8 +534,10 @@ def post_to_s3(key, df, aws_key=aws_key, aws_secret=aws_secret, bucket=bucket):
         "s3", aws_access_key_id=aws_key, aws_secret_access_key=aws_secret
     )
 
-    df.to_csv("/tmp/temp_csv.csv", index=False)
-    client.upload_file("/tmp/temp_csv.csv", bucket, key)
+    # Uploaded from memory, a shared temp file would race concurrent uploads
+    client.put_object(
+        Bucket=bucket, Key=key, Body=df.to_csv(index=False).encode("utf-8")
+    )
 
     return "Yes"
 
@@ -11,9 +11,14 @@
  campaign stats for influencers that match a filter criteria, the second are
  some demographics about the influencer
 """
+import threading
+import time
+
 from psycopg2 import sql
 
+from data.business_discovery import IG_BD_ACCOUNT, BusinessDiscovery
 from data.functions import fetch_from_postgres
+from data.search_index import SearchIndex
 
 
 def fetch_ig_token(handle):
@@ -30,6 +35,19 @@ def fetch_ig_token(handle):
     return fetch_from_postgres(query).iloc[0]
 
 
+"""
+Business discovery client, queried when an influencers token is stale. Swap in
+a `data.business_discovery.LocalBusinessDiscovery` to run without the API
+"""
+
+business_discovery = BusinessDiscovery(lambda: fetch_ig_token(IG_BD_ACCOUNT))
+
+
+def fetch_business_discovery(handle):
+    """The business discovery object of an Instagram handle, None if unavailable"""
+    return business_discovery.discover(handle)
+
+
 def fetch_social_accounts():
     """Fetch the socail account id and handle of all active influencers"""
     query = """
@@ -46,6 +64,72 @@ def fetch_social_accounts():
     return fetch_from_postgres(sql.SQL(query))
 
 
+"""
+In memory search index of the active social account handles, for the search
+as you type influencer picker. Rebuilt in the background once older than
+`SOCIAL_ACCOUNT_INDEX_TTL`, as influencers & accounts change status
+"""
+
+SOCIAL_ACCOUNT_INDEX_TTL = 15 * 60  # seconds between rebuilds
+
+_social_account_index = {"index": None, "built_at": 0.0, "refreshing": False}
+_social_account_index_lock = threading.Lock()
+
+
+def build_social_account_index():
+    """Index the handles of the active social accounts, see `fetch_social_accounts`"""
+    accounts = fetch_social_accounts()
+
+    index = SearchIndex()
+    index.upsert(accounts["id"].tolist(), accounts["handle"].tolist())
+
+    _social_account_index["index"] = index
+    _social_account_index["built_at"] = time.monotonic()
+
+
+def _rebuild_social_account_index_in_background():
+    try:
+        build_social_account_index()
+    finally:
+        _social_account_index["refreshing"] = False
+
+
+def search_social_accounts(search=None, limit=20, selected=None):
+    """
+    Search the active social accounts by handle, case insensitive
+
+    search : str
+      The handle typed so far
+
+    limit : int
+      The maximum number of matches
+
+    selected : int
+      The social_accounts.id currently selected, always kept as an option
+
+    returns : list
+      The dropdown options (value & label) of the best matches
+    """
+    with _social_account_index_lock:
+        age = time.monotonic() - _social_account_index["built_at"]
+
+        if _social_account_index["index"] is None:
+            build_social_account_index()
+        elif age > SOCIAL_ACCOUNT_INDEX_TTL and not _social_account_index["refreshing"]:
+            _social_account_index["refreshing"] = True
+            threading.Thread(
+                target=_rebuild_social_account_index_in_background, daemon=True
+            ).start()
+
+    index = _social_account_index["index"]
+    ids = index.search(search, limit)
+
+    if selected is not None and selected not in ids and selected in index.labels:
+        ids = [selected] + ids
+
+    return [{"value": i, "label": index.labels.get(i)} for i in ids]
+
+
 def fetch_social_demographics(social_id):
     """
     Fetch the social demographics of a specified influecner
@@ -113,17 +113,22 @@ def fetch_teams(start_date, end_date, region=None, customer_type=None):
 
 
 """
-Query summary stats on influencer usage of all applicable briefs based on the
-current date range & team
+Query the usage stats of each influencer with applicable briefs based on the
+current date range & team, aggregated in postgres: their participation,
+applications, mean similarity & engagement, joined with their details and
+their mean local audience (in the selected region, otherwise their country)
 @param start_date {Date}: The date the campaign must start on or after
 @param end_date {Date}: The date the campaign must end on or before
 @param team {Integer}: The specific organisation campaigns to display
+@param region {String | None}: The region to be displayed, None shows all
+@param customer_type {String | None}: The type of teams to look at
+@param service_level {Boolean | None}: Only managed service campaigns or not
 
-@return {DataFrame}: The brie usage data ready for mapping
+@return {DataFrame}: The influencer usage data, one row per influencer
 """
 
 
-def fetch_iu_briefs(
+def fetch_iu_table(
     start_date,
     end_date,
     team=None,
@@ -131,70 +136,134 @@ def fetch_iu_briefs(
     customer_type=None,
     service_level=None,
 ):
+    brief_filters = ""
+    if team is not None:
+        brief_filters = f"{brief_filters} AND teams.id = {team}"
+
+    if customer_type is not None:
+        brief_filters = f"{brief_filters} AND teams.type = '{customer_type}'"
+
+    region_filter = ""
+    if region is not None:
+        region_filter = (
+            f" AND (countries.region = '{region}' OR countries.sub_region = '{region}')"
+        )
+
+    if service_level is not None:
+        brief_filters = (
+            f"{brief_filters} AND campaigns.has_managed_service= {service_level}"
+        )
+
+    # local audience is averaged over the region when one is selected
+    area = "region" if region is not None else "name"
 
     query = """
-    SELECT briefs.id AS brief_id
-        , briefs.influencer_id
-        , social.id AS social_id
-        , social.followers_count
-        , (
-          CASE
-            WHEN b_status.code IN ('approved',
-                                  'fulfilled',
-                                  'completed',
-                                  'media_uploaded',
-                                  'media_accepted',
-                                  'processing_payment')
-              THEN 1
-            ELSE 0
-          END
-        ) AS participation
-        , briefs.similarity_score * 100 AS similarity_score
-        , social.engagement_rate * 100 AS engagement_rate
+    WITH brief_stats AS (
+      SELECT briefs.influencer_id
+          , COUNT(DISTINCT (
+            CASE
+              WHEN b_status.code IN ('approved',
+                                    'fulfilled',
+                                    'completed',
+                                    'media_uploaded',
+                                    'media_accepted',
+                                    'processing_payment')
+                THEN briefs.id
+            END
+          )) AS participation
+          , COUNT(DISTINCT briefs.id) AS applications
+          , AVG(briefs.similarity_score) * 100 AS similarity_score
+          , AVG(social.engagement_rate) * 100 AS engagement_rate
+      FROM briefs
+      JOIN brief_statuses b_status ON b_status.id = briefs.brief_status_id
+      JOIN campaigns ON campaigns.id = briefs.campaign_id
+      JOIN teams ON teams.id = campaigns.team_id
+      JOIN social_accounts social ON social.influencer_id = briefs.influencer_id
+      JOIN influencer_countries ic ON ic.influencer_id = briefs.influencer_id
+      JOIN countries ON countries.id = ic.country_id
+
+      WHERE b_status.code IN ('invitation_accepted',
+                              'shortlisted',
+                              'approved',
+                              'rejected',
+                              'fulfilled',
+                              'completed',
+                              'media_uploaded',
+                              'media_accepted',
+                              'processing_payment')
+
+      AND campaigns.started_on >= '{start_date}'
+      AND campaigns.started_on <= '{end_date}'
+      AND campaigns.deleted_at IS NULL
+      AND social.social_platform_id = 1
+      {brief_filters}
+      {region_filter}
+      GROUP BY briefs.influencer_id
+    ), local_audience AS (
+      SELECT social.influencer_id
+          , countries.{area} AS area
+          , AVG(CAST(audience_val.percentage AS DOUBLE PRECISION)) * 100 AS local_audience
+      FROM brief_stats
+      JOIN social_accounts social ON social.influencer_id = brief_stats.influencer_id
+      JOIN audience_insights audience ON audience.social_account_id = social.id
+        AND audience.category = 'countries'
+      JOIN audience_insight_values audience_val ON audience_val.audience_insight_id = audience.id
+      JOIN countries ON countries.code = audience_val.tag
+      JOIN influencer_countries ic ON ic.influencer_id = social.influencer_id
+        AND ic.country_id = countries.id
+      WHERE TRUE {region_filter}
+      GROUP BY social.influencer_id, countries.{area}
+    )
+    SELECT DISTINCT ON (inf.id) inf.id
+        , inf.gender
+        , inf.date_of_birth
+        , inf.influencer_status_id
+        , inf.last_active
+
         , countries.name AS country
-        , countries.region
         , countries.sub_region
-    FROM briefs
-    JOIN brief_statuses b_status ON b_status.id = briefs.brief_status_id
-    JOIN campaigns ON campaigns.id = briefs.campaign_id
-    JOIN teams ON teams.id = campaigns.team_id
-    JOIN influencers inf ON inf.id = briefs.influencer_id
-    JOIN social_accounts social ON social.influencer_id = inf.id
-    JOIN influencer_countries ic ON ic.influencer_id = inf.id
-    JOIN countries ON countries.id = ic.country_id
-
-    WHERE b_status.code IN ('invitation_accepted',
-                            'shortlisted',
-                            'approved',
-                            'rejected',
-                            'fulfilled',
-                            'completed',
-                            'media_uploaded',
-                            'media_accepted',
-                            'processing_payment')
+        , countries.region
 
-    AND campaigns.started_on >= '{start_date}'
-    AND campaigns.started_on <= '{end_date}'
-    AND campaigns.deleted_at IS NULL
-    AND social_platform_id = 1
-  """.format(
-        start_date=start_date, end_date=end_date
-    )
+        , CASE
+            WHEN inf.last_active IS NULL OR DATE_PART('day', NOW() - inf.last_active) > 31
+              THEN 'Inactive'
+            ELSE 'Active'
+          END
+        , DATE_PART('year', NOW()) - DATE_PART('year', inf.date_of_birth) AS age
+        , i_status.name
 
-    if team is not None:
-        query = f"{query} AND teams.id = {team}"
+        , social.handle
+        , social.followers_count
 
-    if customer_type is not None:
-        query = f"{query} AND teams.type = '{customer_type}'"
+        , brief_stats.influencer_id
+        , brief_stats.participation
+        , brief_stats.applications
+        , brief_stats.similarity_score
+        , brief_stats.engagement_rate
+        , local_audience.local_audience
 
-    if region is not None:
-        query = (
-            "{q} AND (countries.region = '{area}' OR countries.sub_region = '{area}')"
-            .format(q=query, area=region)
-        )
+    FROM brief_stats
+    JOIN influencers inf ON inf.id = brief_stats.influencer_id
+    JOIN influencer_countries inf_country ON inf_country.influencer_id = inf.id
+    JOIN countries ON countries.id = inf_country.country_id
+    JOIN social_accounts social ON social.influencer_id = inf.id
+    JOIN influencer_statuses i_status ON i_status.id = inf.influencer_status_id
+    LEFT JOIN local_audience ON local_audience.influencer_id = inf.id
+      AND local_audience.area = countries.{area}
 
-    if service_level is not None:
-        query = f"{query} AND campaigns.has_managed_service= {service_level}"
+    WHERE
+      /* remove test accounts */
+      (DATE_PART('year', NOW()) - DATE_PART('year', inf.date_of_birth)) < 90
+      AND social.social_platform_id = 1
+      {region_filter}
+    ORDER BY inf.id, social.followers_count DESC NULLS LAST, countries.id, social.id
+  """.format(
+        start_date=start_date,
+        end_date=end_date,
+        brief_filters=brief_filters,
+        region_filter=region_filter,
+        area=area,
+    )
 
     return fetch_from_postgres(sql.SQL(query))
 
@@ -280,68 +349,6 @@ def fetch_avg_sim(start_date, end_date, team=None, region=None, customer_type=No
     return fetch_from_postgres(sql.SQL(query))
 
 
-"""
-Query for influencer usage statistics based on filter criteria
-@param start_date {Date}: The date the campaign must start on or after
-@param end_date {Date}: The date the campaign must end on or before
-@param briefs {List}: The list of influencer IDs based of the briefs to include
-@param region {String | None}: The region to be displayed, None shows all
-
-@return {DataFrame}: The influencer usage data ready for mapping
-"""
-
-
-def fetch_iu_stats(start_date, end_date, briefs=[], region=None):
-    query = """
-    SELECT inf.id
-        , inf.gender
-        , inf.date_of_birth
-        , inf.influencer_status_id
-        , inf.last_active
-
-        , countries.name AS country
-        , countries.sub_region
-        , countries.region
-
-        , CASE
-            WHEN inf.last_active IS NULL OR DATE_PART('day', NOW() - inf.last_active) > 31
-              THEN 'Inactive'
-            ELSE 'Active'
-          END
-        , DATE_PART('year', NOW()) - DATE_PART('year', inf.date_of_birth) AS age
-        , i_status.name
-
-        , social.handle
-        /*, social.engagement_rate * 100 AS engagement_rate*/
-        , social.followers_count
-
-    FROM influencers inf
-    JOIN influencer_countries inf_country ON inf_country.influencer_id = inf.id
-    JOIN countries ON countries.id = inf_country.country_id
-    JOIN social_accounts social ON social.influencer_id = inf.id
-    JOIN influencer_statuses i_status ON i_status.id = inf.influencer_status_id
-
-    WHERE
-      /* remove test accounts */
-      (DATE_PART('year', NOW()) - DATE_PART('year', inf.date_of_birth)) < 90
-      AND social_platform_id = 1
-    """
-
-    if len(briefs) > 0:
-        query = "{q} AND inf.id IN ({brief_ids})".format(
-            q=query, brief_ids=", ".join(map(str, briefs))
-        )
-
-    if region is not None:
-        query = (
-            "{q} AND (countries.region = '{area}' OR countries.sub_region = '{area}')"
-            .format(q=query, area=region)
-        )
-
-    data = fetch_from_postgres(sql.SQL(query))
-    return data
-
-
 """
 Query which influencer has briefs in each of the brief status, that also fall
 within a filtered range
@@ -408,50 +415,6 @@ def fetch_iu_influencer_briefs(
     return data
 
 
-"""
-Query fetch the local audience stats of each influencer
-@param influencers {List}: A list of influencer IDs to lookup
-@param region {String | None}: The region to be displayed, None shows all
-
-@return {DataFrame}: The influencer usage data ready for mapping
-"""
-
-
-def fetch_iu_local_audience(influencers=[], region=None):
-    query = """
-    SELECT social.influencer_id
-          , social.id AS social_id
-          , CAST(
-            audience_val.percentage AS DOUBLE PRECISION
-          ) * 100 AS local_audience
-          , social.followers_count
-          , countries.name AS country
-          , countries.region
-          , countries.sub_region
-    FROM social_accounts social
-    LEFT JOIN audience_insights audience ON audience.social_account_id = social.id
-    LEFT JOIN audience_insight_values audience_val ON audience_val.audience_insight_id = audience.id
-    LEFT JOIN countries ON countries.code = audience_val.tag
-    JOIN influencer_countries ic ON ic.influencer_id = social.influencer_id
-      AND ic.country_id = countries.id
-    WHERE audience.category = 'countries'
-  """
-
-    if len(influencers) > 0:
-        query = "{q} AND social.influencer_id IN ({inf_ids})".format(
-            q=query, inf_ids=", ".join(map(str, influencers))
-        )
-
-    if region is not None:
-        query = (
-            "{q} AND (countries.region = '{area}' OR countries.sub_region = '{area}')"
-            .format(q=query, area=region)
-        )
-
-    data = fetch_from_postgres(sql.SQL(query))
-    return data
-
-
 """
 Query the influecer engagement rates and local audience
 see: data/segmentation.py for original query
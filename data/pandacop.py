@@ -5,7 +5,7 @@ import boto3
 import pandas as pd
 from psycopg2 import sql
 
-from data.functions import fetch_from_postgres
+from data.functions import fetch_from_postgres, fetch_from_postgres_chunks
 
 aws_key = os.getenv("AWS_ACCESS_KEY")
 aws_secret = os.getenv("AWS_SECRET_ACCESS_KEY")
@@ -64,7 +64,11 @@ def retrieve_red_cards(location=None, handles=[]):
     AND i.influencer_status_id=3"""
     ).format(location=location_statement)
 
-    red_flags = fetch_from_postgres(query)
+    # every media insight is scanned, duplicates are dropped as it is read
+    red_flags = pd.concat(
+        [chunk.drop_duplicates() for chunk in fetch_from_postgres_chunks(query)],
+        ignore_index=True,
+    )
     red_flags = red_flags.drop_duplicates().reset_index(drop=True)
     red_flags["social_link"] = [re.sub("www.", "", i) for i in red_flags["social_link"]]
 
@@ -247,7 +251,7 @@ def fetch_classification_data(location=None):
     """
     ).format(location=location_statement)
 
-    return fetch_from_postgres(query)
+    return fetch_from_postgres(query, copy=True)
 
 
 def fetch_influecner_class_data(handle=""):
@@ -1,10 +1,22 @@
 import os
 
-import pandas as pd
 from psycopg2 import sql
 
 from data.fixer import conversion
-from data.functions import currency_conversions, fetch_from_postgres
+from data.functions import (
+    currency_conversions,
+    fetch_from_postgres,
+    fetch_from_s3,
+    post_to_s3,
+)
+
+# Month cube partitions of completed months, per customer type. Bump the
+# version when the cube changes shape or every stored month must be recomputed.
+# A stored month is recomputed once its fingerprint changes, see
+# `fetch_month_fingerprints`, which doesn't cover the campaign status names &
+# currency codes: bump the version if those lookups are renamed
+CLOSED_MONTHS_VERSION = 2
+CLOSED_MONTHS_KEY = "metrics-dashboard/platform-stats/closed-months-v{}-{}.csv"
 
 
 def retrieve_campaigns(start_date, end_date, customer_type):
@@ -105,5 +117,124 @@ WHERE
 
     data = fetch_from_postgres(query)
     x = conversion(currency_conversions, data["currency"], "AUD")
-    data["adjusted_budget"] = pd.to_numeric(data["budget"]) * x
+    data["adjusted_budget"] = data["budget"] * x
     return data
+
+
+def fetch_closed_months(customer_type):
+    """
+    Retrieves the persisted month cube partitions of completed months, they
+    are only recomputed once their campaigns change, see
+    `fetch_month_fingerprints`
+
+    customer_type : str
+        all, selfserve or enterprise
+
+    return : DataFrame
+        The stored partitions, empty if none have been stored yet. Raises if
+        the store exists but couldn't be read
+    """
+    data = fetch_from_s3(
+        CLOSED_MONTHS_KEY.format(CLOSED_MONTHS_VERSION, customer_type),
+        raise_errors=True,
+    )
+    if "team_name" in data.columns:
+        data["team_name"] = data["team_name"].where(
+            data["team_name"].isna(), data["team_name"].astype(str)
+        )
+    if "fingerprint" in data.columns:
+        data["fingerprint"] = data["fingerprint"].astype(str)
+
+    return data
+
+
+def post_closed_months(customer_type, data):
+    """
+    Persists the month cube partitions of completed months
+
+    customer_type : str
+        all, selfserve or enterprise
+
+    data : DataFrame
+        Every stored partition, including the newly computed months
+    """
+    return post_to_s3(
+        CLOSED_MONTHS_KEY.format(CLOSED_MONTHS_VERSION, customer_type), data
+    )
+
+
+def fetch_month_fingerprints(start_date, end_date):
+    """
+    Fingerprints the campaigns starting in each month, from the number of
+    campaigns & when any was last changed or deleted. A stored month whose
+    fingerprint differs has been edited, deleted from or backdated into
+
+    The fingerprint also covers what the month's rows depend on outside of
+    the month: the name & type of its teams, and every campaign of those
+    teams up to the month's (their count & last change), which the
+    `first_customer_flag` is counted from
+
+    return : DataFrame
+        The start_year, start_month & fingerprint of each month with campaigns
+    """
+    query = sql.SQL(
+        """
+    WITH month_campaigns AS (
+      SELECT date_part('month', date(campaigns.started_on)) AS start_month
+        , date_part('year', date(campaigns.started_on)) AS start_year
+        , campaigns.id
+        , campaigns.team_id
+        , GREATEST(campaigns.updated_at, campaigns.deleted_at) AS changed_at
+      FROM campaigns
+      WHERE campaigns.started_on >= {start_date}
+        AND campaigns.started_on < {end_date}
+    ), month_teams AS (
+      SELECT start_month, start_year, team_id, MAX(id) AS last_id
+      FROM month_campaigns
+      GROUP BY 1, 2, 3
+    ), team_history AS (
+      SELECT month_teams.start_month
+        , month_teams.start_year
+        , STRING_AGG(
+            CONCAT_WS(
+              ':', month_teams.team_id, teams.name, teams.type, history.campaigns
+              , history.changed_at
+            )
+            , ',' ORDER BY month_teams.team_id
+          ) AS teams
+      FROM month_teams
+      LEFT JOIN teams ON teams.id = month_teams.team_id
+      CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS campaigns
+          , MAX(GREATEST(earlier.updated_at, earlier.deleted_at)) AS changed_at
+        FROM campaigns earlier
+        WHERE earlier.team_id = month_teams.team_id
+          AND earlier.id <= month_teams.last_id
+      ) AS history
+      GROUP BY 1, 2
+    )
+    SELECT month_campaigns.start_month
+      , month_campaigns.start_year
+      , MD5(CONCAT(
+          COUNT(*), '-', MAX(month_campaigns.changed_at), '-', MAX(team_history.teams)
+        )) AS fingerprint
+    FROM month_campaigns
+    JOIN team_history USING (start_month, start_year)
+    GROUP BY 1, 2
+    """
+    ).format(start_date=sql.Literal(start_date), end_date=sql.Literal(end_date))
+
+    return fetch_from_postgres(query)
+
+
+def price_month_cube(cube):
+    """
+    Converts the budget of each currency in a month cube into AUD at the
+    current rates, so stored months are never priced at stale rates
+    """
+    cube = cube.copy()
+    currencies = cube["currency"].dropna().unique().tolist()
+    rates = dict(zip(currencies, conversion(currency_conversions, currencies, "AUD")))
+    cube["adjusted_budget"] = cube["budget"] * cube["currency"].map(rates)
+
+    return cube
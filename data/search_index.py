@@ -0,0 +1,140 @@
+"""
+ data/search_index.py
+
+ @desc:
+ In memory trigram index of short texts (e.g campaign names, social handles)
+ for search-as-you-type. Texts are case folded, a query is answered from the
+ intersection of its trigrams rather than scanning every text, and matches
+ are ranked so prefixes come before matches mid text. Queries too short for a
+ trigram only match the start of words.
+"""
+import threading
+from collections import defaultdict
+
+
+def trigrams(text):
+    """The set of 3 character grams of a case folded text"""
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def short_prefixes(text):
+    """The 1 & 2 character prefixes of every word of a case folded text"""
+    return {word[:n] for word in text.split() for n in (1, 2)}
+
+
+class SearchIndex:
+    """
+    A trigram index of texts keyed by any hashable id, safe to search while
+    another thread updates it
+    """
+
+    def __init__(self):
+        self.texts = {}
+        self.labels = {}
+        self.grams = defaultdict(set)
+        self.prefixes = defaultdict(set)
+        self.order = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _remove(self, key):
+        text = self.texts.pop(key, "")
+
+        for grams, gram in [(self.grams, g) for g in trigrams(text)] + [
+            (self.prefixes, p) for p in short_prefixes(text)
+        ]:
+            grams[gram].discard(key)
+            if not grams[gram]:
+                del grams[gram]
+
+        self.labels.pop(key, None)
+        self.order = None
+
+    def upsert(self, keys, texts, labels=None):
+        """
+        Add or replace texts in the index
+
+        keys : iterable
+            The ids of the texts
+
+        texts : iterable
+            The searchable texts
+
+        labels : iterable
+            The labels results are sorted by within a rank, defaults to the text
+        """
+        labels = texts if labels is None else labels
+
+        with self.lock:
+            for key, text, label in zip(keys, texts, labels):
+                self._remove(key)
+                text = str(text).casefold()
+                self.texts[key] = text
+                self.labels[key] = label
+                self.order = None
+
+                for gram in trigrams(text):
+                    self.grams[gram].add(key)
+                for prefix in short_prefixes(text):
+                    self.prefixes[prefix].add(key)
+
+    def remove(self, keys):
+        """Remove texts from the index"""
+        with self.lock:
+            for key in keys:
+                self._remove(key)
+
+    def ordered(self):
+        """Every key sorted by its label, kept until the index changes"""
+        if self.order is None:
+            self.order = sorted(self.texts, key=self.labels.get)
+
+        return self.order
+
+    def search(self, query=None, limit=100):
+        """
+        Find the texts containing a query, case insensitive. Prefixes of the
+        text rank first, then prefixes of a word, then any other match, each
+        sorted by label
+
+        query : str
+            The search query, every text matches an empty query
+
+        limit : int
+            The maximum number of matches
+
+        return : list
+            The keys of the best matches, in order
+        """
+        query = (query or "").casefold().strip()
+
+        with self.lock:
+            if not query:
+                candidates = self.ordered()
+            elif len(query) < 3:
+                # Too short for a trigram, short queries match word prefixes
+                candidates = sorted(
+                    self.prefixes.get(query, set()), key=self.labels.get
+                )
+            else:
+                grams = sorted(
+                    (self.grams.get(gram, set()) for gram in trigrams(query)), key=len
+                )
+                candidates = sorted(set.intersection(*grams), key=self.labels.get)
+
+            ranks = ([], [], [])
+            for key in candidates:
+                text = self.texts[key]
+                if query not in text:
+                    continue
+
+                rank = 0 if text.startswith(query) else 1 if f" {query}" in text else 2
+                ranks[rank].append(key)
+
+                # Nothing can outrank the prefix matches found so far
+                if len(ranks[0]) >= limit:
+                    break
+
+            return (ranks[0] + ranks[1] + ranks[2])[:limit]
@@ -4,6 +4,17 @@ from psycopg2 import sql
 
 from data.functions import fetch_from_postgres
 
+# Low cardinality text as categoricals & tz-naive activity dates, see
+# `apply_postgres_dtypes`
+SEGMENTATION_DTYPES = {
+    "gender": "category",
+    "country": "category",
+    "platform": "category",
+    "influencer_status_name": "category",
+    "last_active": "datetime",
+    "inserted_at": "datetime",
+}
+
 
 def fetch_brief_participation(influencers=[]):
     query = """
@@ -276,5 +287,5 @@ def fetch_segmentation_data(
 
     print(query)
 
-    data = fetch_from_postgres(query)
+    data = fetch_from_postgres(query, copy=True, dtypes=SEGMENTATION_DTYPES)
     return data
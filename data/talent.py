@@ -1,143 +1,180 @@
+import functools
+import threading
+import time
+
+import pandas as pd
+
 from data.functions import fetch_from_bigquery
 
 
-def fetch_new_talent_data(start_date, end_date, location):
-    if location == None:
-        location_statement = "influencer_id > 0"
-    elif len(location) == 0:
-        location_statement = "influencer_id > 0"
-    else:
-        if len(location) > 1:
-            string = ",".join([str(i) for i in location])
-        else:
-            string = str(location[0])
-        location_statement = "".join(["country_id in (", string, ")"])
-
-    query = """SELECT status, count(*) as count
-FROM `vamp-dw-prod.fact_servalan_views.talent_analysis`
-WHERE DATE(inserted_at) >= DATE("{start_date}")
-AND  DATE(inserted_at) <= DATE("{end_date}")
-AND {location_statement}
-GROUP BY status
-;""".format(
-        start_date=start_date,
-        end_date=end_date,
-        location_statement=location_statement,
+def talent_params(start_date, end_date, location):
+    """
+    The query parameters of the talent queries, the dates & any selected
+    country ids
+    """
+    params = {
+        "start_date": pd.Timestamp(start_date).date(),
+        "end_date": pd.Timestamp(end_date).date(),
+    }
+    if location:
+        params["location"] = [int(i) for i in location]
+
+    return params
+
+
+def location_statement(location, default, column="country_id"):
+    """Filter on the selected countries, or `default` when none are selected"""
+    return f"{column} IN UNNEST(@location)" if location else default
+
+
+"""
+Every dataset of the talent tab comes from one BigQuery job. The new talent
+are aggregated once to the influencer & location level, with flags for the
+default filters of each view, alongside the brief responses by sub region.
+The views aggregate it locally
+"""
+
+TALENT_COLS = [
+    "influencer_id",
+    "status",
+    "country_code",
+    "country",
+    "sub_region",
+    "applications",
+    "any_talent",
+    "known_country",
+    "count",
+]
+BRIEF_RESPONSE_COLS = [
+    "sub_region",
+    "sent",
+    "notifications",
+    "active",
+    "viewed",
+    "applied",
+    "selected",
+]
+
+
+def fetch_talent_datasets(start_date, end_date, location):
+    query = """WITH talent AS (
+  SELECT talent.influencer_id, talent.status, talent.country_code, talent.country
+    , talent.sub_region, talent.applications
+    , IFNULL(talent.influencer_id > 0, FALSE) AS any_talent
+    , countries.id IS NOT NULL AS known_country
+    , count(*) AS count
+  FROM `vamp-dw-prod.fact_servalan_views.talent_analysis` talent
+  LEFT JOIN source_servalan_public.countries countries ON countries.id = talent.country_id
+  WHERE DATE(talent.inserted_at) >= @start_date
+  AND DATE(talent.inserted_at) <= @end_date
+  AND {talent_location_statement}
+  GROUP BY 1,2,3,4,5,6,7,8
+), brief_response AS (
+  SELECT sub_region, sum(sent) as sent, sum(notifications) as notifications, sum(active) as active, sum(viewed) as viewed, sum(applied) as applied, sum(selected) as selected
+  FROM `vamp-dw-prod.fact_servalan_views.brief_response_by_country`
+  WHERE DATE(inserted_at) >= @start_date
+  AND DATE(inserted_at) <= @end_date
+  AND {brief_location_statement}
+  GROUP BY sub_region
+)
+SELECT 'talent' AS dataset, influencer_id, status, country_code, country, sub_region
+  , applications, any_talent, known_country, count
+  , NULL AS sent, NULL AS notifications, NULL AS active, NULL AS viewed
+  , NULL AS applied, NULL AS selected
+FROM talent
+UNION ALL
+SELECT 'brief_response', NULL, NULL, NULL, NULL, sub_region
+  , NULL, NULL, NULL, NULL
+  , sent, notifications, active, viewed
+  , applied, selected
+FROM brief_response
+""".format(
+        talent_location_statement=location_statement(
+            location, "TRUE", column="talent.country_id"
+        ),
+        brief_location_statement=location_statement(location, "sent > 0"),
     )
 
-    data = fetch_from_bigquery(query)
+    data = fetch_from_bigquery(query, talent_params(start_date, end_date, location))
+
+    talent = data.loc[data["dataset"] == "talent", TALENT_COLS].reset_index(drop=True)
+    talent = talent.astype({"any_talent": bool, "known_country": bool, "count": int})
+    brief_response = data.loc[
+        data["dataset"] == "brief_response", BRIEF_RESPONSE_COLS
+    ].reset_index(drop=True)
+
+    return {"talent": talent, "brief_response": brief_response}
+
+
+TALENT_CACHE_TTL = 15 * 60  # seconds the datasets of a filter are reused
+
+""" Locks striped by the filters, bounded however many filters are used """
+_talent_dataset_locks = [threading.Lock() for _ in range(32)]
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_talent_datasets(start_date, end_date, location, period):
+    return fetch_talent_datasets(start_date, end_date, location)
+
+
+def talent_datasets(start_date, end_date, location):
+    """
+    The datasets of the talent tab, cached by the filters for up to
+    `TALENT_CACHE_TTL` seconds, as the default end date is today. The views of
+    a filter change wait for the one job rather than each running it. Callers
+    must not mutate them
+    """
+    key = (start_date, end_date, tuple(location or ()))
+    period = int(time.time() // TALENT_CACHE_TTL)
+    with _talent_dataset_locks[hash(key) % len(_talent_dataset_locks)]:
+        return _cached_talent_datasets(*key, period)
+
+
+def fetch_new_talent_data(start_date, end_date, location):
+    talent = talent_datasets(start_date, end_date, location)["talent"]
+    if not location:
+        talent = talent.loc[talent["any_talent"]]
+
+    data = talent.groupby("status", dropna=False, as_index=False)["count"].sum()
     return data
 
 
 def fetch_new_talent_location_data(start_date, end_date, location):
-    if location == None:
-        location_statement = (
-            "country_id in (SELECT id from source_servalan_public.countries)"
-        )
-    elif len(location) == 0:
-        location_statement = (
-            "country_id in (SELECT id from source_servalan_public.countries)"
-        )
-    else:
-        if len(location) > 1:
-            string = ",".join([str(i) for i in location])
-        else:
-            string = str(location[0])
-        location_statement = "".join(["country_id in (", string, ")"])
-
-    query = """SELECT status, country_code, country, sub_region, count(*) as count
-FROM `vamp-dw-prod.fact_servalan_views.talent_analysis`
-WHERE DATE(inserted_at)>= DATE("{start_date}")
-AND  DATE(inserted_at) <= DATE("{end_date}")
-AND {location_statement}
-GROUP BY 1,2,3,4
-""".format(
-        start_date=start_date,
-        end_date=end_date,
-        location_statement=location_statement,
-    )
-
-    data = fetch_from_bigquery(query)
+    talent = talent_datasets(start_date, end_date, location)["talent"]
+    if not location:
+        talent = talent.loc[talent["known_country"]]
+
+    data = talent.groupby(
+        ["status", "country_code", "country", "sub_region"],
+        dropna=False,
+        as_index=False,
+    )["count"].sum()
     return data
 
 
 def fetch_new_talent_campaign_application(start_date, end_date, location):
-    if location == None:
-        location_statement = "influencer_id > 0"
-    elif len(location) == 0:
-        location_statement = "influencer_id > 0"
-    else:
-        if len(location) > 1:
-            string = ",".join([str(i) for i in location])
-        else:
-            string = str(location[0])
-        location_statement = "".join(["country_id in (", string, ")"])
-
-    query = """SELECT count(*) as count  from `vamp-dw-prod.fact_servalan_views.talent_analysis`
-        WHERE DATE(inserted_at) >= DATE("{start_date}")
-		AND  DATE(inserted_at) <= DATE("{end_date}")
-    	AND {location_statement}
-        AND applications > 0
-        AND applications is not NULL
-        """.format(
-        start_date=start_date,
-        end_date=end_date,
-        location_statement=location_statement,
-    )
-    data = fetch_from_bigquery(query)
+    talent = talent_datasets(start_date, end_date, location)["talent"]
+    if not location:
+        talent = talent.loc[talent["any_talent"]]
+
+    count = talent.loc[(talent["applications"] > 0).fillna(False), "count"].sum()
+    data = pd.DataFrame({"count": [int(count)]})
     return data
 
 
 def fetch_new_talent_campaign_application_chart(start_date, end_date, location):
-    if location == None:
-        location_statement = "influencer_id > 0"
-    elif len(location) == 0:
-        location_statement = "influencer_id > 0"
-    else:
-        if len(location) > 1:
-            string = ",".join([str(i) for i in location])
-        else:
-            string = str(location[0])
-        location_statement = "".join(["country_id in (", string, ")"])
-
-    query = """SELECT DISTINCT influencer_id, applications from `vamp-dw-prod.fact_servalan_views.talent_analysis`
-    	where DATE(inserted_at)>= DATE("{start_date}")
-		AND  DATE(inserted_at)<= DATE("{end_date}")
-		AND {location_statement}
-        AND applications is not NULL
-        """.format(
-        start_date=start_date,
-        end_date=end_date,
-        location_statement=location_statement,
+    talent = talent_datasets(start_date, end_date, location)["talent"]
+    if not location:
+        talent = talent.loc[talent["any_talent"]]
+
+    data = (
+        talent.loc[talent["applications"].notnull(), ["influencer_id", "applications"]]
+        .drop_duplicates()
+        .reset_index(drop=True)
     )
-    print(query)
-    data = fetch_from_bigquery(query)
     return data
 
 
 def fetch_brief_response(start_date, end_date, location):
-    if location == None:
-        location_statement = "sent > 0"
-    elif len(location) == 0:
-        location_statement = "sent > 0"
-    else:
-        if len(location) > 1:
-            string = "(" + ",".join([str(i) for i in location]) + ")"
-        else:
-            string = str(location[0])
-        location_statement = "".join([" country_id in (", string, ")"])
-
-    query = """SELECT sub_region, sum(sent) as sent, sum(notifications) as notifications, sum(active) as active, sum(viewed) as viewed, sum(applied) as applied, sum(selected) as selected
-    FROM `vamp-dw-prod.fact_servalan_views.brief_response_by_country`
-    where DATE(inserted_at) >= DATE("{start_date}")
-    AND DATE(inserted_at) <= DATE("{end_date}")
-    AND {location_statement}
-    GROUP BY sub_region
-        """.format(
-        start_date=str(start_date),
-        end_date=str(end_date),
-        location_statement=location_statement,
-    )
-    print(query)
-    data = fetch_from_bigquery(query)
+    data = talent_datasets(start_date, end_date, location)["brief_response"].copy()
     return data
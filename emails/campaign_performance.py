@@ -26,145 +26,94 @@ The benchmark based on the platform average in the category and region targeted
 """
 import json
 import logging
-import math
 import os
 
+import numpy as np
 import pandas as pd
-from createsend import Transactional
-from sqlalchemy import create_engine
+from checkpoint import read_checkpoint, read_frame, write_checkpoint, write_frame
+from dispatch import dispatch_emails, transactional
+from expected_performance import EXPECTED_COLS, expected_bounds, expected_performance
+from extract import base_extracts, fetch_all
+from render import compile_template
+from timing import timed
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 pd.options.display.float_format = "{:,.2f}".format
 
-
-"""
-This query contains all active campaigns, the quoted estimates & team details"""
-CAMPAIGNS = """
-	SELECT teams.name
-		, users.email
-		, camp.id AS campaign_id
-		, camp.version
-		, camp.started_on
-		, camp.name AS campaign_name
-		, camp.has_managed_service
-		, camp.total_coins
-		, camp.spent_coins
-		, cc.product_coins_spent
-		, cc.ad_coins_spent
-		, camp.additional_coins
-
-		-- Analyse content plan etc
-		, camp.estimates
-		, camp.estimates::json#>>'{cpe}' AS cpe
-		, camp.estimates::json#>>'{cpm}' AS cpm
-		, camp.estimates::json->'content' AS estimated_content
-		, camp.estimates::json#>>'{contentPlan}' AS content_plan
-
-		-- Analyse social stats
-		, camp.estimates::json#>>'{engagement}' AS estimated_engagement
-		, camp.estimates::json#>>'{impressions}' AS estimated_impressions
-		, camp.estimates::json#>>'{reach}' AS estimated_reach
-		, camp.estimates::json#>>'{socialAudience}' AS estimated_social_audience
-		, camp.estimates::json#>>'{talent}' AS estimated_talent
-	FROM campaigns camp
-	JOIN teams ON teams.id = camp.team_id
-	LEFT JOIN campaign_costs cc ON cc.campaign_id = camp.id
-	JOIN campaign_statuses cs ON cs.id = camp.campaign_status_id
-	LEFT JOIN memberships m ON m.team_id = teams.id
-		AND m.user_id = teams.owner_id
-	LEFT JOIN users ON users.id = m.id
-
-	WHERE teams.name NOT IN (
-			'Vamp', -- Confirm if should be included
-			'Vamp Productions', -- Confirm if should be included
-			'Vamp - hotmail', -- Confirm if should be included
-			'Vamp Demo',
-			'VampVision',
-			'Shutterstock (Vamp)', -- Confirm if should be included
-			'Vamp Creative', -- Confirm if should be included
-			'Vamp Demo Whitelabel',
-			'Marks Agency Vamp', -- Confirm if should be included
-			'Vamp Japan', -- Confirm if should be included
-			'Vamp Japan Test',
-			'Vamp Test',
-			'Vamp / Nestle', -- Confirm if should be included
-			'JoTestProd',
-			'Digital4ge',
-			'Yourcompany',
-			'Demo Team',
-			'AnnaTestAB',
-			'Anna Test Company Name',
-			'Lee+test',
-			'Annas Agency',
-			'AnnaTestAB',
-			'Demo Talent Management',
-			'Aili TM Company'
-		)
-		AND teams.name IS NOT NULL
-		AND (camp.desired_age_ranges<>'100-999' OR camp.desired_age_ranges IS NULL)
-		AND cs.code = 'fulfilled'
-		AND camp.start_date IS NOT NULL
-		AND camp.updated_at >= CURRENT_DATE - INTERVAL '1 weeks'
-	ORDER BY camp.start_date DESC;
-"""
-
-CAMPAIGN_CAT_REGION = """
-	SELECT camp.id AS campaign_id
-		, ARRAY_REMOVE(ARRAY_AGG(distinct(cat.code)), NULL) AS categories
-		, ARRAY_REMOVE(ARRAY_AGG(distinct(c.region)), NULL) AS regions
-	FROM campaigns camp
-	JOIN teams ON teams.id = camp.team_id
-	LEFT JOIN campaign_costs cc ON cc.campaign_id = camp.id
-	JOIN campaign_statuses cs ON cs.id = camp.campaign_status_id
-	LEFT JOIN memberships m ON m.team_id = teams.id
-		AND m.user_id = teams.owner_id
-	LEFT JOIN users ON users.id = m.id
-	LEFT JOIN categories cat ON cat.code = ANY(STRING_TO_ARRAY(LOWER(camp.search_term), ',')::text[])
-	LEFT JOIN countries c ON c.code = ANY(STRING_TO_ARRAY(camp.desired_location, ','))
-
-	WHERE teams.name NOT IN (
-			'Vamp', -- Confirm if should be included
-			'Vamp Productions', -- Confirm if should be included
-			'Vamp - hotmail', -- Confirm if should be included
-			'Vamp Demo',
-			'VampVision',
-			'Shutterstock (Vamp)', -- Confirm if should be included
-			'Vamp Creative', -- Confirm if should be included
-			'Vamp Demo Whitelabel',
-			'Marks Agency Vamp', -- Confirm if should be included
-			'Vamp Japan', -- Confirm if should be included
-			'Vamp Japan Test',
-			'Vamp Test',
-			'Vamp / Nestle', -- Confirm if should be included
-			'JoTestProd',
-			'Digital4ge',
-			'Yourcompany',
-			'Demo Team',
-			'AnnaTestAB',
-			'Anna Test Company Name',
-			'Lee+test',
-			'Annas Agency',
-			'AnnaTestAB',
-			'Demo Talent Management',
-			'Aili TM Company'
-		)
-    	AND teams.name IS NOT NULL
-		AND (camp.desired_age_ranges<>'100-999' OR camp.desired_age_ranges IS NULL)
-		AND cs.code = 'fulfilled'
-		AND camp.start_date IS NOT NULL
-        AND camp.updated_at >= CURRENT_DATE - INTERVAL '1 weeks'
-	GROUP BY 1;
-"""
+""" Name of the job's checkpoints, see `checkpoint.py` """
+JOB = "campaign_performance"
+
+
+""" Teams whose campaigns aren't reported on, internal & test teams """
+EXCLUDED_TEAMS = [
+    "Vamp",  # Confirm if should be included
+    "Vamp Productions",  # Confirm if should be included
+    "Vamp - hotmail",  # Confirm if should be included
+    "Vamp Demo",
+    "VampVision",
+    "Shutterstock (Vamp)",  # Confirm if should be included
+    "Vamp Creative",  # Confirm if should be included
+    "Vamp Demo Whitelabel",
+    "Marks Agency Vamp",  # Confirm if should be included
+    "Vamp Japan",  # Confirm if should be included
+    "Vamp Japan Test",
+    "Vamp Test",
+    "Vamp / Nestle",  # Confirm if should be included
+    "JoTestProd",
+    "Digital4ge",
+    "Yourcompany",
+    "Demo Team",
+    "AnnaTestAB",
+    "Anna Test Company Name",
+    "Lee+test",
+    "Annas Agency",
+    "Demo Talent Management",
+    "Aili TM Company",
+]
+
+""" Deliverable statuses once the content is live """
+LIVE_STATUSES = [
+    "checking_social",
+    "media_matched",
+    "ready_for_invoice",
+    "processing_payment",
+    "paid",
+    "fulfilled",
+]
 
 
 """
-This query collects all the deliverables selected for a campaign
+This query re-aggregates the benchmark performance, by benchmark group & week
+ended, of every week touched since the last run: weeks with a campaign,
+deliverable, media or insight modified after `modified_since` (so campaigns
+fulfilled or paid late & late insights are counted) and weeks newly ended in
+(`ended_since`, `until`]. They are kept as sums and counts which replace the
+stored weeks, see: `update_benchmark`. A touched week without any benchmark
+performance left is returned as a single row without a group, so it is
+cleared. Every week is touched when `modified_since` is NULL
 """
-DELIVERABLES = """
-	SELECT camp.id AS campaign_id
-		, briefs.influencer_id
+BENCH_MARK_WEEKLY = """
+	WITH touched AS (
+		SELECT DISTINCT DATE_TRUNC('week', camp.end_date)::date AS end_week
+		FROM campaigns camp
+		LEFT JOIN briefs ON briefs.campaign_id = camp.id
+		LEFT JOIN deliverables d ON d.brief_id = briefs.id
+		LEFT JOIN media ON media.deliverable_id = d.id
+		LEFT JOIN media_insights mi ON mi.media_id = media.id
+		WHERE camp.end_date >= CURRENT_DATE - INTERVAL '1 years'
+		AND camp.end_date <= %(until)s
+		AND (
+			%(modified_since)s IS NULL
+			OR camp.end_date > %(ended_since)s
+			OR camp.updated_at > %(modified_since)s
+			OR d.updated_at > %(modified_since)s
+			OR media.updated_at > %(modified_since)s
+			OR mi.updated_at > %(modified_since)s
+		)
+	), media_stats AS (
+	SELECT countries.region
 		, sp.code AS social_platform
 		, (
 		  CASE
@@ -188,28 +137,10 @@ DELIVERABLES = """
 
 		  END
 		) AS band
-		, sa.followers_count
-		, sa.engagement_rate
-		, ds.code as deliverable_status
-		, CASE
-			WHEN ds.code IN ('due_for_review', 'in_review', 'posting')
-				THEN FALSE
-			WHEN ds.code IN ('checking_social', 'media_matched', 'ready_for_invoice', 'processing_payment', 'paid', 'fulfilled')
-				THEN TRUE
-			ELSE FALSE
-		END AS is_live
 		, dt.code AS deliverable_type
-		, d.id as deliverable_id
-		, br.quantity
-		, br.token_cost
-		, br.custom_price
-		, br.agency_price
-		, br.agreed_price
-		, d.reward_value
-		, media.comments_count
-		, media.likes_count
-		, media.engagement_rate as media_engagement_rate
-
+		, cat.code AS category
+		, DATE_TRUNC('week', camp.end_date)::date AS end_week
+		, GREATEST(camp.updated_at, d.updated_at, media.updated_at, mi.updated_at) AS modified_at
 		, COALESCE(mi.impressions , (
 			  SELECT mit.value
 			  FROM media_insight_tags mit
@@ -230,102 +161,6 @@ DELIVERABLES = """
 	FROM campaigns camp
 	JOIN briefs ON briefs.campaign_id = camp.id
 	JOIN brief_requirements br ON br.brief_id = briefs.id
-	LEFT JOIN deliverables d ON d.brief_id = briefs.id
-		AND d.deliverable_type_id = br.deliverable_type_id
-	LEFT JOIN deliverable_types dt ON dt.id = d.deliverable_type_id
-	LEFT JOIN deliverable_statuses ds ON ds.id = d.deliverable_status_id
-	LEFT JOIN media ON media.brief_id = briefs.id
-		AND media.deliverable_id = d.id
-	LEFT JOIN media_insights mi ON mi.media_id = media.id
-		AND mi.social_platform_id = dt.social_platform_id
-	JOIN social_accounts sa ON sa.influencer_id = briefs.influencer_id
-		AND sa.social_platform_id = dt.social_platform_id
-	JOIN social_platforms sp ON sp.id = sa.social_platform_id
-	JOIN teams ON teams.id = camp.team_id
-	JOIN campaign_statuses cs ON cs.id = camp.campaign_status_id
-	WHERE teams.name NOT IN (
-			'Vamp', -- Confirm if should be included
-			'Vamp Productions', -- Confirm if should be included
-			'Vamp - hotmail', -- Confirm if should be included
-			'Vamp Demo',
-			'VampVision',
-			'Shutterstock (Vamp)', -- Confirm if should be included
-			'Vamp Creative', -- Confirm if should be included
-			'Vamp Demo Whitelabel',
-			'Marks Agency Vamp', -- Confirm if should be included
-			'Vamp Japan', -- Confirm if should be included
-			'Vamp Japan Test',
-			'Vamp Test',
-			'Vamp / Nestle', -- Confirm if should be included
-			'JoTestProd',
-			'Digital4ge',
-			'Yourcompany',
-			'Demo Team',
-			'AnnaTestAB',
-			'Anna Test Company Name',
-			'Lee+test',
-			'Annas Agency',
-			'AnnaTestAB',
-			'Demo Talent Management',
-			'Aili TM Company'
-		)
-    	AND teams.name IS NOT NULL
-		AND (camp.desired_age_ranges<>'100-999' OR camp.desired_age_ranges IS NULL)
-		AND cs.code = 'fulfilled'
-		AND camp.start_date IS NOT NULL
-        AND camp.updated_at >= CURRENT_DATE - INTERVAL '1 weeks'
-		AND br.quantity > 0
-		AND dt.code NOT IN ('product_purchase', 'product_distribution');
-"""
-
-
-BENCH_MARK = """
-	SELECT countries.region
-		, sp.code AS social_platform
-		, (
-		  CASE
-			WHEN (sp.code IN ('youtube', 'instagram') AND sa.followers_count <= 10000)
-				OR (sp.code = 'tiktok' AND sa.followers_count BETWEEN 10000 AND 100000)
-				THEN 'nano'
-			WHEN (sp.code IN ('youtube', 'instagram') AND sa.followers_count <= 25000)
-				OR (sp.code = 'tiktok' AND sa.followers_count <= 200000)
-				THEN 'micro'
-			WHEN (sp.code IN ('youtube', 'instagram') AND sa.followers_count <= 50000)
-				OR (sp.code = 'tiktok' AND sa.followers_count <= 500000)
-				THEN 'mid'
-			WHEN (sp.code IN ('youtube', 'instagram') AND sa.followers_count <= 100000)
-				OR (sp.code = 'tiktok' AND sa.followers_count <= 1000000)
-				THEN 'macro'
-			WHEN (sp.code IN ('youtube', 'instagram') AND sa.followers_count > 100000)
-				OR (sp.code = 'tiktok' AND sa.followers_count > 1000000)
-				THEN 'mega'
-
-			ELSE 'unknown'
-
-		  END
-		) AS band
-		, dt.code AS deliverable_type
-		, cat.code AS category
-		, AVG(COALESCE(mi.impressions , (
-			  SELECT mit.value
-			  FROM media_insight_tags mit
-			  JOIN insight_tags it ON it.id = mit.insight_tag_id
-			  WHERE mit.media_id = media.id
-			  AND it.code = 'view_count'
-			)
-		)) AS impressions
-		, AVG(mi.reach) AS reach
-		, AVG(COALESCE(mi.engagement , (
-			  SELECT mit.value
-			  FROM media_insight_tags mit
-			  JOIN insight_tags it ON it.id = mit.insight_tag_id
-			  WHERE mit.media_id = media.id
-			  AND it.code = 'engagement_count'
-			)
-		)) AS engagement
-	FROM campaigns camp
-	JOIN briefs ON briefs.campaign_id = camp.id
-	JOIN brief_requirements br ON br.brief_id = briefs.id
 	JOIN deliverables d ON d.brief_id = briefs.id
 		AND d.deliverable_type_id = br.deliverable_type_id
 	JOIN deliverable_types dt ON dt.id = d.deliverable_type_id
@@ -372,35 +207,47 @@ BENCH_MARK = """
     	AND teams.name IS NOT NULL
 		AND (camp.desired_age_ranges<>'100-999' OR camp.desired_age_ranges IS NULL)
 		AND cs.code IN ('fulfilled', 'paid')
-		AND camp.end_date BETWEEN CURRENT_DATE - INTERVAL '1 years' AND CURRENT_DATE - INTERVAL '1 week'
+		AND camp.end_date >= CURRENT_DATE - INTERVAL '1 years'
+		AND camp.end_date <= %(until)s
+		AND DATE_TRUNC('week', camp.end_date)::date IN (SELECT end_week FROM touched)
 		AND camp.start_date IS NOT NULL
 		AND br.quantity > 0
 		AND dt.code NOT IN ('product_purchase', 'product_distribution')
-	GROUP BY 1, 2, 3, 4, 5;
+	)
+	SELECT region, social_platform, band, deliverable_type, category, end_week
+		, SUM(impressions) AS impressions_sum
+		, COUNT(impressions) AS impressions_count
+		, SUM(reach) AS reach_sum
+		, COUNT(reach) AS reach_count
+		, SUM(engagement) AS engagement_sum
+		, COUNT(engagement) AS engagement_count
+		, MAX(modified_at) AS modified_at
+	FROM touched
+	LEFT JOIN media_stats USING (end_week)
+	GROUP BY 1, 2, 3, 4, 5, 6;
 """
 
 
-EXPECTED_COLS = ["impressions", "reach", "engagement"]
+BENCH_COLS = ["region", "social_platform", "band", "deliverable_type", "category"]
 
-""" Generic structure for the performance statistics table rows """
-performance_statistic = """
-	<tr class='{css_class}' style='width: 100%;'>
-			<td class='table-row' style='width: 2rem; height: 2rem;'>{icon}</td>
-			<td style='text-align: left; width: 8rem'>{stat}</td>
+""" Generic structure for performance tables, a row per statistic """
+performance_table = compile_template(
+    """
+	<table role='presentation' style='width:100%;border-collapse:collapse;border:0;border-spacing:0;'>
+		<tbody>
+			{% for icon, stat, value in zip(icons, stats, values) %}
+	<tr class='' style='width: 100%;'>
+			<td class='table-row' style='width: 2rem; height: 2rem;'>{{ icon }}</td>
+			<td style='text-align: left; width: 8rem'>{{ stat }}</td>
 			<td style='text-align: left; width: auto'>
-				{value}
+				{{ value }}
 			</td>
 	</tr>
-"""
-
-""" Generic structure for performance tables """
-performance_sections = """
-	<table role='presentation' style='width:100%;border-collapse:collapse;border:0;border-spacing:0;'>
-		<tbody>
-			{table_rows}
+			{% endfor %}
 		</tbody>
 	</table>
 """
+)
 
 
 # TODO: Make a donut graph of current stats to lower bound
@@ -438,23 +285,69 @@ platform_icons = {
 }
 
 
-def set_connection_str() -> str:
-    """Populate DB connection string"""
-    host = os.getenv("HOST")
-    password = os.getenv("PASSWORD")
-    database = os.getenv("DATABASE")
-    user = os.getenv("DBUSER")
-    port = os.getenv("PORT", "5432")
+def report_campaigns(
+    campaigns: pd.DataFrame, since: any, retry: list, today: pd.Timestamp
+) -> pd.DataFrame:
+    """
+    The fulfilled customer campaigns to report on, filtered from the base
+    extract of campaigns, see: `extract.BASE_CAMPAIGNS`
+
+    since : any
+            The watermark, campaigns updated after it are reported. Without
+            one the campaigns updated in the last week are
+
+    retry : list
+            The campaigns whose email failed to send, reported regardless
+    """
+    updated_at = pd.to_datetime(campaigns["updated_at"])
+    if since is not None:
+        updated = updated_at > pd.Timestamp(since)
+    else:
+        updated = updated_at >= today - pd.Timedelta(weeks=1)
+
+    mask = (
+        campaigns["team_name"].notnull()
+        & ~campaigns["team_name"].isin(EXCLUDED_TEAMS)
+        & (campaigns["desired_age_ranges"].fillna("") != "100-999")
+        & (campaigns["campaign_status"] == "fulfilled")
+        & campaigns["start_date"].notnull()
+        & (updated | campaigns["campaign_id"].isin(retry))
+    )
+
+    return (
+        campaigns.loc[mask]
+        .sort_values("start_date", ascending=False)
+        .reset_index(drop=True)
+    )
 
-    return f"postgresql://{user}:{password}@{host}:{port}/{database}"
 
+def report_results(
+    campaigns: pd.DataFrame, requirements: pd.DataFrame, media: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    The deliverables selected for the campaigns & the performance of their
+    media, filtered from the base extracts, see: `extract.BASE_REQUIREMENTS`
 
-def fetch_data(query) -> tuple:
-    """Fetch query from db"""
-    connect_str = set_connection_str()
-    engine = create_engine(connect_str)
+    returns : pd.DataFrame
+            A row per deliverable & media, on the influencer's social account
+    """
+    mask = (
+        requirements["campaign_id"].isin(campaigns["campaign_id"])
+        & requirements["deliverable_id"].notnull()
+        & requirements["social_account_id"].notnull()
+        & (requirements["quantity"] > 0)
+        & ~requirements["deliverable_type"].isin(
+            ["product_purchase", "product_distribution"]
+        )
+    )
+    results = requirements.loc[mask].astype({"deliverable_id": "int64"})
+    results["is_live"] = results["deliverable_status"].isin(LIVE_STATUSES)
 
-    return pd.io.sql.read_sql(query, engine)
+    return results.merge(
+        media.drop(columns="media_id").astype({"deliverable_id": "int64"}),
+        how="left",
+        on=["brief_id", "deliverable_id"],
+    ).reset_index(drop=True)
 
 
 def format_thousand(x: any) -> any:
@@ -558,9 +451,82 @@ def adjust_benchmarks(
     return benchmark
 
 
-def format_benchmark(
-    camp: pd.Series, results: pd.DataFrame, benchmark: pd.DataFrame
-) -> dict:
+def cached_benchmark(benchmarks: dict, grp_chain: tuple) -> pd.DataFrame:
+    """
+    Adjust the benchmark by each set of group columns in `grp_chain` in turn,
+    see: `adjust_benchmarks`. Every adjustment is memoized in `benchmarks` so
+    it is only computed once per job, rather than once per campaign
+
+    benchmarks: dict
+            The adjusted benchmarks keyed by their chain of group columns, the
+            unadjusted benchmark is keyed by an empty tuple
+
+    grp_chain: tuple
+            Tuples of the group columns, in the order they are applied
+
+    returns : pd.DataFrame
+            The adjusted benchmark
+    """
+    if grp_chain not in benchmarks:
+        benchmarks[grp_chain] = adjust_benchmarks(
+            benchmark=cached_benchmark(benchmarks, grp_chain[:-1]),
+            grp_cols=list(grp_chain[-1]),
+        )
+
+    return benchmarks[grp_chain]
+
+
+def update_benchmark(
+    stored: pd.DataFrame, weekly: pd.DataFrame, today: pd.Timestamp
+) -> pd.DataFrame:
+    """
+    Replace the stored weekly benchmark aggregates of the weeks touched since
+    the last run with their re-aggregation, dropping the weeks which have
+    fallen out of the year the benchmark covers
+
+    stored: pd.DataFrame
+            The aggregates checkpointed by the last successful run
+
+    weekly: pd.DataFrame
+            The aggregates of the touched weeks, see: `BENCH_MARK_WEEKLY`
+
+    returns : pd.DataFrame
+            The sums & counts of each statistic by benchmark group & week
+    """
+    weekly = weekly.drop(columns="modified_at", errors="ignore")
+    weekly = weekly.assign(end_week=pd.to_datetime(weekly["end_week"]))
+
+    if len(stored):
+        stored = stored.assign(end_week=pd.to_datetime(stored["end_week"]))
+        stored = stored.loc[~stored["end_week"].isin(weekly["end_week"])]
+        weekly = pd.concat([stored, weekly], ignore_index=True)
+
+    # Touched weeks without any benchmark performance are only placeholders
+    weekly = weekly.loc[weekly["social_platform"].notnull()]
+
+    start_week = (today - pd.DateOffset(years=1)).to_period("W").start_time
+    return weekly.loc[weekly["end_week"] >= start_week].reset_index(drop=True)
+
+
+def benchmark_averages(weekly: pd.DataFrame) -> pd.DataFrame:
+    """
+    The average performance of each benchmark group, from the weekly sums &
+    counts, see: `update_benchmark`
+    """
+    totals = (
+        weekly.drop(columns="end_week")
+        .groupby(BENCH_COLS, dropna=False)
+        .sum(min_count=1)
+        .reset_index()
+    )
+
+    for col in EXPECTED_COLS:
+        totals[col] = totals[f"{col}_sum"] / totals[f"{col}_count"].replace(0, np.nan)
+
+    return totals.loc[:, BENCH_COLS + EXPECTED_COLS]
+
+
+def format_benchmark(camp: pd.Series, squad: pd.DataFrame, benchmarks: dict) -> dict:
     """
     Format the structure of the benchmark section into a readible dictionary
     ready for campaign monitor. The dictionary should contain the benchmark
@@ -571,15 +537,20 @@ def format_benchmark(
             A single campaign represented as a data frame row which is then
             formatted
 
+    squad : pd.DataFrame
+            The deliverables of the campaign
+
+    benchmarks : dict
+            The memoized benchmarks, see: `cached_benchmark`
+
     returns : dict
             The formatted benchmark section ready for campaign monitor
     """
     regions = camp["regions"]
     categories = camp["categories"]
-    camp["campaign_id"]
-    squad = results.query("campaign_id == @camp_id")
     stat_cols = EXPECTED_COLS
     bench_cols = ["region", "social_platform", "band", "category"]
+    grp_chain = ()
 
     if len(squad) > 0:
         deliverables = squad
@@ -587,19 +558,21 @@ def format_benchmark(
     else:
         # get details from campaign
         deliverables = campaign_plan(camp)
-        benchmark = adjust_benchmarks(benchmark=benchmark, grp_cols=bench_cols)
+        grp_chain = (*grp_chain, tuple(bench_cols))
 
     # alter benchmarks to average regions when region not specified
     if len(regions) == 0 or regions[0] is None:
         regions = []
         bench_cols = [col for col in bench_cols if col != "region"]
-        benchmark = adjust_benchmarks(benchmark=benchmark, grp_cols=bench_cols)
+        grp_chain = (*grp_chain, tuple(bench_cols))
 
     # alter benchmarks to average categories when category not specified
     if len(categories) == 0 or categories[0] is None:
         categories = []
         bench_cols = [col for col in bench_cols if col != "category"]
-        benchmark = adjust_benchmarks(benchmark=benchmark, grp_cols=bench_cols)
+        grp_chain = (*grp_chain, tuple(bench_cols))
+
+    benchmark = cached_benchmark(benchmarks, grp_chain)
 
     # Create masks for applicable benchmarks, do here as benchmarks changes above
     mask = benchmark["social_platform"].isin(deliverables["social_platform"])
@@ -657,85 +630,7 @@ def expected_social_audience(squad: pd.DataFrame) -> dict:
     }
 
 
-def expected_engagements(
-    followers_count: int, engagement_rate: float, social_type: str
-) -> int:
-    """Linear model of expected engagements"""
-    engagement_rate = engagement_rate if engagement_rate > 0 else 0.001
-    log_followers = math.log(followers_count + 1)
-    log_engagement_rate = math.log(engagement_rate)
-    social_type = 1 if social_type == "story" else 0
-    result = (
-        4.281810
-        + 0.333010 * log_followers
-        + 0.351721 * log_engagement_rate
-        - 6.188532 * social_type
-    )
-    return round(math.exp(result), 0)
-
-
-def expected_impressions(
-    followers_count: int, engagement_rate: float, social_type: str
-) -> int:
-    """Linear model of expected impressions"""
-    engagement_rate = engagement_rate if engagement_rate > 0 else 0.001
-    log_followers = math.log(followers_count + 1)
-    log_engagement_rate = math.log(engagement_rate)
-    social_type = 1 if social_type == "story" else 0
-    result = (
-        1.670552
-        + 0.874800 * log_followers
-        + 0.569204 * log_engagement_rate
-        - 1.910629 * social_type
-    )
-    return round(math.exp(result), 0)
-
-
-def expected_reach(
-    followers_count: int, engagement_rate: float, social_type: str
-) -> int:
-    """Linear model of expected reach"""
-    engagement_rate = engagement_rate if engagement_rate > 0 else 0.001
-    log_followers = math.log(followers_count + 1)
-    log_engagement_rate = math.log(engagement_rate)
-    social_type = 1 if social_type == "story" else 0
-    result = (
-        1.419314
-        + 0.880711 * log_followers
-        + 0.554041 * log_engagement_rate
-        - 1.913101 * social_type
-    )
-    return round(math.exp(result), 0)
-
-
-def calculate_expected(row: pd.Series) -> pd.DataFrame:
-    """
-    Calculated the expected engagment, imopressions and reach for each
-    squad member
-
-    row : pd.Series
-            The dataframe row containing the squad members details
-
-    return pd.Series
-            A new row, containing the expected performance of the squad member.
-    """
-    engagement = expected_engagements(
-        row["followers_count"], row["engagement_rate"], row["deliverable_type"]
-    )
-    impressions = expected_impressions(
-        row["followers_count"], row["engagement_rate"], row["deliverable_type"]
-    )
-    reach = expected_reach(
-        row["followers_count"], row["engagement_rate"], row["deliverable_type"]
-    )
-
-    return pd.Series(
-        {"engagement": engagement, "impressions": impressions, "reach": reach},
-        index=EXPECTED_COLS,
-    )
-
-
-def format_current_performance(campaign: pd.Series, deliverables: pd.DataFrame) -> dict:
+def format_current_performance(campaign: pd.Series, squad: pd.DataFrame) -> dict:
     """
     Format the structure of the current performance section into a readible dictionary
     ready for campaign monitor. The dictionary should contain the current
@@ -745,16 +640,12 @@ def format_current_performance(campaign: pd.Series, deliverables: pd.DataFrame)
             A single campaign represented as a data frame row which is then
             formatted
 
-    deliverables : pd.DataFrame
-            The dataframe containing all deliverables including the squad of the
-            current campaign
+    squad : pd.DataFrame
+            The deliverables of the current campaign
 
     returns : dict
             The formatted current performance section ready for campaign monitor
     """
-    campaign["campaign_id"]
-    squad = deliverables.query("campaign_id == @camp_id")
-
     if len(squad) > 0:
         # Model expected performance
         squad_performance = squad.loc[:, EXPECTED_COLS]
@@ -781,7 +672,7 @@ def format_current_performance(campaign: pd.Series, deliverables: pd.DataFrame)
     }
 
 
-def format_squad_estimates(campaign: pd.Series, deliverables: pd.DataFrame) -> dict:
+def format_squad_estimates(campaign: pd.Series, squad: pd.DataFrame) -> dict:
     """
     Format the structure of the squad estimate section into a readible dictionary
     ready for campaign monitor. The dictionary should contain the expected
@@ -791,30 +682,28 @@ def format_squad_estimates(campaign: pd.Series, deliverables: pd.DataFrame) -> d
             A single campaign represented as a data frame row which is then
             formatted
 
-    deliverables : pd.DataFrame
-            The dataframe containing all deliverables including the squad of the
-            current campaign
+    squad : pd.DataFrame
+            The deliverables of the current campaign
 
     returns : dict
             The formatted squad estimate section ready for campaign monitor
     """
-    campaign["campaign_id"]
-    squad = deliverables.query("campaign_id == @camp_id")
-
     if len(squad) > 0:
         # Model expected performance
-        squad_expectation = squad.apply(calculate_expected, axis=1)
+        squad_expectation = expected_performance(
+            squad["followers_count"],
+            squad["engagement_rate"],
+            squad["deliverable_type"],
+        )
 
         # format upper & lower bounds
-        upper = squad_expectation.sum()
-        lower = upper - (2 * squad_expectation.std())
+        bounds = expected_bounds(squad_expectation)
+        upper = bounds["upperBound"].astype("int", errors="ignore")
+        lower = bounds["lowerBound"].astype("int", errors="ignore")
 
         squad_section = {
             u[0]: {"upperBound": u[1], "lowerBound": l[1]}
-            for u, l in zip(
-                upper.astype("int", errors="ignore").items(),
-                lower.astype("int", errors="ignore").items(),
-            )
+            for u, l in zip(upper.items(), lower.items())
         }
     else:
         squad_section = {k: {} for k in EXPECTED_COLS}
@@ -944,37 +833,37 @@ def render_statistic(stat):
     return ""
 
 
-def format_html_rows(campaign: pd.Series, section: str, ignore: list) -> list:
-    """ """
-    return [
-        performance_statistic.format(
-            css_class="",
-            icon=get_icon(campaign, section, key),
-            stat=str(key).replace("_", " ").capitalize(),
-            value=render_statistic(
-                campaign[section][key]["adjusted"]
-                if isinstance(campaign[section][key], dict)
-                and "adjusted" in campaign[section][key].keys()
-                else campaign[section][key]
-            ),
-        )
+def format_html_columns(campaign: pd.Series, section: str, ignore: list) -> dict:
+    """The icon, name & value columns of the statistics in a section"""
+    keys = [
+        key
         for key in sorted(campaign[section].keys())
         if key not in ignore and bool(campaign[section][key])
     ]
+    stats = [campaign[section][key] for key in keys]
+
+    return dict(
+        icons=[get_icon(campaign, section, key) for key in keys],
+        stats=[str(key).replace("_", " ").capitalize() for key in keys],
+        values=[
+            render_statistic(
+                stat["adjusted"]
+                if isinstance(stat, dict) and "adjusted" in stat.keys()
+                else stat
+            )
+            for stat in stats
+        ],
+    )
 
 
 def format_html(campaign: pd.Series, section: str, ignore: list) -> str:
-
-    stat_rows = format_html_rows(campaign=campaign, section=section, ignore=ignore)
-    return (
-        performance_sections.format(table_rows="".join(stat_rows))
-        .replace("\t", "")
-        .replace("\n", "")
-    )
+    """Render the statistics table of a section, see: `performance_table`"""
+    columns = format_html_columns(campaign=campaign, section=section, ignore=ignore)
+    return performance_table.render(**columns).replace("\t", "").replace("\n", "")
 
 
 def format_template(
-    campaign: pd.Series, results: pd.DataFrame, benchmark: pd.DataFrame
+    campaign: pd.Series, squad: pd.DataFrame, benchmarks: dict
 ) -> pd.Series:
     """
     Format the HTML template for pricing insights. This creates 3 tables of
@@ -983,8 +872,11 @@ def format_template(
     campaigns : pd.DataFrame
             The dataframe containing the active campaigns
 
-    results : pd.DataFrame
-            The dataframe containing the deliverables for each campaign
+    squad : pd.DataFrame
+            The dataframe containing the deliverables of the campaign
+
+    benchmarks : dict
+            The memoized benchmarks, see: `cached_benchmark`
 
     return : dict
             The formatted dictionary for the email
@@ -992,10 +884,10 @@ def format_template(
 
     # add budget section
     campaign["quote"] = format_brief_estimates(campaign)
-    campaign["squad"] = format_squad_estimates(campaign, results)
-    campaign["current"] = format_current_performance(campaign, results)
+    campaign["squad"] = format_squad_estimates(campaign, squad)
+    campaign["current"] = format_current_performance(campaign, squad)
 
-    campaign["bench"] = format_benchmark(campaign, results, benchmark)
+    campaign["bench"] = format_benchmark(campaign, squad, benchmarks)
     campaign["compare"] = compare_sections(campaign)
 
     campaign["quote_html_stats"] = format_html(campaign, "quote", ["budget"])
@@ -1091,6 +983,11 @@ def create_email(event: any, context: any) -> None:
     This lambda should be triggered by a cron job at the end of every week for
     the previous week
 
+    Each successful run checkpoints a watermark, the benchmark aggregates &
+    the campaigns whose email failed to send, so the next run only fetches
+    the campaigns updated since (plus those failed sends) & the benchmark
+    weeks touched since
+
     event : aws lambda default arg
             Not used by the function
 
@@ -1101,27 +998,94 @@ def create_email(event: any, context: any) -> None:
     CM_API_KEY = os.getenv("CM_API_KEY")
     CM_EMAIL_TEMPLATE = os.getenv("CM_CAMP_PERF_TEMPLATE")
 
-    campaigns = fetch_data(CAMPAIGNS)
-    campaigns = campaigns.merge(
-        fetch_data(CAMPAIGN_CAT_REGION),
-        how="left",
-        left_on="campaign_id",
-        right_on="campaign_id",
-    )
+    today = pd.Timestamp.today().normalize()
+    until = today - pd.Timedelta(weeks=1)
+    watermark = read_checkpoint(JOB, "watermark") or {}
+    updated_since = watermark.get("campaigns_updated_at")
+    ended_since = watermark.get("benchmark_ended_on")
+    modified_since = watermark.get("benchmark_modified_at")
+
+    # Without stored aggregates every week is re-aggregated, not just those
+    # touched since the last run
+    stored = read_frame(JOB, "benchmark")
+    if len(stored) == 0:
+        modified_since = None
+
+    # Campaigns whose email failed to send are retried until sent, from a
+    # window wide enough to include them
+    reported = read_frame(JOB, "results")
+    retry = []
+    window = updated_since
+    if len(reported):
+        unsent = reported.loc[~reported["sent"].astype(bool)]
+        retry = [int(i) for i in unsent["campaign_id"]]
+        if "updated_at" in unsent and unsent["updated_at"].notnull().any():
+            earliest = pd.to_datetime(unsent["updated_at"]).min()
+            window = earliest if window is None else min(earliest, pd.Timestamp(window))
+
+    with timed("extract"):
+        extracts = fetch_all(
+            {
+                **base_extracts(window),
+                "benchmark": (
+                    BENCH_MARK_WEEKLY,
+                    {
+                        "ended_since": ended_since,
+                        "modified_since": modified_since,
+                        "until": str(until.date()),
+                    },
+                ),
+            }
+        )
+        campaigns = report_campaigns(extracts["campaigns"], updated_since, retry, today)
+
+    # Checkpointed once the run succeeds
+    next_watermark = {
+        "campaigns_updated_at": (
+            str(campaigns["updated_at"].max()) if len(campaigns) else updated_since
+        ),
+        "benchmark_ended_on": str(until.date()),
+        "benchmark_modified_at": (
+            str(extracts["benchmark"]["modified_at"].max())
+            if extracts["benchmark"]["modified_at"].notnull().any()
+            else modified_since
+        ),
+    }
 
-    results = fetch_data(DELIVERABLES)
-    benchmark = fetch_data(BENCH_MARK)
+    with timed("transform"):
+        results = report_results(campaigns, extracts["requirements"], extracts["media"])
+        weekly = update_benchmark(stored, extracts["benchmark"], today)
+        benchmark = benchmark_averages(weekly)
 
-    # Filter out any campaigns that dont have deliverables to report on
-    campaigns = campaigns.loc[
-        campaigns["campaign_id"].isin(results["campaign_id"].unique()), :
-    ]
+        # Filter out any campaigns that dont have deliverables to report on
+        campaigns = campaigns.loc[
+            campaigns["campaign_id"].isin(results["campaign_id"].unique()), :
+        ]
 
     logger.info(f"Processing { len(campaigns) } campaign(s) for performance email")
-    campaigns = transform_campaigns(campaigns, results)
-    email_data = campaigns.apply(
-        lambda campaign: format_template(campaign, results, benchmark), axis=1
-    )
+    if len(campaigns) == 0:
+        # Nothing to report since the last run
+        write_frame(JOB, "benchmark", weekly)
+        write_checkpoint(JOB, "watermark", next_watermark)
+        return
+
+    with timed("transform"):
+        campaigns = transform_campaigns(campaigns, results)
+
+        # Partition the deliverables & adjust the benchmarks once, so each
+        # campaign only looks up its own squad & benchmark
+        squads = dict(tuple(results.groupby("campaign_id")))
+        no_squad = results.iloc[0:0]
+        benchmarks = {(): benchmark}
+
+    with timed("render"):
+        email_data = campaigns.apply(
+            lambda campaign: format_template(
+                campaign, squads.get(campaign["campaign_id"], no_squad), benchmarks
+            ),
+            axis=1,
+        )
+
     final_cols = [
         "campaign_id",
         "campaign_name",
@@ -1137,35 +1101,47 @@ def create_email(event: any, context: any) -> None:
 
     consent_to_track = "no"
     auth = {"api_key": CM_API_KEY}
-    errors = 0
     error_threshold = 0.1
 
-    for camp in email_data.loc[:, final_cols].to_dict("records"):
-        try:
-            tx_mailer = Transactional(auth)
-            # Send the message and save the response
-            # print(json.dumps(camp, indent=4))
-
-            # TODO: replace RECIPIENTS with campaign owner email (where not a vamp email)
-            response = tx_mailer.smart_email_send(
-                CM_EMAIL_TEMPLATE, RECIPIENTS, consent_to_track, data=camp
-            )
-
-            # TODO: Log any that are really bad
-        except Exception as e:
-            logger.info("An error occured whilst sending the email")
-            logger.error(e)
-            logger.info(json.dumps(camp, indent=4))
+    # One client shared by every message, sent concurrently & rate limited
+    # TODO: replace RECIPIENTS with campaign owner email (where not a vamp email)
+    tx_mailer = transactional(auth)
+    messages = {
+        camp["campaign_id"]: camp
+        for camp in email_data.loc[:, final_cols].to_dict("records")
+    }
+    with timed("send"):
+        report = dispatch_emails(
+            tx_mailer, CM_EMAIL_TEMPLATE, RECIPIENTS, messages, consent_to_track
+        )
 
-            errors = errors + 1
+    for failure in report.loc[~report["sent"], "id"]:
+        logger.info(json.dumps(messages[failure], indent=4))
 
+    errors = (~report["sent"]).sum()
     if errors / len(campaigns) > error_threshold:
         # Raise error to make data team aware of issue/potential bug.
         raise Exception(
-            f"More than { errors // len(campaigns) }% of campaign performance emails"
-            " are failing to send"
+            f"More than { int(errors * 100 / len(campaigns)) }% of campaign"
+            " performance emails are failing to send"
         )
 
+    # Only checkpoint successful runs, a failed run is retried from the same
+    # watermark. Only the campaigns still to be sent are kept, to be retried
+    sent = email_data.loc[:, ["updated_at", *final_cols]].merge(
+        report.loc[:, ["id", "sent"]], left_on="campaign_id", right_on="id"
+    )
+    sent = sent.drop(columns="id").astype({"sent": bool})
+    if len(reported):
+        reported = reported.loc[
+            ~reported["sent"].astype(bool)
+            & ~reported["campaign_id"].isin(sent["campaign_id"])
+        ]
+    unsent = pd.concat([reported, sent.loc[~sent["sent"]]], ignore_index=True)
+    write_frame(JOB, "results", unsent)
+    write_frame(JOB, "benchmark", weekly)
+    write_checkpoint(JOB, "watermark", next_watermark)
+
 
 if __name__ == "__main__":
     """For testing purposes"""
@@ -0,0 +1,103 @@
+"""
+ checkpoint.py
+
+ @desc:
+ Persisted state of the email lambdas between runs, such as watermarks and
+ previously computed aggregates, so a run only has to process what changed
+ since the last successful run.
+
+ Checkpoints are JSON documents stored in S3 under `CHECKPOINT_PREFIX` when
+ `CHECKPOINT_BUCKET` is set (the deployed lambdas, see serverless.yml),
+ otherwise in the local `CHECKPOINT_DIR` (for local runs).
+"""
+import io
+import json
+import logging
+import os
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+CHECKPOINT_BUCKET = os.getenv("CHECKPOINT_BUCKET")
+CHECKPOINT_PREFIX = os.getenv("CHECKPOINT_PREFIX", "emails/checkpoints")
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "/tmp/email-checkpoints")
+
+
+def checkpoint_key(job: str, name: str) -> str:
+    """The key (or local path) of a checkpoint"""
+    if CHECKPOINT_BUCKET:
+        return f"{CHECKPOINT_PREFIX}/{job}/{name}.json"
+
+    return os.path.join(CHECKPOINT_DIR, job, f"{name}.json")
+
+
+def read_checkpoint(job: str, name: str) -> any:
+    """
+    Read a checkpoint of a job
+
+    job : str
+            The email job the checkpoint belongs to
+
+    name : str
+            The name of the checkpoint
+
+    returns : any
+            The stored JSON document, None if nothing has been stored yet. Any
+            other failure (access, throttling, corrupt JSON) is raised, so a
+            run never mistakes an unreadable checkpoint for a first run
+    """
+    key = checkpoint_key(job, name)
+
+    if CHECKPOINT_BUCKET:
+        import boto3  # provided by the lambda runtime
+        from botocore.exceptions import ClientError
+
+        try:
+            response = boto3.client("s3").get_object(Bucket=CHECKPOINT_BUCKET, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+                raise
+
+            logger.info(f"No checkpoint {key}, starting from scratch")
+            return None
+
+        return json.load(response["Body"])
+
+    try:
+        with open(key) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.info(f"No checkpoint {key}, starting from scratch")
+        return None
+
+
+def write_checkpoint(job: str, name: str, document: any) -> None:
+    """Write a JSON document as a checkpoint of a job, see `read_checkpoint`"""
+    key = checkpoint_key(job, name)
+    body = json.dumps(document, default=str)
+
+    if CHECKPOINT_BUCKET:
+        import boto3  # provided by the lambda runtime
+
+        boto3.client("s3").put_object(Bucket=CHECKPOINT_BUCKET, Key=key, Body=body)
+    else:
+        os.makedirs(os.path.dirname(key), exist_ok=True)
+        with open(key, "w") as f:
+            f.write(body)
+
+
+def read_frame(job: str, name: str) -> pd.DataFrame:
+    """Read a data frame checkpoint, empty if nothing has been stored yet"""
+    document = read_checkpoint(job, name)
+    if document is None:
+        return pd.DataFrame()
+
+    return pd.read_json(io.StringIO(json.dumps(document)), orient="split")
+
+
+def write_frame(job: str, name: str, data: pd.DataFrame) -> None:
+    """Write a data frame checkpoint, see `read_frame`"""
+    document = json.loads(data.to_json(orient="split", date_format="iso"))
+    write_checkpoint(job, name, document)
@@ -0,0 +1,308 @@
+"""
+ dispatch.py
+
+ @desc:
+ Concurrent, rate limited dispatch of campaign monitor smart emails for the
+ email lambdas. One `Transactional` client is reused for every message, which
+ are sent through a bounded pool of workers. Transient errors are retried with
+ exponential backoff and every message reports its latency & failure. A send
+ isn't idempotent, so only errors where the message surely wasn't accepted
+ are retried: 5xx, 429 & failures to connect.
+
+ `FakeTransactional` stands in for the campaign monitor client so dispatch
+ can be benchmarked offline, see `__main__`. `DryRunTransactional` writes the
+ messages to disk instead of sending them, see `runner.py`.
+"""
+import json
+import logging
+import os
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from createsend import ClientError, ServerError, Transactional, Unavailable
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+""" Dispatch settings, overridable per lambda through the environment """
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "4"))
+EMAIL_RATE_LIMIT = float(os.getenv("EMAIL_RATE_LIMIT", "5"))  # per second
+EMAIL_RETRIES = int(os.getenv("EMAIL_RETRIES", "3"))
+EMAIL_BACKOFF = float(os.getenv("EMAIL_BACKOFF", "1"))  # seconds
+
+
+class RateLimited(ClientError):
+    """A 429 from campaign monitor, which createsend raises as a bare ClientError"""
+
+
+class CampaignMonitorTransactional(Transactional):
+    """`createsend.Transactional` telling rate limits apart from other 4xx"""
+
+    def handle_response(self, status, data):
+        if status == 429:
+            raise RateLimited()
+
+        return super().handle_response(status, data)
+
+
+"""
+Errors worth retrying, i.e 5xx, 429 & failing to connect. Errors once the
+request may have been sent (timeouts, resets, bad responses) aren't, as
+retrying them could send the email twice
+"""
+TRANSIENT_ERRORS = (
+    ServerError,
+    Unavailable,
+    RateLimited,
+    ConnectionRefusedError,
+    socket.gaierror,
+)
+
+
+class RateLimiter:
+    """Spaces out calls, across threads, so no more than `rate` start per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate else 0
+        self.next_call = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+class FakeTransactional:
+    """
+    Offline stand in for `createsend.Transactional`, simulating the latency of
+    the campaign monitor API and a share of transient failures
+
+    latency : float
+            Average seconds a send takes
+
+    failure_rate : float
+            Share of sends raising a `ServerError`
+    """
+
+    def __init__(self, auth=None, latency=0.2, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def smart_email_send(self, smart_email_id, to, consent_to_track, **kwargs):
+        with self.lock:
+            latency = self.random.uniform(0.5, 1.5) * self.latency
+            failed = self.random.random() < self.failure_rate
+
+        time.sleep(latency)
+        if failed:
+            raise ServerError()
+
+        return [
+            {"Status": "Accepted", "MessageID": str(uuid.uuid4()), "Recipient": r}
+            for r in to
+        ]
+
+
+def render_preview(template: str, data: dict) -> str:
+    """
+    Approximate preview of a smart email, substituting the `{{ field }}`
+    placeholders of its liquid template with the message data. Filters &
+    `{% tags %}` are ignored, campaign monitor does the real rendering
+    """
+
+    def lookup(match):
+        value = data
+        for key in re.findall(r"[\w-]+", match.group(1).split("|")[0]):
+            value = value.get(key, "") if isinstance(value, dict) else ""
+
+        return str(value)
+
+    preview = re.sub(r"{{-?\s*(.*?)\s*-?}}", lookup, template)
+    return re.sub(r"{%-?.*?-?%}", "", preview, flags=re.S)
+
+
+class DryRunTransactional:
+    """
+    Stand in for `createsend.Transactional` writing each message to disk, as
+    JSON & an HTML preview when the template of the smart email is given
+
+    out_dir : str
+            The directory the messages are written to
+
+    template : str
+            The liquid template of the smart email, see: `render_preview`
+    """
+
+    def __init__(self, auth=None, out_dir="dry-run", template=None):
+        self.out_dir = out_dir
+        self.template = template
+        self.lock = threading.Lock()
+        self.count = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+    def smart_email_send(self, smart_email_id, to, consent_to_track, **kwargs):
+        data = kwargs.get("data") or {}
+
+        with self.lock:
+            self.count = self.count + 1
+            name = os.path.join(self.out_dir, f"message-{self.count:04d}")
+
+        with open(f"{name}.json", "w") as f:
+            json.dump(
+                {"smart_email_id": smart_email_id, "to": to, "data": data},
+                f,
+                indent=4,
+                default=str,
+            )
+
+        if self.template is not None:
+            with open(f"{name}.html", "w") as f:
+                f.write(render_preview(self.template, data))
+
+        return [{"Status": "Accepted", "MessageID": name, "Recipient": r} for r in to]
+
+
+""" Builds the client of every job, replaced by the runner for dry runs """
+CLIENT_FACTORY = CampaignMonitorTransactional
+
+
+def transactional(auth: dict) -> any:
+    """The campaign monitor client of a job, see: `CLIENT_FACTORY`"""
+    return CLIENT_FACTORY(auth)
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed send is worth retrying"""
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def send_email(
+    client: any,
+    smart_email_id: str,
+    recipients: list,
+    data: dict,
+    consent_to_track: str,
+    limiter: RateLimiter,
+    retries: int,
+    backoff: float,
+) -> dict:
+    """
+    Send a single smart email, retrying transient errors with exponential
+    backoff (plus jitter)
+
+    returns : dict
+            The outcome of the message, its attempts, latency & any error
+    """
+    started = time.monotonic()
+    attempt = 0
+
+    while True:
+        attempt = attempt + 1
+        limiter.wait()
+
+        try:
+            client.smart_email_send(
+                smart_email_id, recipients, consent_to_track, data=data
+            )
+            error = None
+        except Exception as e:
+            error = e
+
+        if error is None or attempt > retries or not is_transient(error):
+            break
+
+        time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(1, 1.5))
+
+    return {
+        "sent": error is None,
+        "attempts": attempt,
+        "latency": time.monotonic() - started,
+        "error": None if error is None else repr(error),
+    }
+
+
+def dispatch_emails(
+    client: any,
+    smart_email_id: str,
+    recipients: list,
+    messages: dict,
+    consent_to_track: str = "no",
+    workers: int = EMAIL_WORKERS,
+    rate_limit: float = EMAIL_RATE_LIMIT,
+    retries: int = EMAIL_RETRIES,
+    backoff: float = EMAIL_BACKOFF,
+) -> pd.DataFrame:
+    """
+    Send every message through a bounded pool of workers sharing one client
+
+    client : createsend.Transactional
+            The campaign monitor client, or a `FakeTransactional`
+
+    messages : dict
+            The data of each smart email, keyed by an id used in the report
+
+    rate_limit : float
+            Maximum sends started per second, 0 disables the limit
+
+    returns : pd.DataFrame
+            The report, one row per message with its latency & any failure
+    """
+    limiter = RateLimiter(rate_limit)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            key: executor.submit(
+                send_email,
+                client,
+                smart_email_id,
+                recipients,
+                data,
+                consent_to_track,
+                limiter,
+                retries,
+                backoff,
+            )
+            for key, data in messages.items()
+        }
+        report = pd.DataFrame(
+            [{"id": key, **future.result()} for key, future in futures.items()],
+            columns=["id", "sent", "attempts", "latency", "error"],
+        )
+
+    if len(report) > 0:
+        logger.info(
+            f"Sent {report['sent'].sum()}/{len(report)} email(s), latency p50"
+            f" {report['latency'].median():.2f}s p95"
+            f" {report['latency'].quantile(0.95):.2f}s, retries"
+            f" {(report['attempts'] - 1).sum()}"
+        )
+
+    for failure in report.loc[~report["sent"]].to_dict("records"):
+        logger.error(f"Email {failure['id']} failed: {failure['error']}")
+
+    return report
+
+
+if __name__ == "__main__":
+    """For benchmarking purposes, offline against the fake client"""
+    logging.basicConfig()
+
+    fake = FakeTransactional(latency=0.3, failure_rate=0.05, seed=0)
+    messages = {i: {"campaign_id": i} for i in range(100)}
+
+    started = time.monotonic()
+    report = dispatch_emails(fake, "smart-email-id", ["test@vamp.me"], messages)
+    print(f"Dispatched {len(report)} emails in {time.monotonic() - started:.2f}s")
@@ -0,0 +1,79 @@
+"""
+ expected_performance.py
+
+ @desc:
+ The linear models of the expected engagement, impressions & reach of a
+ creator, based off their followers, engagement rate & the deliverable type.
+ Used by the campaign performance email & the campaign lookup page of the
+ dashboard, so only depends on numpy & pandas.
+"""
+import numpy as np
+import pandas as pd
+
+EXPECTED_COLS = ["impressions", "reach", "engagement"]
+
+""" Coefficients of the expected performance linear models, one row per model """
+EXPECTED_MODELS = pd.DataFrame(
+    {
+        "intercept": [4.281810, 1.670552, 1.419314],
+        "log_followers": [0.333010, 0.874800, 0.880711],
+        "log_engagement_rate": [0.351721, 0.569204, 0.554041],
+        "story": [-6.188532, -1.910629, -1.913101],
+    },
+    index=["engagement", "impressions", "reach"],
+)
+
+
+def expected_performance(
+    followers_count: any, engagement_rate: any, deliverable_type: any
+) -> pd.DataFrame:
+    """
+    Calculate the expected engagement, impressions and reach of many squad
+    members at once, using the linear models in `EXPECTED_MODELS`
+
+    followers_count : array like
+            The follower counts of the squad members
+
+    engagement_rate : array like
+            The engagement rates of the squad members, anything not above 0 is
+            treated as 0.001
+
+    deliverable_type : array like
+            The deliverable types, stories have their own coefficient
+
+    return pd.DataFrame
+            The expected performance, one row per squad member
+    """
+    engagement_rate = np.asarray(engagement_rate, dtype=float)
+    engagement_rate = np.where(engagement_rate > 0, engagement_rate, 0.001)
+    followers_count = np.asarray(followers_count, dtype=float)
+
+    features = np.column_stack(
+        [
+            np.ones(len(followers_count)),
+            np.log(followers_count + 1),
+            np.log(engagement_rate),
+            np.asarray(deliverable_type) == "story",
+        ]
+    )
+    expected = np.round(np.exp(features @ EXPECTED_MODELS.to_numpy().T))
+
+    return pd.DataFrame(expected, columns=EXPECTED_MODELS.index).loc[:, EXPECTED_COLS]
+
+
+def expected_bounds(expected: pd.DataFrame) -> pd.DataFrame:
+    """
+    The bounds of a squads total expected performance, the upper bound is the
+    total & the lower bound deflates it by 2 standard deviations of the squad
+
+    expected : pd.DataFrame
+            The expected performance of each squad member, see:
+            `expected_performance`
+
+    returns : pd.DataFrame
+            The upperBound & lowerBound of each statistic
+    """
+    upper = expected.sum()
+    lower = upper - (2 * expected.std())
+
+    return pd.DataFrame({"upperBound": upper, "lowerBound": lower})
@@ -0,0 +1,494 @@
+"""
+ extract.py
+
+ @desc:
+ Shared extract layer for the email lambdas. Each run (lambda container) uses
+ one pooled SQLAlchemy engine, rather than an engine per query, and queries
+ that don't depend on each other can be executed concurrently.
+
+ The heavy scans are shared by every report through the base extracts, see
+ `BASE_EXTRACTS`: the campaigns active since the start of last month, their
+ brief requirements & deliverables, and their media. Each report filters &
+ aggregates them locally rather than scanning the same tables with its own
+ SQL.
+
+ Base extracts are materialized as Parquet snapshots once per schedule window
+ (`SNAPSHOT_WINDOW`), in S3 when `SNAPSHOT_BUCKET` is set (the deployed
+ lambdas) otherwise in the local `SNAPSHOT_DIR`, so the reports run within a
+ window read one set of scans. Snapshots of a past window are stale and the
+ query is run live.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+""" Upper limit of concurrent queries, also the size of the connection pool """
+MAX_CONCURRENT_QUERIES = int(os.getenv("MAX_CONCURRENT_QUERIES", "4"))
+
+""" Where snapshots are kept & the window they are valid for (a pandas period
+frequency, e.g D or W), empty (the default) disables snapshots """
+SNAPSHOT_BUCKET = os.getenv("SNAPSHOT_BUCKET")
+SNAPSHOT_PREFIX = os.getenv("SNAPSHOT_PREFIX", "emails/snapshots")
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "/tmp/email-snapshots")
+SNAPSHOT_WINDOW = os.getenv("SNAPSHOT_WINDOW", "")
+
+_engine = None
+
+
+def set_connection_str() -> str:
+    """Populate DB connection string, `DATABASE_URL` overrides it (local runs)"""
+    if os.getenv("DATABASE_URL"):
+        return os.getenv("DATABASE_URL")
+
+    host = os.getenv("HOST")
+    password = os.getenv("PASSWORD")
+    database = os.getenv("DATABASE")
+    user = os.getenv("DBUSER")
+    port = os.getenv("PORT", "5432")
+
+    return f"postgresql://{user}:{password}@{host}:{port}/{database}"
+
+
+def get_engine():
+    """
+    The pooled engine shared by every extract, created on first use. Warm
+    lambda containers keep reusing it, `pool_pre_ping` replaces any connection
+    that was dropped in between runs
+    """
+    global _engine
+
+    if _engine is None:
+        _engine = create_engine(
+            set_connection_str(),
+            pool_size=MAX_CONCURRENT_QUERIES,
+            max_overflow=0,
+            pool_pre_ping=True,
+        )
+
+    return _engine
+
+
+"""
+The campaigns active in the window of the base extracts: updated or started
+since `since`, or with brief requirements added since
+"""
+BASE_WINDOW = """
+		camp.updated_at >= %(since)s
+		OR camp.started_on >= %(since)s
+		OR camp.id IN (
+			SELECT briefs.campaign_id
+			FROM brief_requirements br
+			JOIN briefs ON briefs.id = br.brief_id
+			WHERE br.inserted_at >= %(since)s
+		)
+"""
+
+"""
+The campaigns of the window with their team, status, currency, costs, quoted
+estimates & targeted categories and regions. `token_value` is the campaign's
+instagram (or platform agnostic) token value
+"""
+BASE_CAMPAIGNS = (
+    """
+	SELECT camp.id AS campaign_id
+		, camp.name AS campaign_name
+		, camp.version
+		, teams.name AS team_name
+		, users.email
+		, cs.code AS campaign_status
+		, cur.code AS currency
+		, cur.symbol AS currency_symbol
+		, camp.started_on
+		, camp.start_date
+		, camp.end_date
+		, camp.updated_at
+		, camp.has_managed_service
+		, camp.budget
+		, camp.cogs
+		, camp.total_coins
+		, camp.spent_coins
+		, camp.additional_coins
+		, cc.product_coins_spent
+		, cc.ad_coins_spent
+		, camp.desired_age_ranges
+		, camp.desired_location
+
+		-- Analyse content plan etc
+		, camp.estimates::json#>>'{cpe}' AS cpe
+		, camp.estimates::json#>>'{cpm}' AS cpm
+		, camp.estimates::json#>>'{contentPlan}' AS content_plan
+
+		-- Analyse social stats
+		, camp.estimates::json#>>'{engagement}' AS estimated_engagement
+		, camp.estimates::json#>>'{impressions}' AS estimated_impressions
+		, camp.estimates::json#>>'{reach}' AS estimated_reach
+		, camp.estimates::json#>>'{socialAudience}' AS estimated_social_audience
+		, camp.estimates::json#>>'{talent}' AS estimated_talent
+
+		, COALESCE((
+			SELECT ARRAY_AGG(DISTINCT cat.code)
+			FROM categories cat
+			WHERE cat.code = ANY(STRING_TO_ARRAY(LOWER(camp.search_term), ',')::text[])
+		), '{}') AS categories
+		, COALESCE((
+			SELECT ARRAY_AGG(DISTINCT c.region)
+			FROM countries c
+			WHERE c.code = ANY(STRING_TO_ARRAY(camp.desired_location, ','))
+			AND c.region IS NOT NULL
+		), '{}') AS regions
+		, (
+			SELECT ctv.token_value
+			FROM campaign_token_values ctv
+			WHERE ctv.campaign_id = camp.id
+			AND (ctv.social_platform_id IS NULL OR ctv.social_platform_id = 1)
+			ORDER BY ctv.social_platform_id NULLS FIRST
+			LIMIT 1
+		) AS token_value
+	FROM campaigns camp
+	LEFT JOIN teams ON teams.id = camp.team_id
+	LEFT JOIN campaign_statuses cs ON cs.id = camp.campaign_status_id
+	LEFT JOIN currencies cur ON cur.id = camp.currency_id
+	LEFT JOIN campaign_costs cc ON cc.campaign_id = camp.id
+	LEFT JOIN memberships m ON m.team_id = teams.id
+		AND m.user_id = teams.owner_id
+	LEFT JOIN users ON users.id = m.id
+	WHERE
+"""
+    + BASE_WINDOW
+)
+
+"""
+The brief requirements of the campaigns of the window, one row per requirement
+& matching deliverable (if any), with the influencer's social account on the
+deliverable's platform & the campaign's token value for it
+"""
+BASE_REQUIREMENTS = (
+    """
+	SELECT br.id AS brief_requirement_id
+		, briefs.id AS brief_id
+		, briefs.campaign_id
+		, briefs.influencer_id
+		, inf.country AS influencer_country
+		, br.inserted_at
+		, br.quantity
+		, br.token_cost
+		, br.max_price
+		, br.custom_price
+		, br.agency_price
+		, br.agreed_price
+		, rc_country.name AS rate_card_country
+		, rc_cur.code AS rate_card_currency
+		, dt.code AS deliverable_type
+		, dt.name AS deliverable_name
+		, sp.code AS social_platform
+		, d.id AS deliverable_id
+		, ds.code AS deliverable_status
+		, d.reward_value
+		, ctv.token_value AS campaign_token_value
+		, sa.id AS social_account_id
+		, sa.followers_count
+		, sa.engagement_rate
+		, (
+		  CASE
+			WHEN (sp.code IN ('youtube', 'instagram') AND sa.followers_count <= 10000)
+				OR (sp.code = 'tiktok' AND sa.followers_count BETWEEN 10000 AND 100000)
+				THEN 'nano'
+			WHEN (sp.code IN ('youtube', 'instagram') AND sa.followers_count <= 25000)
+				OR (sp.code = 'tiktok' AND sa.followers_count <= 200000)
+				THEN 'micro'
+			WHEN (sp.code IN ('youtube', 'instagram') AND sa.followers_count <= 50000)
+				OR (sp.code = 'tiktok' AND sa.followers_count <= 500000)
+				THEN 'mid'
+			WHEN (sp.code IN ('youtube', 'instagram') AND sa.followers_count <= 100000)
+				OR (sp.code = 'tiktok' AND sa.followers_count <= 1000000)
+				THEN 'macro'
+			WHEN (sp.code IN ('youtube', 'instagram') AND sa.followers_count > 100000)
+				OR (sp.code = 'tiktok' AND sa.followers_count > 1000000)
+				THEN 'mega'
+
+			ELSE 'unknown'
+
+		  END
+		) AS band
+	FROM brief_requirements br
+	JOIN briefs ON briefs.id = br.brief_id
+	LEFT JOIN influencers inf ON inf.id = briefs.influencer_id
+	LEFT JOIN rate_cards rc ON rc.id = br.rate_card_id
+	LEFT JOIN countries rc_country ON rc_country.id = rc.country_id
+	LEFT JOIN currencies rc_cur ON rc_cur.id = rc.currency_id
+	LEFT JOIN deliverable_types dt ON dt.id = br.deliverable_type_id
+	LEFT JOIN social_platforms sp ON sp.id = dt.social_platform_id
+	LEFT JOIN deliverables d ON d.brief_id = briefs.id
+		AND d.deliverable_type_id = br.deliverable_type_id
+	LEFT JOIN deliverable_statuses ds ON ds.id = d.deliverable_status_id
+	LEFT JOIN campaign_token_values ctv ON ctv.campaign_id = briefs.campaign_id
+		AND ctv.social_platform_id = dt.social_platform_id
+	LEFT JOIN social_accounts sa ON sa.influencer_id = briefs.influencer_id
+		AND sa.social_platform_id = dt.social_platform_id
+	WHERE briefs.campaign_id IN (
+		SELECT camp.id
+		FROM campaigns camp
+		WHERE
+"""
+    + BASE_WINDOW
+    + """
+	)
+"""
+)
+
+"""
+The media of the deliverables of the campaigns of the window, with their
+insights on the deliverable's platform, falling back to their insight tags
+"""
+BASE_MEDIA = (
+    """
+	SELECT media.id AS media_id
+		, media.brief_id
+		, media.deliverable_id
+		, media.comments_count
+		, media.likes_count
+		, media.engagement_rate AS media_engagement_rate
+		, COALESCE(mi.impressions , (
+			  SELECT mit.value
+			  FROM media_insight_tags mit
+			  JOIN insight_tags it ON it.id = mit.insight_tag_id
+			  WHERE mit.media_id = media.id
+			  AND it.code = 'view_count'
+			)
+		) AS impressions
+		, mi.reach
+		, COALESCE(mi.engagement , (
+			  SELECT mit.value
+			  FROM media_insight_tags mit
+			  JOIN insight_tags it ON it.id = mit.insight_tag_id
+			  WHERE mit.media_id = media.id
+			  AND it.code = 'engagement_count'
+			)
+		) AS engagement
+	FROM media
+	JOIN briefs ON briefs.id = media.brief_id
+	JOIN deliverables d ON d.id = media.deliverable_id
+	LEFT JOIN deliverable_types dt ON dt.id = d.deliverable_type_id
+	LEFT JOIN media_insights mi ON mi.media_id = media.id
+		AND mi.social_platform_id = dt.social_platform_id
+	WHERE briefs.campaign_id IN (
+		SELECT camp.id
+		FROM campaigns camp
+		WHERE
+"""
+    + BASE_WINDOW
+    + """
+	)
+"""
+)
+
+""" The base extracts shared by every report, see: `base_extracts` """
+BASE_EXTRACTS = {
+    "campaigns": BASE_CAMPAIGNS,
+    "requirements": BASE_REQUIREMENTS,
+    "media": BASE_MEDIA,
+}
+
+
+def base_window_start() -> pd.Timestamp:
+    """
+    The start of the window of the base extracts, the start of last month so
+    it covers the previous month (pricing) & the previous week (margin &
+    campaign performance)
+    """
+    return (pd.Timestamp.today() - pd.DateOffset(months=1)).to_period("M").start_time
+
+
+def base_extracts(since: any = None) -> dict:
+    """
+    The base extracts to pass to `fetch_all`, alongside any other queries
+
+    since : any
+            An earlier start of the window, when a report needs more than the
+            default window (e.g. catching up on missed runs). Reports passing
+            the same window share the same snapshots
+
+    returns : dict
+            The base queries & their parameters keyed by name
+    """
+    start = base_window_start()
+    if since is not None:
+        start = min(start, pd.Timestamp(since).normalize())
+
+    params = {"since": str(start.date())}
+    return {name: (query, params) for name, query in BASE_EXTRACTS.items()}
+
+
+def fetch_data(query: str, params: dict = None) -> pd.DataFrame:
+    """Fetch query from db, binding any `%(name)s` parameters"""
+    return pd.io.sql.read_sql(query, get_engine(), params=params)
+
+
+def snapshot_window() -> str:
+    """The name of the current snapshot window"""
+    window = pd.Timestamp.now().to_period(SNAPSHOT_WINDOW).start_time
+    return f"{window:%Y-%m-%d}"
+
+
+def snapshot_key(query: str, params: dict = None) -> str:
+    """The snapshot of a query & its parameters for the current window"""
+    key = json.dumps([query, params], sort_keys=True, default=str)
+    name = f"{hashlib.sha1(key.encode()).hexdigest()}.parquet"
+
+    if SNAPSHOT_BUCKET:
+        return f"{SNAPSHOT_PREFIX}/{snapshot_window()}/{name}"
+
+    return os.path.join(SNAPSHOT_DIR, snapshot_window(), name)
+
+
+def read_snapshot(source: any) -> pd.DataFrame:
+    """Read a snapshot, parquet returns array columns as numpy arrays not lists"""
+    data = pd.read_parquet(source)
+
+    for col in data.columns[data.dtypes == object]:
+        data[col] = data[col].map(
+            lambda x: x.tolist() if isinstance(x, np.ndarray) else x
+        )
+
+    return data
+
+
+def load_snapshot(key: str) -> pd.DataFrame:
+    """Load a snapshot, None if it hasn't been taken"""
+    if SNAPSHOT_BUCKET:
+        import boto3  # provided by the lambda runtime
+        from botocore.exceptions import ClientError
+
+        try:
+            response = boto3.client("s3").get_object(Bucket=SNAPSHOT_BUCKET, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+                raise
+            return None
+
+        return read_snapshot(io.BytesIO(response["Body"].read()))
+
+    if not os.path.exists(key):
+        return None
+
+    return read_snapshot(key)
+
+
+def remove_stale_snapshots() -> None:
+    """Remove the snapshots of past windows"""
+    window = snapshot_window()
+
+    if not SNAPSHOT_BUCKET:
+        for stale in os.listdir(SNAPSHOT_DIR):
+            if stale != window:
+                shutil.rmtree(os.path.join(SNAPSHOT_DIR, stale), ignore_errors=True)
+        return
+
+    import boto3  # provided by the lambda runtime
+
+    client = boto3.client("s3")
+    pages = client.get_paginator("list_objects_v2").paginate(
+        Bucket=SNAPSHOT_BUCKET, Prefix=f"{SNAPSHOT_PREFIX}/"
+    )
+    stale = [
+        {"Key": item["Key"]}
+        for page in pages
+        for item in page.get("Contents", [])
+        if item["Key"].split("/")[-2] != window
+    ]
+    for i in range(0, len(stale), 1000):
+        client.delete_objects(
+            Bucket=SNAPSHOT_BUCKET, Delete={"Objects": stale[i : i + 1000]}
+        )
+
+
+def store_snapshot(key: str, data: pd.DataFrame) -> None:
+    """Store a snapshot of the current window, removing those of past windows"""
+    if SNAPSHOT_BUCKET:
+        import boto3  # provided by the lambda runtime
+
+        body = io.BytesIO()
+        data.to_parquet(body, index=False)
+        boto3.client("s3").put_object(
+            Bucket=SNAPSHOT_BUCKET, Key=key, Body=body.getvalue()
+        )
+    else:
+        os.makedirs(os.path.dirname(key), exist_ok=True)
+        data.to_parquet(f"{key}.tmp", index=False)
+        os.replace(f"{key}.tmp", key)
+
+    remove_stale_snapshots()
+
+
+def fetch_snapshot(query: str, params: dict = None) -> pd.DataFrame:
+    """
+    Fetch query from the snapshot of the current window, otherwise from the db
+    & snapshot it. Snapshots of past windows are removed
+
+    returns : pd.DataFrame
+            The query result, live when the snapshot is stale or unreadable
+    """
+    if not SNAPSHOT_WINDOW:
+        return fetch_data(query, params)
+
+    key = snapshot_key(query, params)
+    try:
+        data = load_snapshot(key)
+        if data is not None:
+            return data
+    except Exception as e:
+        logger.warning(f"Unreadable snapshot {key} ({e}), fetching live")
+
+    data = fetch_data(query, params)
+
+    try:
+        store_snapshot(key, data)
+    except Exception as e:
+        logger.warning(f"Could not snapshot to {key} ({e})")
+
+    return data
+
+
+def fetch_all(queries: dict) -> dict:
+    """
+    Fetch independent queries concurrently, each on its own pooled connection.
+    The base extracts are read from the snapshot of the current window once
+    taken, see: `fetch_snapshot`
+
+    queries : dict
+            The queries to run keyed by name, either the query or a tuple of
+            the query & its parameters
+
+    returns : dict
+            The fetched data frames keyed by the same names
+    """
+    workers = max(1, min(MAX_CONCURRENT_QUERIES, len(queries)))
+    queries = {
+        name: query if isinstance(query, tuple) else (query,)
+        for name, query in queries.items()
+    }
+    base = set(BASE_EXTRACTS.values())
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            name: executor.submit(
+                fetch_snapshot if query[0] in base else fetch_data, *query
+            )
+            for name, query in queries.items()
+        }
+        results = {name: future.result() for name, future in futures.items()}
+
+    logger.info(f"Fetched { ', '.join(results) } extract(s)")
+
+    return results
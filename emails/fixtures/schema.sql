@@ -0,0 +1,209 @@
+-- Schema of the local Postgres fixture the email jobs are dry run against, see
+-- `runner.py --seed`. Only the tables & columns the jobs query, re-running it
+-- drops & recreates them.
+
+DROP TABLE IF EXISTS
+	users, teams, memberships, currencies, countries, categories
+	, campaign_statuses, campaigns, campaign_costs, campaign_token_values
+	, social_platforms, deliverable_types, deliverable_statuses, brief_statuses
+	, rate_cards, influencers, influencer_countries, influencer_categories
+	, social_accounts, briefs, brief_requirements, notifications, deliverables
+	, media, insight_tags, media_insights, media_insight_tags
+CASCADE;
+
+CREATE TABLE users (
+	id INTEGER PRIMARY KEY,
+	email TEXT NOT NULL
+);
+
+CREATE TABLE teams (
+	id INTEGER PRIMARY KEY,
+	name TEXT,
+	owner_id INTEGER
+);
+
+CREATE TABLE memberships (
+	id INTEGER PRIMARY KEY,
+	team_id INTEGER NOT NULL,
+	user_id INTEGER NOT NULL
+);
+
+CREATE TABLE currencies (
+	id INTEGER PRIMARY KEY,
+	code TEXT NOT NULL,
+	symbol TEXT NOT NULL
+);
+
+CREATE TABLE countries (
+	id INTEGER PRIMARY KEY,
+	code TEXT NOT NULL,
+	name TEXT NOT NULL,
+	region TEXT
+);
+
+CREATE TABLE categories (
+	id INTEGER PRIMARY KEY,
+	code TEXT NOT NULL
+);
+
+CREATE TABLE campaign_statuses (
+	id INTEGER PRIMARY KEY,
+	code TEXT NOT NULL
+);
+
+CREATE TABLE campaigns (
+	id INTEGER PRIMARY KEY,
+	version INTEGER NOT NULL DEFAULT 1,
+	name TEXT NOT NULL,
+	team_id INTEGER NOT NULL,
+	campaign_status_id INTEGER NOT NULL,
+	currency_id INTEGER NOT NULL,
+	started_on DATE,
+	start_date DATE,
+	end_date DATE,
+	has_managed_service BOOLEAN NOT NULL DEFAULT FALSE,
+	budget DOUBLE PRECISION,
+	cogs DOUBLE PRECISION,
+	total_coins DOUBLE PRECISION,
+	spent_coins DOUBLE PRECISION,
+	additional_coins DOUBLE PRECISION,
+	estimates JSONB,
+	desired_age_ranges TEXT,
+	desired_location TEXT,
+	search_term TEXT,
+	inserted_at TIMESTAMP NOT NULL DEFAULT NOW(),
+	updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE campaign_costs (
+	campaign_id INTEGER PRIMARY KEY,
+	product_coins_spent DOUBLE PRECISION,
+	ad_coins_spent DOUBLE PRECISION
+);
+
+CREATE TABLE social_platforms (
+	id INTEGER PRIMARY KEY,
+	code TEXT NOT NULL
+);
+
+CREATE TABLE campaign_token_values (
+	campaign_id INTEGER NOT NULL,
+	social_platform_id INTEGER,
+	token_value DOUBLE PRECISION NOT NULL
+);
+
+CREATE TABLE deliverable_types (
+	id INTEGER PRIMARY KEY,
+	code TEXT NOT NULL,
+	name TEXT NOT NULL,
+	social_platform_id INTEGER
+);
+
+CREATE TABLE deliverable_statuses (
+	id INTEGER PRIMARY KEY,
+	code TEXT NOT NULL
+);
+
+CREATE TABLE brief_statuses (
+	id INTEGER PRIMARY KEY,
+	code TEXT NOT NULL
+);
+
+CREATE TABLE rate_cards (
+	id INTEGER PRIMARY KEY,
+	country_id INTEGER NOT NULL,
+	currency_id INTEGER NOT NULL
+);
+
+CREATE TABLE influencers (
+	id INTEGER PRIMARY KEY,
+	country TEXT
+);
+
+CREATE TABLE influencer_countries (
+	influencer_id INTEGER NOT NULL,
+	country_id INTEGER NOT NULL
+);
+
+CREATE TABLE influencer_categories (
+	influencer_id INTEGER NOT NULL,
+	category_id INTEGER NOT NULL
+);
+
+CREATE TABLE social_accounts (
+	id INTEGER PRIMARY KEY,
+	influencer_id INTEGER NOT NULL,
+	social_platform_id INTEGER NOT NULL,
+	followers_count INTEGER,
+	engagement_rate DOUBLE PRECISION
+);
+
+CREATE TABLE briefs (
+	id INTEGER PRIMARY KEY,
+	campaign_id INTEGER NOT NULL,
+	influencer_id INTEGER NOT NULL,
+	brief_status_id INTEGER NOT NULL,
+	is_viewed BOOLEAN,
+	last_active_brief_sent TIMESTAMP,
+	inserted_at TIMESTAMP NOT NULL DEFAULT NOW(),
+	updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE brief_requirements (
+	id INTEGER PRIMARY KEY,
+	brief_id INTEGER NOT NULL,
+	deliverable_type_id INTEGER NOT NULL,
+	rate_card_id INTEGER,
+	quantity INTEGER NOT NULL,
+	token_cost INTEGER,
+	max_price NUMERIC,
+	custom_price NUMERIC,
+	agency_price NUMERIC,
+	agreed_price NUMERIC,
+	inserted_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE notifications (
+	id SERIAL PRIMARY KEY,
+	brief_id INTEGER NOT NULL
+);
+
+CREATE TABLE deliverables (
+	id INTEGER PRIMARY KEY,
+	brief_id INTEGER NOT NULL,
+	deliverable_type_id INTEGER NOT NULL,
+	deliverable_status_id INTEGER NOT NULL,
+	reward_value DOUBLE PRECISION,
+	updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE media (
+	id INTEGER PRIMARY KEY,
+	brief_id INTEGER NOT NULL,
+	deliverable_id INTEGER,
+	comments_count INTEGER,
+	likes_count INTEGER,
+	engagement_rate DOUBLE PRECISION,
+	updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE insight_tags (
+	id INTEGER PRIMARY KEY,
+	code TEXT NOT NULL
+);
+
+CREATE TABLE media_insights (
+	id SERIAL PRIMARY KEY,
+	media_id INTEGER NOT NULL,
+	social_platform_id INTEGER NOT NULL,
+	impressions INTEGER,
+	reach INTEGER,
+	engagement INTEGER,
+	updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE media_insight_tags (
+	media_id INTEGER NOT NULL,
+	insight_tag_id INTEGER NOT NULL,
+	value INTEGER
+);
@@ -0,0 +1,258 @@
+-- Seed of the local Postgres fixture, see `schema.sql`. Dates are relative to
+-- the current date, so every job has something to report whenever it runs:
+--
+--   1. a campaign fulfilled in the last week (campaign performance & margin)
+--   2. a campaign paid two months ago (campaign performance benchmark)
+--   3. a campaign started last month with 420 briefs (pricing insights)
+--   4. a campaign of an internal team, excluded by every job
+
+INSERT INTO users (id, email) VALUES
+	(1, 'owner@acme.test'),
+	(2, 'demo@vamp.me');
+
+INSERT INTO teams (id, name, owner_id) VALUES
+	(1, 'Acme Foods', 1),
+	(2, 'Vamp Demo', 2);
+
+INSERT INTO memberships (id, team_id, user_id) VALUES
+	(1, 1, 1),
+	(2, 2, 2);
+
+INSERT INTO currencies (id, code, symbol) VALUES
+	(1, 'AUD', '$'),
+	(2, 'GBP', '£'),
+	(3, 'USD', '$');
+
+INSERT INTO countries (id, code, name, region) VALUES
+	(1, 'AU', 'Australia', 'APAC'),
+	(2, 'GB', 'United Kingdom', 'EMEA'),
+	(3, 'US', 'United States', 'AMER');
+
+INSERT INTO categories (id, code) VALUES
+	(1, 'food'),
+	(2, 'travel');
+
+INSERT INTO campaign_statuses (id, code) VALUES
+	(1, 'live'),
+	(2, 'fulfilled'),
+	(3, 'paid');
+
+INSERT INTO social_platforms (id, code) VALUES
+	(1, 'instagram'),
+	(2, 'tiktok'),
+	(3, 'youtube');
+
+INSERT INTO deliverable_types (id, code, name, social_platform_id) VALUES
+	(1, 'post', 'Instagram Post', 1),
+	(2, 'story', 'Instagram Story', 1),
+	(3, 'tiktok_video', 'TikTok Video', 2),
+	(4, 'youtube_video', 'YouTube Video', 3),
+	(5, 'product_distribution', 'Product Distribution', NULL);
+
+INSERT INTO deliverable_statuses (id, code) VALUES
+	(1, 'posting'),
+	(2, 'paid'),
+	(3, 'fulfilled');
+
+INSERT INTO brief_statuses (id, code) VALUES
+	(1, 'invited'),
+	(2, 'invitation_accepted'),
+	(3, 'shortlisted'),
+	(4, 'approved'),
+	(5, 'rejected'),
+	(6, 'fulfilled'),
+	(7, 'completed');
+
+INSERT INTO rate_cards (id, country_id, currency_id) VALUES
+	(1, 1, 1),
+	(2, 2, 2);
+
+INSERT INTO insight_tags (id, code) VALUES
+	(1, 'view_count'),
+	(2, 'engagement_count');
+
+INSERT INTO campaigns (
+	id, name, team_id, campaign_status_id, currency_id, started_on, start_date
+	, end_date, has_managed_service, budget, cogs, total_coins, spent_coins
+	, additional_coins, estimates, desired_location, search_term, updated_at
+) VALUES
+	(
+		1, 'Summer Menu Launch', 1, 2, 1, CURRENT_DATE - 35, CURRENT_DATE - 35
+		, CURRENT_DATE - 10, TRUE, 10000, 70, 100, 80, 5
+		, '{
+			"cpe": 0.12,
+			"cpm": 8.5,
+			"content": 8,
+			"contentPlan": {
+				"nano": {"instagram": 2, "tiktok": 1, "youtube": 0},
+				"micro": {"instagram": 2, "tiktok": 2, "youtube": 0},
+				"mid": {"instagram": 1, "tiktok": 0, "youtube": 0},
+				"macro": {"instagram": 0, "tiktok": 0, "youtube": 0},
+				"mega": {"instagram": 0, "tiktok": 0, "youtube": 0}
+			},
+			"engagement": {"lowerBound": 4000, "upperBound": 6000},
+			"impressions": {"lowerBound": 60000, "upperBound": 90000},
+			"reach": {"lowerBound": 40000, "upperBound": 70000},
+			"socialAudience": {"lowerBound": 150000, "upperBound": 250000},
+			"talent": {"lowerBound": 6, "upperBound": 10}
+		}'
+		, 'AU', 'food', NOW() - INTERVAL '1 day'
+	),
+	(
+		2, 'Winter Getaways', 1, 3, 2, CURRENT_DATE - 120, CURRENT_DATE - 120
+		, CURRENT_DATE - 60, FALSE, 8000, 70, 80, 80, 0
+		, NULL, 'GB', 'travel', NOW() - INTERVAL '50 days'
+	),
+	(
+		3, 'Spring Collection', 1, 1, 1
+		, (DATE_TRUNC('month', CURRENT_DATE - INTERVAL '1 month') + INTERVAL '4 days')::date
+		, (DATE_TRUNC('month', CURRENT_DATE - INTERVAL '1 month') + INTERVAL '4 days')::date
+		, NULL, FALSE, 20000, 70, 200, 120, 0
+		, NULL, 'AU,GB', 'food', NOW() - INTERVAL '20 days'
+	),
+	(
+		4, 'Internal Test', 2, 2, 1, CURRENT_DATE - 20, CURRENT_DATE - 20
+		, CURRENT_DATE - 8, FALSE, 1000, 70, 10, 10, 0
+		, NULL, 'AU', 'food', NOW() - INTERVAL '1 day'
+	);
+
+INSERT INTO campaign_costs (campaign_id, product_coins_spent, ad_coins_spent) VALUES
+	(1, 5, 0);
+
+INSERT INTO campaign_token_values (campaign_id, social_platform_id, token_value) VALUES
+	(1, 1, 20),
+	(1, 2, 22),
+	(2, 1, 18),
+	(2, 2, 20),
+	(3, 1, 25),
+	(3, 2, 30),
+	(4, 1, 20);
+
+-- Influencers alternate between Australia (odd ids, food) & the United Kingdom
+-- (even ids, travel), each on instagram & tiktok
+INSERT INTO influencers (id, country)
+SELECT i, CASE WHEN i % 2 = 1 THEN 'Australia' ELSE 'United Kingdom' END
+FROM generate_series(1, 40) i;
+
+INSERT INTO influencer_countries (influencer_id, country_id)
+SELECT i, CASE WHEN i % 2 = 1 THEN 1 ELSE 2 END
+FROM generate_series(1, 40) i;
+
+INSERT INTO influencer_categories (influencer_id, category_id)
+SELECT i, CASE WHEN i % 2 = 1 THEN 1 ELSE 2 END
+FROM generate_series(1, 40) i;
+
+INSERT INTO social_accounts (
+	id, influencer_id, social_platform_id, followers_count, engagement_rate
+)
+SELECT i * 10 + p, i, p
+	, CASE WHEN p = 1 THEN 3000 * i ELSE 15000 * i END
+	, 0.01 + i * 0.001
+FROM generate_series(1, 40) i, generate_series(1, 2) p;
+
+-- Campaigns 1 & 2: eight fulfilled briefs each, one deliverable per brief
+-- (instagram posts, stories & tiktok videos), all but one posted
+INSERT INTO briefs (
+	id, campaign_id, influencer_id, brief_status_id, is_viewed
+	, last_active_brief_sent, inserted_at
+)
+SELECT c.id * 1000 + i, c.id, (c.id - 1) * 8 + i, 6, TRUE
+	, c.started_on, c.started_on
+FROM campaigns c, generate_series(1, 8) i
+WHERE c.id IN (1, 2);
+
+INSERT INTO brief_requirements (
+	id, brief_id, deliverable_type_id, rate_card_id, quantity, token_cost
+	, max_price, agreed_price, inserted_at
+)
+SELECT b.id, b.id
+	, CASE WHEN b.id % 4 = 0 THEN 2 WHEN b.id % 2 = 0 THEN 3 ELSE 1 END
+	, CASE WHEN b.influencer_id % 2 = 1 THEN 1 ELSE 2 END
+	, 1, 4 + b.id % 3, 200, 220, b.inserted_at
+FROM briefs b
+WHERE b.campaign_id IN (1, 2);
+
+INSERT INTO deliverables (
+	id, brief_id, deliverable_type_id, deliverable_status_id, reward_value
+	, updated_at
+)
+SELECT br.id, br.brief_id, br.deliverable_type_id
+	, CASE
+		WHEN br.id = 1008 THEN 1
+		WHEN br.id < 2000 THEN 3
+		ELSE 2
+	END
+	, 150 + (br.id % 1000) * 10
+	, CASE WHEN br.id < 2000 THEN NOW() - INTERVAL '2 days' ELSE NOW() - INTERVAL '55 days' END
+FROM brief_requirements br
+WHERE br.id < 3000;
+
+INSERT INTO media (
+	id, brief_id, deliverable_id, comments_count, likes_count, engagement_rate
+	, updated_at
+)
+SELECT d.id, d.brief_id, d.id, 20 + d.id % 1000, 400 + (d.id % 1000) * 50
+	, 0.02 + (d.id % 1000) * 0.002, d.updated_at
+FROM deliverables d
+WHERE d.id < 3000
+AND d.deliverable_status_id <> 1;
+
+-- Most media have insights, every third only its insight tags
+INSERT INTO media_insights (
+	media_id, social_platform_id, impressions, reach, engagement, updated_at
+)
+SELECT m.id, dt.social_platform_id
+	, 8000 + (m.id % 1000) * 1500, 5000 + (m.id % 1000) * 900
+	, 500 + (m.id % 1000) * 70, m.updated_at
+FROM media m
+JOIN deliverables d ON d.id = m.deliverable_id
+JOIN deliverable_types dt ON dt.id = d.deliverable_type_id
+WHERE m.id % 3 <> 0;
+
+INSERT INTO media_insight_tags (media_id, insight_tag_id, value)
+SELECT m.id, t.id
+	, CASE WHEN t.code = 'view_count' THEN 9000 + (m.id % 1000) * 1200 ELSE 450 + (m.id % 1000) * 60 END
+FROM media m, insight_tags t
+WHERE m.id % 3 = 0;
+
+-- Campaign 3: 420 briefs split between Australia & the United Kingdom, so both
+-- pass the minimum of the application rates, with custom prices well above
+-- the rate card & a share of deliverables above 5 tokens
+INSERT INTO briefs (
+	id, campaign_id, influencer_id, brief_status_id, is_viewed
+	, last_active_brief_sent, inserted_at
+)
+SELECT 3000 + n, c.id, (n - 1) % 40 + 1
+	, (ARRAY[1, 2, 4, 5, 7])[n % 5 + 1]
+	, n % 4 <> 0
+	, c.started_on + INTERVAL '1 day' - (n % 45) * INTERVAL '1 day'
+	, c.started_on + INTERVAL '1 day'
+FROM campaigns c, generate_series(1, 420) n
+WHERE c.id = 3;
+
+INSERT INTO notifications (brief_id)
+SELECT b.id
+FROM briefs b
+WHERE b.campaign_id = 3
+AND b.id % 3 <> 0;
+
+INSERT INTO brief_requirements (
+	id, brief_id, deliverable_type_id, rate_card_id, quantity, token_cost
+	, max_price, custom_price, inserted_at
+)
+SELECT b.id, b.id, 1
+	, CASE WHEN b.influencer_id % 2 = 1 THEN 1 ELSE 2 END
+	, 1, 3 + b.id % 5, 100
+	, CASE WHEN b.id % 7 = 0 THEN NULL ELSE 150 + b.id % 30 END
+	, b.inserted_at + INTERVAL '1 day'
+FROM briefs b
+WHERE b.campaign_id = 3;
+
+INSERT INTO deliverables (
+	id, brief_id, deliverable_type_id, deliverable_status_id, reward_value
+	, updated_at
+)
+SELECT br.id, br.brief_id, br.deliverable_type_id, 1
+	, 60 + (br.id % 5) * 25, br.inserted_at
+FROM brief_requirements br
+WHERE br.id > 3000;
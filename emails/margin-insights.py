@@ -13,11 +13,14 @@
 import logging
 import os
 
+import numpy as np
 import pandas as pd
+from dispatch import transactional
+from extract import base_extracts, fetch_all
+from timing import timed
 
 # import urllib3
-from createsend import Transactional
-from sqlalchemy import create_engine
+
 
 # import io
 auth = {"api_key": os.getenv("CM_API_KEY")}
@@ -29,30 +32,15 @@ pd.options.display.float_format = "${:,.2f}".format
 
 SMART_EMAIL_ID = os.getenv("SMART_EMAIL_ID")
 
-CAMPAIGNS_SQL = """
-SELECT c.id, c.name, t.name as team_name, cur.code as currency, c.budget, c.desired_location, c.spent_coins + c.additional_coins AS spent_tokens,
-c.total_coins as total_tokens, CASE WHEN has_managed_service = True THEN 'Yes' ELSE 'No' END as campaign_management,
-CASE WHEN CEILING( c.budget/(ctv.token_value*100/c.cogs)) = c.total_coins THEN 'No' ELSE 'Yes' END as campaign_edit,
-SUM(d.reward_value) as influencer_spend, 100-SUM(d.reward_value)*100/(c.budget * ((c.spent_coins + c.additional_coins)/c.total_coins )) as margin, round(c.budget * ((c.spent_coins + c.additional_coins)/c.total_coins )) - SUM(d.reward_value) as gross_profit
-FROM campaigns as c
-JOIN currencies as cur on cur.id = c.currency_id
-JOIN campaign_token_values as ctv on ctv.campaign_id = c.id
-JOIN teams t on t.id = c.team_id
-JOIN briefs b on b.campaign_id = c.id
-JOIN deliverables d on d.brief_id = b.id
-WHERE
-(ctv.social_platform_id IS NULL OR ctv.social_platform_id = 1)
-AND d.deliverable_type_id in (SELECT id from deliverable_types where code not in ('product_distribution'))
-AND
-c.updated_at >=  DATE_TRUNC('week', CURRENT_DATE - INTERVAL '1 week')
-AND campaign_status_id = (select id from campaign_statuses WHERE code = 'fulfilled')
-AND t.name NOT IN ('Vamp Demo','JoTestProd','Vamp Demo Whitelabel','VampVision', 'Digital4ge', 'Yourcompany')
-AND  (
-          desired_age_ranges<>'100-999'
-        	OR desired_age_ranges IS NULL
-        )
-GROUP BY 1,2,3,4,5,6,7,8,9,10
-"""
+""" Internal teams whose campaigns aren't part of the insights """
+INTERNAL_TEAMS = [
+    "Vamp Demo",
+    "JoTestProd",
+    "Vamp Demo Whitelabel",
+    "VampVision",
+    "Digital4ge",
+    "Yourcompany",
+]
 
 # Change campaign edited to tokens edited.
 # Change gross profit to gross profit on tokens spent.
@@ -72,26 +60,70 @@ def currency_symbol(currency):
     return symbol
 
 
-def set_connection_str():
-    """Populate DB connection string"""
-    host = os.getenv("HOST")
-    password = os.getenv("PASSWORD")
-    database = os.getenv("DATABASE")
-    user = os.getenv("DBUSER")
-    port = os.getenv("PORT", "5432")
-    result = "postgresql://{user}:{password}@{host}:{port}/{database}".format(
-        user=user, password=password, host=host, port=port, database=database
+def campaign_margins(base):
+    """
+    The profitability & spend of the campaigns fulfilled & updated since the
+    start of last week, from the base extracts (see: `extract.base_extracts`).
+    The influencer spend is the reward of their deliverables, bar product
+    distribution
+    """
+    campaigns = base["campaigns"]
+    since = (pd.Timestamp.today() - pd.Timedelta(weeks=1)).to_period("W").start_time
+    campaigns = campaigns.loc[
+        (pd.to_datetime(campaigns["updated_at"]) >= since)
+        & (campaigns["campaign_status"] == "fulfilled")
+        & campaigns["team_name"].notnull()
+        & ~campaigns["team_name"].isin(INTERNAL_TEAMS)
+        & (campaigns["desired_age_ranges"].fillna("") != "100-999")
+        & campaigns["currency"].notnull()
+        & campaigns["token_value"].notnull()
+    ]
+
+    deliverables = base["requirements"]
+    deliverables = deliverables.loc[
+        deliverables["deliverable_id"].notnull()
+        & (deliverables["deliverable_type"] != "product_distribution")
+    ].drop_duplicates("deliverable_id")
+    spend = deliverables.groupby("campaign_id")["reward_value"].sum()
+
+    c = campaigns.merge(
+        spend.rename("influencer_spend"), left_on="campaign_id", right_index=True
     )
-
-    return result
+    budget = pd.to_numeric(c["budget"])
+    cogs = pd.to_numeric(c["cogs"])
+    total_tokens = pd.to_numeric(c["total_coins"])
+    spent_tokens = pd.to_numeric(c["spent_coins"]) + pd.to_numeric(
+        c["additional_coins"]
+    )
+    spent_budget = budget * (spent_tokens / total_tokens)
+    token_value = pd.to_numeric(c["token_value"]) * 100 / cogs
+
+    return pd.DataFrame(
+        {
+            "id": c["campaign_id"],
+            "name": c["campaign_name"],
+            "team_name": c["team_name"],
+            "currency": c["currency"],
+            "budget": c["budget"],
+            "desired_location": c["desired_location"],
+            "spent_tokens": spent_tokens,
+            "total_tokens": total_tokens,
+            "campaign_management": c["has_managed_service"]
+            .fillna(False)
+            .map({True: "Yes", False: "No"}),
+            "campaign_edit": (np.ceil(budget / token_value) == total_tokens).map(
+                {True: "No", False: "Yes"}
+            ),
+            "influencer_spend": c["influencer_spend"],
+            "margin": 100 - c["influencer_spend"] * 100 / spent_budget,
+            "gross_profit": spent_budget.round() - c["influencer_spend"],
+        }
+    ).reset_index(drop=True)
 
 
 def fetch_campaign_data():
-    """Fetch the deliverables above 5 tokens insights"""
-    connect_str = set_connection_str()
-    print(connect_str)
-    engine = create_engine(connect_str)
-    return pd.io.sql.read_sql(CAMPAIGNS_SQL, engine)
+    """Fetch the profitability of the campaigns fulfilled since last week"""
+    return campaign_margins(fetch_all(base_extracts()))
 
 
 def create_email(event, context):
@@ -109,17 +141,28 @@ def create_email(event, context):
     """
     RECIPIENTS = os.getenv("EMAIL_LIST").split(",")
 
-    campaign_data = fetch_campaign_data()
-    campaign_data["currency_symbol"] = campaign_data["currency"].apply(currency_symbol)
-    campaign_data["margin"] = campaign_data["margin"].map("{:,.2f}".format)
-    campaign_data["gross_profit"] = campaign_data["gross_profit"].map("{:,.2f}".format)
+    with timed("extract"):
+        campaign_data = fetch_campaign_data()
+
+    with timed("transform"):
+        campaign_data["currency_symbol"] = campaign_data["currency"].apply(
+            currency_symbol
+        )
+        campaign_data["margin"] = campaign_data["margin"].map("{:,.2f}".format)
+        campaign_data["gross_profit"] = campaign_data["gross_profit"].map(
+            "{:,.2f}".format
+        )
     print(campaign_data.to_dict(orient="records")[0])
+
+    with timed("render"):
+        my_data = {"campaigns": campaign_data.to_dict(orient="records")}
+
     # try:
-    tx_mailer = Transactional(auth)
-    my_data = {"campaigns": campaign_data.to_dict(orient="records")}
-    response = tx_mailer.smart_email_send(
-        SMART_EMAIL_ID, RECIPIENTS, "no", data=my_data
-    )
+    tx_mailer = transactional(auth)
+    with timed("send"):
+        response = tx_mailer.smart_email_send(
+            SMART_EMAIL_ID, RECIPIENTS, "no", data=my_data
+        )
     # except Exception as e:
     # 	e
     # 	logger.error(e.response['Error']['Message'])
@@ -22,51 +22,31 @@
 """
 import json
 import logging
-import math
 import os
 
+import numpy as np
 import pandas as pd
-from createsend import Transactional
-from sqlalchemy import create_engine
+from dispatch import transactional
+from extract import base_extracts, fetch_all, fetch_data
+from render import compile_template, trusted
+from timing import timed
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
-"""
-This query counts all the deliverables, based on the data from the previous month
-"""
-ALL_TOKENS = """
-	SELECT d.id
-		, inf.country
-		, sp.code AS platform
-		, cur.code AS currency_code
-		, cur.symbol AS currency_symbol
-		, ctv.token_value AS campaign_token_value
-		, (d.reward_value / br.token_cost) AS actual_token_value
-		, d.reward_value AS reward_value
-		, br.token_cost AS token_cost
-		, camp.cogs
-	FROM brief_requirements br
-	JOIN briefs ON briefs.id = br.brief_id
-	JOIN influencers inf ON inf.id = briefs.influencer_id
-	JOIN deliverables d ON d.brief_id = briefs.id
-		AND d.deliverable_type_id = br.deliverable_type_id
-	JOIN deliverable_types dt ON dt.id = br.deliverable_type_id
-	JOIN social_platforms sp ON sp.id = dt.social_platform_id
-	JOIN campaigns as camp on camp.id = briefs.campaign_id
-	JOIN campaign_token_values ctv ON ctv.campaign_id = camp.id
-		AND ctv.social_platform_id = dt.social_platform_id
-	JOIN currencies cur ON cur.id = camp.currency_id
-	JOIN teams as t on t.id = camp.team_id
-	WHERE t.name NOT IN ('Vamp Demo','JoTestProd','Vamp Demo Whitelabel','VampVision', 'Digital4ge', 'Yourcompany')
-	AND (camp.desired_age_ranges<>'100-999' OR camp.desired_age_ranges IS NULL)
-	AND (
-		br.inserted_at >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '1 month')
-		AND br.inserted_at < DATE_TRUNC('month', CURRENT_DATE)
-	)
-	AND br.quantity > 0;
-"""
+""" Internal teams whose campaigns aren't part of the insights """
+INTERNAL_TEAMS = [
+    "Vamp Demo",
+    "JoTestProd",
+    "Vamp Demo Whitelabel",
+    "VampVision",
+    "Digital4ge",
+    "Yourcompany",
+]
+
+""" Rate card currencies of the major markets, see: `price_change` """
+PRICE_CURRENCIES = ["AUD", "EUR", "GBP", "USD"]
 
 
 """
@@ -115,95 +95,73 @@ APPLICATION_RATES = """
 """
 
 
-"""
-This query calculates the average price adjustment for creators grouped by the
-deliverable type, country and currency. This query also only looks at markets
-that had at least 10 changed prices
-"""
-PRICE_CHANGE = """
-	SELECT sp.code AS platform
-		, dt.name AS deliverable
-		, cntry.name AS country
-		, cur.code AS currency
-		, ROUND(AVG(((br.custom_price - br.max_price) / br.max_price) * 100), 2) AS avg_percent
-		, COUNT(br) AS changed_count
-	FROM brief_requirements br
-	JOIN deliverable_types dt ON dt.id = br.deliverable_type_id
-	JOIN social_platforms sp ON sp.id = dt.social_platform_id
-	JOIN rate_cards rc ON rc.id = br.rate_card_id
-	JOIN countries cntry ON cntry.id = rc.country_id
-	JOIN currencies cur ON cur.id = rc.currency_id
-	JOIN briefs ON briefs.id = br.brief_id
-	JOIN campaigns as camp on camp.id = briefs.campaign_id
-	JOIN teams as t on t.id = camp.team_id
-	WHERE t.name NOT IN ('Vamp Demo','JoTestProd','Vamp Demo Whitelabel','VampVision', 'Digital4ge', 'Yourcompany')
-		AND (camp.desired_age_ranges<>'100-999' OR camp.desired_age_ranges IS NULL)
-		AND (
-			camp.started_on >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '1 month')
-			AND camp.started_on < DATE_TRUNC('month', CURRENT_DATE)
-		)
-		AND br.custom_price IS NOT NULL
-		AND cur.code IN ('AUD', 'EUR', 'GBP', 'USD')
-		AND br.quantity > 0
-		AND br.max_price > 0
-	GROUP BY 1, 2, 3, 4
-		HAVING COUNT(br) >= 10
-			AND ROUND(AVG(((br.custom_price - br.max_price) / br.max_price) * 100), 2) >= 50;
-"""
-
-
-""" Generic structure for the deliverable table rows """
-deliverable_row = """
-	<tr class="{css_class}">
-			<td class="table-row" style="width: 24px">{platform}</td>
-			<td style="padding:0 0 0 0;width: 30%">
-				{percentage} ({count})
-			</td>
-			<td style="text-align: right; width: 50%"> [{recommend}]</td>
-	</tr>
-"""
-
-deliverable_section = """
+""" Generic structure for the deliverable tables, a table per country """
+deliverable_section = compile_template(
+    """
+{% for country, css_class, platform, percentage, count, recommend in zip(
+    countries, css_classes, platforms, percentages, counts, recommends
+) %}
+{% if loop.first or loop.previtem[0] != country %}
 	<h3>
-		{icon}
-		{country}
+		{{ country }}
 	</h3>
 	<table role="presentation" style="width:100%;border-collapse:collapse;border:0;border-spacing:0;">
-		{table_rows}
+{% endif %}
+	<tr class="{{ css_class }}">
+			<td class="table-row" style="width: 24px">{{ platform }}</td>
+			<td style="padding:0 0 0 0;width: 30%">
+				{{ percentage }} ({{ count }})
+			</td>
+			<td style="text-align: right; width: 50%"> [{{ recommend }}]</td>
+	</tr>
+{% if loop.last or loop.nextitem[0] != country %}
 	</table>
+{% endif %}
+{% endfor %}
 """
+)
 
 
 """ Generic structure for the application table rows """
-country_row = """
-	<tr class="{css_class}">
-		<td class="table-row" style="width: auto">{country}</td>
-		<td style="text-align: right; width: 30%">{percentage} %</td>
+country_rows = compile_template(
+    """
+{% for css_class, country, percentage in zip(css_classes, countries, percentages) %}
+	<tr class="{{ css_class }}">
+		<td class="table-row" style="width: auto">{{ country }}</td>
+		<td style="text-align: right; width: 30%">{{ percentage }} %</td>
 	</tr>
+{% endfor %}
 """
+)
 
 
-""" Generic structure for the price change table rows """
-price_row = """
-	<tr class="{css_class}">
-		<td class="table-row" style="width: auto;">{country}</td>
-		<td style="text-align: right;width: 35%">{percentage} %</td>
-	</tr>
-"""
-
-price_section_platform = """
+""" Generic structure for the price change tables, a table per deliverable
+grouped under each platform """
+price_section = compile_template(
+    """
+{% for platform, icon, deliverable, css_class, country, percentage in zip(
+    platforms, icons, deliverables, css_classes, countries, percentages
+) %}
+{% if loop.first or loop.previtem[0] != platform %}
 	<h3>
-		{icon}
-		{platform}
+		{{ icon }}
+		{{ platform }}
 	</h3>
-"""
-
-price_section_deliverable = """
-	<h4>{deliverable_name}</h4>
+{% endif %}
+{% if loop.first or loop.previtem[0] != platform or loop.previtem[2] != deliverable %}
+	<h4>{{ deliverable }}</h4>
 	<table role="presentation" style="width:100%;border-collapse:collapse;border:0;border-spacing:0;">
-		{table_rows}
+{% endif %}
+	<tr class="{{ css_class }}">
+		<td class="table-row" style="width: auto;">{{ country }}</td>
+		<td style="text-align: right;width: 35%">{{ percentage }} %</td>
+	</tr>
+{% if loop.last or loop.nextitem[0] != platform or loop.nextitem[2] != deliverable %}
 	</table>
+{% endif %}
+{% endfor %}
 """
+)
 
 
 """ Generic structure for the platform icon """
@@ -222,98 +180,180 @@ platform_icons = {
     ),
 }
 
+""" The icons as rendered by the templates, inline beside the platform headings """
+row_icons = {platform: trusted(icon) for platform, icon in platform_icons.items()}
+heading_icons = {
+    platform: trusted(
+        icon.replace("display:block;", "display:inline-block;vertical-align:middle;")
+    )
+    for platform, icon in platform_icons.items()
+}
+
 
-def set_connection_str() -> str:
-    """Populate DB connection string"""
-    host = os.getenv("HOST")
-    password = os.getenv("PASSWORD")
-    database = os.getenv("DATABASE")
-    user = os.getenv("DBUSER")
-    port = os.getenv("PORT", "5432")
+def last_month() -> tuple:
+    """The start of the previous month & of the current month"""
+    today = pd.Timestamp.today()
+    return (
+        (today - pd.DateOffset(months=1)).to_period("M").start_time,
+        today.to_period("M").start_time,
+    )
 
-    return f"postgresql://{user}:{password}@{host}:{port}/{database}"
 
+def customer_campaigns(campaigns: pd.DataFrame) -> pd.DataFrame:
+    """The campaigns of customer teams, filtered from the base extract"""
+    return campaigns.loc[
+        campaigns["team_name"].notnull()
+        & ~campaigns["team_name"].isin(INTERNAL_TEAMS)
+        & (campaigns["desired_age_ranges"].fillna("") != "100-999")
+    ]
 
-def fetch_deliverables() -> tuple:
-    """Fetch the deliverables above 5 tokens insights"""
-    connect_str = set_connection_str()
-    engine = create_engine(connect_str)
 
-    return pd.io.sql.read_sql(ALL_TOKENS, engine)
+def deliverable_tokens(base: dict) -> pd.DataFrame:
+    """
+    The deliverables of the brief requirements added in the previous month,
+    with their token value, filtered from the base extracts
+
+    base : dict
+            The base extracts, see: `extract.base_extracts`
+    """
+    campaigns = customer_campaigns(base["campaigns"])
+    requirements = base["requirements"]
+    start, end = last_month()
+    inserted_at = pd.to_datetime(requirements["inserted_at"])
+
+    tokens = requirements.loc[
+        requirements["campaign_id"].isin(campaigns["campaign_id"])
+        & (inserted_at >= start)
+        & (inserted_at < end)
+        & (requirements["quantity"] > 0)
+        & requirements["deliverable_id"].notnull()
+        & requirements["social_platform"].notnull()
+        & requirements["campaign_token_value"].notnull()
+    ].merge(
+        campaigns.loc[
+            campaigns["currency"].notnull(),
+            ["campaign_id", "currency", "currency_symbol", "cogs"],
+        ],
+        on="campaign_id",
+    )
+
+    return pd.DataFrame(
+        {
+            "id": tokens["deliverable_id"].astype("int64"),
+            "country": tokens["influencer_country"],
+            "platform": tokens["social_platform"],
+            "currency_code": tokens["currency"],
+            "currency_symbol": tokens["currency_symbol"],
+            "campaign_token_value": tokens["campaign_token_value"],
+            "actual_token_value": tokens["reward_value"] / tokens["token_cost"],
+            "reward_value": tokens["reward_value"],
+            "token_cost": tokens["token_cost"],
+            "cogs": tokens["cogs"],
+        }
+    )
+
+
+def price_change(base: dict) -> pd.DataFrame:
+    """
+    The average price adjustment for creators, grouped by the deliverable
+    type, country and currency, of the campaigns started in the previous
+    month. Only markets that had at least 10 changed prices, averaging an
+    increase of at least 50%, are kept
+
+    base : dict
+            The base extracts, see: `extract.base_extracts`
+    """
+    campaigns = customer_campaigns(base["campaigns"])
+    start, end = last_month()
+    started_on = pd.to_datetime(campaigns["started_on"])
+    campaigns = campaigns.loc[(started_on >= start) & (started_on < end)]
+
+    requirements = base["requirements"].drop_duplicates("brief_requirement_id")
+    max_price = pd.to_numeric(requirements["max_price"])
+    custom_price = pd.to_numeric(requirements["custom_price"])
+
+    mask = (
+        requirements["campaign_id"].isin(campaigns["campaign_id"])
+        & custom_price.notnull()
+        & requirements["rate_card_currency"].isin(PRICE_CURRENCIES)
+        & (requirements["quantity"] > 0)
+        & (max_price > 0)
+        & requirements["social_platform"].notnull()
+        & requirements["rate_card_country"].notnull()
+    )
+    changed = pd.DataFrame(
+        {
+            "platform": requirements["social_platform"],
+            "deliverable": requirements["deliverable_name"],
+            "country": requirements["rate_card_country"],
+            "currency": requirements["rate_card_currency"],
+            "percent": (custom_price - max_price) / max_price * 100,
+        }
+    ).loc[mask]
+
+    price = (
+        changed.groupby(["platform", "deliverable", "country", "currency"])
+        .agg(avg_percent=("percent", "mean"), changed_count=("percent", "size"))
+        .reset_index()
+    )
+    price["avg_percent"] = price["avg_percent"].round(2)
+
+    return price.loc[
+        (price["changed_count"] >= 10) & (price["avg_percent"] >= 50)
+    ].reset_index(drop=True)
+
+
+def fetch_deliverables() -> pd.DataFrame:
+    """Fetch the deliverables above 5 tokens insights"""
+    return deliverable_tokens(fetch_all(base_extracts()))
 
 
 def fetch_applications() -> pd.DataFrame:
     """Fetch the application rate insights"""
-    connect_str = set_connection_str()
-    engine = create_engine(connect_str)
-
-    return pd.io.sql.read_sql(APPLICATION_RATES, engine)
+    return fetch_data(APPLICATION_RATES)
 
 
 def fetch_price_change() -> pd.DataFrame:
     """Fetch the price change insights"""
-    connect_str = set_connection_str()
-    engine = create_engine(connect_str)
-
-    return pd.io.sql.read_sql(PRICE_CHANGE, engine)
+    return price_change(fetch_all(base_extracts()))
 
 
 def build_deliverable_section(deliverables: pd.DataFrame) -> str:
     """
-    Generate the  email section displaying the average deliverable price
-    increase, aggregated by platform, deliverable & country, based on the
+    Generate the  email section displaying the share of deliverables above 5
+    tokens & the recommended token value, by country & platform, based on the
     deliverables processed in the previous month
 
-    price : pd.DataFrame
-            The datframe resulting from the `PRICE_CHANGE` query
+    deliverables : pd.DataFrame
+            The datframe resulting from `calculate_token_stats`
 
     returns : str
-            The HTML required to populate the average price change section
+            The HTML required to populate the deliverable section
     """
-    global deliverable_row
-    global platform_icons
-    global deliverable_section
-
-    deliverables.sort_values(by=["percent_above_5"], ascending=False, inplace=True)
-    countries = deliverables["country"].unique()
-    groups = deliverables.groupby(["country"])
-
-    d_section = ""
-
-    for country in countries:
-        del_rows = [
-            deliverable_row.format(
-                css_class="highlight" if row["percent_above_5"] > 10 else "",
-                platform=platform_icons.get(row["platform"], ""),
-                percentage=f"{row['percent_above_5']}%",
-                count=row["five_tokens_count"],
-                recommend=(
-                    f"({row['currency_code']})"
-                    f" {row['currency_symbol']} {row['recomended_token_value']}"
-                ),
-            )
-            for idx, row in groups.get_group(country).iterrows()
-        ]
-
-        platform_section = deliverable_section.format(
-            icon="", country=country.capitalize(), table_rows="".join(del_rows)
-        )
-
-        d_section = f"{d_section}{platform_section}"
-
-    return d_section
-
+    # Countries in order of their highest share, each with its rows in order
+    deliverables = deliverables.sort_values(by=["percent_above_5"], ascending=False)
+    order = {country: i for i, country in enumerate(deliverables["country"].unique())}
+    deliverables = deliverables.sort_values(
+        by="country", key=lambda country: country.map(order), kind="mergesort"
+    )
 
-def format_price_rows(price: pd.DataFrame, row_template: str) -> list:
-    """Format the `price_rows` template"""
-    return [
-        row_template.format(
-            css_class="" if -75 <= row["avg_percent"] <= 75 else "highlight",
-            country=row["country"],
-            percentage=row["avg_percent"],
-        )
-        for idx, row in price.iterrows()
-    ]
+    return deliverable_section.render(
+        countries=deliverables["country"].str.capitalize().tolist(),
+        css_classes=np.where(
+            deliverables["percent_above_5"] > 10, "highlight", ""
+        ).tolist(),
+        platforms=deliverables["platform"].map(row_icons).fillna("").tolist(),
+        percentages=(deliverables["percent_above_5"].astype(str) + "%").tolist(),
+        counts=deliverables["five_tokens_count"].tolist(),
+        recommends=(
+            "("
+            + deliverables["currency_code"].astype(str)
+            + ") "
+            + deliverables["currency_symbol"].astype(str)
+            + " "
+            + deliverables["recomended_token_value"].astype(str)
+        ).tolist(),
+    )
 
 
 def build_price_section(price: pd.DataFrame) -> str:
@@ -323,40 +363,25 @@ def build_price_section(price: pd.DataFrame) -> str:
     deliverables processed in the previous month
 
     price : pd.DataFrame
-            The datframe resulting from the `PRICE_CHANGE` query
+            The datframe resulting from `price_change`
 
     returns : str
             The HTML required to populate the average price change section
     """
-    global price_row
-    global platform_icons
-    global price_section_platform
-    global price_section_deliverable
-
-    price.sort_values(by=["avg_percent"], ascending=False, inplace=True)
-
-    price_section = ""
-
-    for platform, deliverables in price.groupby(["platform"]):
-        platform_section = price_section_platform.format(
-            icon=platform_icons.get(platform, "").replace(
-                "display:block;", "display:inline-block;vertical-align:middle;"
-            ),
-            platform=platform.capitalize(),
-        )
-
-        for deliverable, countries in deliverables.groupby("deliverable"):
-            deliverable_rows = format_price_rows(countries, price_row)
-            deliverable_section = price_section_deliverable.format(
-                deliverable_name=deliverable,
-                table_rows="".join(deliverable_rows),
-            )
-
-            platform_section = f"{platform_section}{deliverable_section}"
-
-        price_section = f"{price_section}{platform_section}"
-
-    return price_section
+    # Grouped by platform & deliverable, each with its rows in order
+    price = price.sort_values(by=["avg_percent"], ascending=False).sort_values(
+        by=["platform", "deliverable"], kind="mergesort"
+    )
+    highlight = ~price["avg_percent"].between(-75, 75)
+
+    return price_section.render(
+        platforms=price["platform"].str.capitalize().tolist(),
+        icons=price["platform"].map(heading_icons).fillna("").tolist(),
+        deliverables=price["deliverable"].tolist(),
+        css_classes=np.where(highlight, "highlight", "").tolist(),
+        countries=price["country"].tolist(),
+        percentages=price["avg_percent"].tolist(),
+    )
 
 
 def format_template(
@@ -382,71 +407,87 @@ def format_template(
         (applications["applied"] / applications["viewed"]) * 100
     ).round(decimals=2)
 
-    applications.sort_values(by=["app_rate"], ascending=False, inplace=True)
-    app_country_rows = [
-        country_row.format(
-            css_class="" if 20 <= row["app_rate"] <= 40 else "highlight",
-            country=row["country"],
-            percentage=row["app_rate"],
-        )
-        for idx, row in applications.fillna(0).iterrows()
-    ]
+    applications = applications.sort_values(by=["app_rate"], ascending=False)
+    applications = applications.fillna(0)
+    app_country_rows = country_rows.render(
+        css_classes=np.where(
+            applications["app_rate"].between(20, 40), "", "highlight"
+        ).tolist(),
+        countries=applications["country"].tolist(),
+        percentages=applications["app_rate"].tolist(),
+    )
 
     return dict(
         deliverable_section=build_deliverable_section(deliverables),
-        country_rows="".join(app_country_rows),
+        country_rows=app_country_rows,
         price_section=build_price_section(price),
     )
 
 
-def calc_token_value(row):
+def calc_token_value(all_tokens: pd.DataFrame) -> pd.Series:
     """Using a fixed token cost of 5, determine the token value"""
     token_cost = 5
-    top = (1.1 * row["reward_value"]) / token_cost
-    bottom = 100 / row["cogs"]
+    top = (1.1 * all_tokens["reward_value"]) / token_cost
+    bottom = 100 / all_tokens["cogs"]
 
     return top / bottom
 
 
-def recommended_token_value(group):
+def recommended_token_value(all_tokens: pd.DataFrame) -> pd.DataFrame:
     """
     Based on deliverables grouped by 'country', 'platform' & 'currency_code'
     determine the recommended token value in order to only have 10% of
     deliverables above 5 tokens. If a group already has less than 10%
     deliverables the recommended token value is the campaign token value
 
-    group : pd.DataFrameGroupBy
-            Should be all_tokens grouped by 'country', 'platform' & 'currency_code'
-            but only after the `5_token_value` has been calculated for each deliverable
+    The recommendation is the mean `5_token_value` of the deliverables above 5
+    tokens, ranked within their group, between the 10% floor & ceiling of the
+    group size. Every group is computed at once from the ranks
+
+    all_tokens : pd.DataFrame
+            All deliverables, but only after the `5_token_value` has been
+            calculated for each deliverable
 
-    returns : pd.Series
-            Returns a formatted row ready for emailing
+    returns : pd.DataFrame
+            One formatted row per group ready for emailing
     """
     percent = 0.1
-    five_tokens = (
-        group.query("token_cost > 5").sort_values(["5_token_value"]).reset_index()
-    )
-    ten_p_ceil = math.ceil(len(group) * percent)
-    ten_p_floor = math.floor(len(group) * percent)
+    group_cols = ["country", "platform", "currency_code"]
 
-    rtoken_val = group.iloc[0]["campaign_token_value"]
-    five_perc = len(five_tokens) / len(group)
+    all_tokens = all_tokens.sort_values(["5_token_value"])
+    groups = all_tokens.groupby(group_cols)
+    first = all_tokens.loc[groups.cumcount() == 0].set_index(group_cols)
 
-    if len(five_tokens) > ten_p_ceil or len(five_tokens) > ten_p_floor:
-        rtoken_val = five_tokens.iloc[ten_p_floor : ten_p_ceil + 1][
-            "5_token_value"
-        ].mean()
+    stats = groups.size().to_frame("all_tokens_count")
+    stats["ten_p_floor"] = np.floor(stats["all_tokens_count"] * percent)
+    stats["ten_p_ceil"] = np.ceil(stats["all_tokens_count"] * percent)
 
-    return pd.Series(
-        {
-            "currency_symbol": group.iloc[0]["currency_symbol"],
-            "percent_above_5": round(five_perc * 100, 2),
-            "five_tokens_count": len(five_tokens),
-            "all_tokens_count": len(group),
-            "campaign_token_value": group.iloc[0]["campaign_token_value"],
-            "recomended_token_value": round(rtoken_val, 2),
-        },
-        index=[
+    # rank the deliverables above 5 tokens within their group
+    five_tokens = all_tokens.loc[all_tokens["token_cost"] > 5]
+    five_groups = five_tokens.groupby(group_cols)
+    stats["five_tokens_count"] = five_groups.size()
+    stats["five_tokens_count"] = stats["five_tokens_count"].fillna(0).astype(int)
+
+    five_tokens = five_tokens.join(stats, on=group_cols)
+    rank = five_groups.cumcount()
+    window = (rank >= five_tokens["ten_p_floor"]) & (rank <= five_tokens["ten_p_ceil"])
+    window_mean = five_tokens.loc[window].groupby(group_cols)["5_token_value"].mean()
+
+    above_ten_p = (stats["five_tokens_count"] > stats["ten_p_ceil"]) | (
+        stats["five_tokens_count"] > stats["ten_p_floor"]
+    )
+    rtoken_val = first["campaign_token_value"].where(~above_ten_p, window_mean)
+
+    stats["currency_symbol"] = first["currency_symbol"]
+    stats["percent_above_5"] = (
+        stats["five_tokens_count"] / stats["all_tokens_count"] * 100
+    ).round(2)
+    stats["campaign_token_value"] = first["campaign_token_value"]
+    stats["recomended_token_value"] = rtoken_val.round(2)
+
+    return stats.loc[
+        :,
+        [
             "currency_symbol",
             "percent_above_5",
             "five_tokens_count",
@@ -454,21 +495,18 @@ def recommended_token_value(group):
             "campaign_token_value",
             "recomended_token_value",
         ],
-    )
+    ]
 
 
-def calculate_token_stats():
-    all_tokens = fetch_deliverables()
+def calculate_token_stats(all_tokens: pd.DataFrame = None) -> pd.DataFrame:
+    if all_tokens is None:
+        all_tokens = fetch_deliverables()
 
     # calculate token value if token cost was 5
-    all_tokens["5_token_value"] = all_tokens.apply(calc_token_value, axis=1)
+    all_tokens["5_token_value"] = calc_token_value(all_tokens)
 
     # calculate percentage of deliverables > 5 tokens for each country & platform
-    formatted_deliverables = (
-        all_tokens.sort_values(["5_token_value"])
-        .groupby(["country", "platform", "currency_code"])
-        .apply(recommended_token_value)
-    )
+    formatted_deliverables = recommended_token_value(all_tokens)
 
     return formatted_deliverables.query("percent_above_5 > 0").reset_index()
 
@@ -490,22 +528,33 @@ def create_email(event: any, context: any) -> None:
     CM_API_KEY = os.getenv("CM_API_KEY")
     CM_EMAIL_TEMPLATE = os.getenv("CM_EMAIL_TEMPLATE")
 
-    deliverables = calculate_token_stats()
-    applications = fetch_applications()
-    price = fetch_price_change()
+    with timed("extract"):
+        extracts = fetch_all(
+            {
+                **base_extracts(),
+                "applications": APPLICATION_RATES,
+            }
+        )
+
+    with timed("transform"):
+        deliverables = calculate_token_stats(deliverable_tokens(extracts))
+        applications = extracts["applications"]
+        price = price_change(extracts)
 
     # The message
-    email_data = format_template(deliverables, applications, price)
+    with timed("render"):
+        email_data = format_template(deliverables, applications, price)
     consent_to_track = "no"  # Valid: 'yes', 'no', 'unchanged'
     auth = {"api_key": CM_API_KEY}
 
     try:
         print(json.dumps(email_data, indent=4))
-        tx_mailer = Transactional(auth)
+        tx_mailer = transactional(auth)
         # Send the message and save the response
-        response = tx_mailer.smart_email_send(
-            CM_EMAIL_TEMPLATE, RECIPIENTS, consent_to_track, data=email_data
-        )
+        with timed("send"):
+            response = tx_mailer.smart_email_send(
+                CM_EMAIL_TEMPLATE, RECIPIENTS, consent_to_track, data=email_data
+            )
     except Exception as e:
         logger.info("An error occured whilst sending the email")
         logger.error(e)
@@ -0,0 +1,33 @@
+"""
+ render.py
+
+ @desc:
+ Rendering layer of the email lambdas. The HTML sections of the emails are
+ Jinja2 templates, compiled once on import & autoescaped, which render a
+ whole table from its column arrays in a single call rather than formatting
+ a string per row.
+"""
+from jinja2 import Environment
+from markupsafe import Markup
+
+""" Shared by every template, `zip` lets a template iterate column arrays """
+environment = Environment(autoescape=True, trim_blocks=True, lstrip_blocks=True)
+environment.globals["zip"] = zip
+
+
+def compile_template(source: str) -> any:
+    """
+    Compile a HTML template once, to be rendered as often as needed
+
+    source : str
+            The Jinja2 template
+
+    returns : jinja2.Template
+            The compiled template, see: `jinja2.Template.render`
+    """
+    return environment.from_string(source)
+
+
+def trusted(html: str) -> Markup:
+    """Mark HTML built by the job itself (e.g icons) to be rendered unescaped"""
+    return Markup(html)
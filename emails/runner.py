@@ -0,0 +1,178 @@
+"""
+ runner.py
+
+ @desc:
+ Local runner of the email lambdas, for benchmarking & catching regressions
+ without touching campaign monitor. Jobs run in dry-run mode against a local
+ Postgres fixture (`--database-url`), each message is written to disk as its
+ JSON payload & an HTML preview rather than sent, and the time spent in each
+ stage (extract, transform, render & send) is reported.
+
+ The fixture is created from `fixtures/schema.sql` & `fixtures/seed.sql` with
+ `--seed`, which replaces the tables the jobs query in that database.
+
+ Usage:
+    createdb vamp
+    python runner.py all --database-url postgresql://localhost:5432/vamp --seed
+    python runner.py campaign_performance --out dry-run --repeat 3
+
+ Every run starts without checkpoints, so it does the work of a first run,
+ unless `--incremental` is given. Extracts are always queried from the
+ fixture, so `--repeat` times every run alike, unless `--snapshots` shares the
+ base extracts between the jobs & runs of the current window, as deployed.
+"""
+import argparse
+import importlib
+import logging
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+""" The module & smart email template of each job """
+JOBS = {
+    "campaign_performance": ("campaign_performance", "campaign_performance.html"),
+    "pricing_insights": ("pricing_insights", "pricing-insights.html"),
+    "margin_insights": ("margin-insights", None),
+}
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DEFAULT_DATABASE_URL = "postgresql://postgres@localhost:5432/vamp"
+
+
+def seed_fixture(database_url: str) -> None:
+    """Create the fixture's tables & rows, see: `FIXTURE_DIR`"""
+    import psycopg2
+
+    connection = psycopg2.connect(database_url)
+    try:
+        with connection, connection.cursor() as cursor:
+            for name in ["schema.sql", "seed.sql"]:
+                with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+                    cursor.execute(f.read())
+    finally:
+        connection.close()
+
+
+def configure(database_url: str, out_dir: str, snapshots: bool = False) -> None:
+    """
+    Point the jobs at the fixture & keep their state local. Must run before
+    the jobs are imported, as they read their settings on import
+    """
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["CHECKPOINT_DIR"] = os.path.join(out_dir, "checkpoints")
+    os.environ.setdefault("SNAPSHOT_DIR", os.path.join(out_dir, "snapshots"))
+    os.environ["SNAPSHOT_WINDOW"] = "W" if snapshots else ""
+    os.environ.pop("CHECKPOINT_BUCKET", None)
+    os.environ.pop("SNAPSHOT_BUCKET", None)
+    os.environ.setdefault("EMAIL_LIST", "dry-run@vamp.me")
+    os.environ.setdefault("EMAIL_RATE_LIMIT", "0")
+
+
+def run_job(job: str, out_dir: str, incremental: bool = False) -> pd.DataFrame:
+    """
+    Run a job once in dry-run mode
+
+    job : str
+            The name of the job, see: `JOBS`
+
+    out_dir : str
+            The directory the messages of the job are written to
+
+    incremental : bool
+            Continue from the checkpoints of previous runs, rather than
+            starting from scratch
+
+    returns : pd.DataFrame
+            The timing profile of the run
+    """
+    import checkpoint
+    import dispatch
+    import timing
+
+    module, template = JOBS[job]
+    if template is not None:
+        with open(os.path.join(TEMPLATE_DIR, template)) as f:
+            template = f.read()
+
+    dispatch.CLIENT_FACTORY = lambda auth: dispatch.DryRunTransactional(
+        auth, out_dir=os.path.join(out_dir, job), template=template
+    )
+
+    checkpoint.CHECKPOINT_DIR = (
+        os.environ["CHECKPOINT_DIR"] if incremental else tempfile.mkdtemp()
+    )
+
+    timing.reset_timings()
+    started = time.perf_counter()
+    importlib.import_module(module).create_email(None, None)
+    elapsed = time.perf_counter() - started
+
+    profile = timing.timing_profile()
+    other = elapsed - profile["seconds"].sum()
+    profile = pd.concat(
+        [profile, pd.DataFrame({"stage": ["other"], "seconds": [other]})],
+        ignore_index=True,
+    )
+    profile["share"] = profile["seconds"] / elapsed
+    profile.insert(0, "job", job)
+
+    return profile
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dry run the email lambdas")
+    parser.add_argument("job", choices=[*JOBS, "all"])
+    parser.add_argument(
+        "--database-url",
+        default=os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL),
+        help="The local Postgres fixture",
+    )
+    parser.add_argument(
+        "--out", default="dry-run", help="Where the messages are written"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Runs of each job, for benchmarking"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Continue from the checkpoints of previous runs",
+    )
+    parser.add_argument(
+        "--seed",
+        action="store_true",
+        help="Create the fixture's tables & rows before running",
+    )
+    parser.add_argument(
+        "--snapshots",
+        action="store_true",
+        help="Read extracts from the snapshots of the current window",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.seed:
+        seed_fixture(args.database_url)
+    configure(args.database_url, args.out, args.snapshots)
+
+    jobs = list(JOBS) if args.job == "all" else [args.job]
+    profiles = []
+    for run in range(args.repeat):
+        for job in jobs:
+            profile = run_job(job, args.out, args.incremental)
+            profiles.append(profile.assign(run=run))
+
+    profile = pd.concat(profiles, ignore_index=True)
+    summary = profile.groupby(["job", "stage"], sort=False)["seconds"].agg(
+        ["mean", "min", "max"]
+    )
+
+    print(summary.to_string(float_format="{:,.3f}".format))
+    print(f"Messages written to {os.path.abspath(args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+ timing.py
+
+ @desc:
+ Per stage timing of the email lambdas (extract, transform, render & send).
+ Each job wraps its stages in `timed`, the durations accumulate for the run
+ so the local runner can report a profile, see `runner.py`.
+"""
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+""" Seconds spent in each stage since the last `reset_timings` """
+STAGE_TIMINGS = defaultdict(float)
+
+
+@contextmanager
+def timed(stage: str):
+    """Time a stage of a job, adding to its total for the run"""
+    started = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_TIMINGS[stage] += elapsed
+        logger.info(f"Stage {stage} took {elapsed:.3f}s")
+
+
+def reset_timings() -> None:
+    """Start a new profile"""
+    STAGE_TIMINGS.clear()
+
+
+def timing_profile() -> pd.DataFrame:
+    """
+    The profile of the run
+
+    returns : pd.DataFrame
+            The seconds & share of the run spent in each stage
+    """
+    profile = pd.DataFrame(
+        {"stage": list(STAGE_TIMINGS), "seconds": list(STAGE_TIMINGS.values())},
+        columns=["stage", "seconds"],
+    )
+    profile["share"] = profile["seconds"] / profile["seconds"].sum()
+
+    return profile
@@ -1187,12 +1187,11 @@ def il_audience_stats(audience):
 """
 
 
-def cl_briefs_barchart(briefs, notifications):
+def cl_briefs_barchart(briefs, successful_note):
     # Convert porportion to percentage
     briefs = briefs.groupby(["influencer_id"]).first()
 
     total = len(briefs)
-    successful_note = notifications["brief_id"].nunique()
 
     # convert dates
     # minus 31 from inserted at
@@ -1281,7 +1280,7 @@ def cumulative_campaigns_bar_chart(data, period):
         cat_order_col = "year-month"
 
     cat_order = [i for i in cat_order if i in data[cat_order_col].tolist()]
-    global_data = pd.DataFrame(data[cat_order_col].value_counts()).reset_index()
+    global_data = data.groupby(cat_order_col)["campaigns"].sum().reset_index()
     global_data.columns = ["month", "count"]
     global_data["month"] = pd.Categorical(global_data["month"].astype(str), cat_order)
     global_data = global_data.sort_values(by="month", axis=0).reset_index(drop=True)
@@ -1304,9 +1303,8 @@ def cumulative_campaigns_bar_chart(data, period):
     )
     x = dcc.Graph(id="cumulative_campaigns_chart", figure=fig)
 
-    region_data = pd.DataFrame(
-        data.loc[:, [cat_order_col, "region"]].value_counts()
-    ).reset_index()
+    region_data = data.groupby([cat_order_col, "region"])["campaigns"].sum()
+    region_data = region_data.reset_index()
     region_data.columns = ["month", "region", "count"]
     region_data["month"] = pd.Categorical(region_data["month"].astype(str), cat_order)
     region_data = region_data.sort_values(by="month", axis=0).reset_index(drop=True)
@@ -1376,7 +1374,7 @@ def cumulative_campaigns_bar_chart(data, period):
 
 def high_touch_low_touch_bar_chart(data):
 
-    global_data = pd.DataFrame(data["has_managed_service"].value_counts()).reset_index()
+    global_data = data.groupby("has_managed_service")["campaigns"].sum().reset_index()
 
     global_data.columns = ["service_level", "count"]
     levels = {True: "High Touch", False: "Low Touch"}
@@ -1402,10 +1400,8 @@ def high_touch_low_touch_bar_chart(data):
 
     x = dcc.Graph(id="managed_service_global_chart", figure=fig)
 
-    region_data = pd.DataFrame(
-        data.loc[:, ["has_managed_service", "region"]].value_counts()
-    ).reset_index()
-    region_data.columns = ["has_managed_service", "region", "count"]
+    region_data = data.groupby(["has_managed_service", "region"])["campaigns"].sum()
+    region_data = region_data.reset_index()
     region_data.columns = ["service_level", "region", "count"]
     region_data.replace({"service_level": levels}, inplace=True)
 
@@ -1825,7 +1821,7 @@ def new_vs_returning_customer_campaigns(data, period):
 
     cat_order = [i for i in cat_order if i in data[cat_order_col].tolist()]
     global_data = pd.DataFrame(
-        data.groupby([cat_order_col, "first_customer_flag"]).size()
+        data.groupby([cat_order_col, "first_customer_flag"])["campaigns"].sum()
     ).reset_index()
 
     global_data.columns = ["month", "new_vs_returning", "count"]
@@ -1867,7 +1863,9 @@ def new_vs_returning_customer_campaigns(data, period):
     x = dcc.Graph(id="new_customer_regional_chart", figure=fig)
 
     region_data = pd.DataFrame(
-        data.groupby([cat_order_col, "region", "first_customer_flag"]).size()
+        data.groupby([cat_order_col, "region", "first_customer_flag"])[
+            "campaigns"
+        ].sum()
     ).reset_index()
     region_data.columns = ["month", "region", "first_customer_flag", "count"]
 
@@ -2127,10 +2125,6 @@ def cumulative_camp_service_bar_chart(data, period):
     of each month based on the previous months as well as the monthly campaign
     counts for each service
     """
-    data["service"] = data["has_managed_service"].apply(
-        lambda x: "High Touch" if x else "Low Touch"
-    )
-
     if period == "quarterly":
         cat_order = [
             str(y) + "-" + x
@@ -2162,10 +2156,10 @@ def cumulative_camp_service_bar_chart(data, period):
         for service in ["High Touch", "Low Touch"]
     ]
 
-    regional_data = data.groupby([cat_order_col, "region"]).agg(
-        {"service": "value_counts"}
+    regional_data = data.groupby([cat_order_col, "region", "service"]).agg(
+        {"campaigns": "sum"}
     )
-    global_data = data.groupby([cat_order_col]).agg({"service": "value_counts"})
+    global_data = data.groupby([cat_order_col, "service"]).agg({"campaigns": "sum"})
     global_data.columns = ["count"]
     global_data = global_data.reindex(global_idx, fill_value=0)  # ensures shift by 2
     global_data = global_data.reset_index()